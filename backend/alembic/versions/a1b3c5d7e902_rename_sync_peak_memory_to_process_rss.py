@@ -0,0 +1,40 @@
+"""Rename sync_history.peak_memory to process_rss: it is process-wide, not per run
+
+Revision ID: a1b3c5d7e902
+Revises: c7a9d1f3b568
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1b3c5d7e902'
+down_revision: Union[str, None] = 'c7a9d1f3b568'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'sync_history', 'peak_memory',
+        new_column_name='process_rss',
+        existing_type=sa.BigInteger(),
+        existing_nullable=True,
+        comment='Максимальный RSS процесса воркера за время запуска, байты',
+        existing_comment='Пиковый RSS процесса, байты',
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'sync_history', 'process_rss',
+        new_column_name='peak_memory',
+        existing_type=sa.BigInteger(),
+        existing_nullable=True,
+        comment='Пиковый RSS процесса, байты',
+        existing_comment='Максимальный RSS процесса воркера за время запуска, байты',
+    )
@@ -0,0 +1,87 @@
+"""Add weekly/monthly product rollups and cabinet daily totals
+
+Revision ID: a5e7b9d1f346
+Revises: f4d6a8c0e235
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5e7b9d1f346'
+down_revision: Union[str, None] = 'f4d6a8c0e235'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _value_columns():
+    return [
+        sa.Column('orders_count', sa.Integer(), nullable=False),
+        sa.Column('buyouts_count', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        'sales_rollup_weekly',
+        sa.Column('cabinet_id', sa.Integer(), nullable=False),
+        sa.Column('nm_id', sa.BigInteger(), nullable=False),
+        sa.Column('week_start', sa.Date(), nullable=False),
+        *_value_columns(),
+        sa.ForeignKeyConstraint(['cabinet_id'], ['cabinets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cabinet_id', 'nm_id', 'week_start'),
+    )
+    op.create_index('idx_rollup_weekly_week', 'sales_rollup_weekly', ['week_start', 'cabinet_id'], unique=False)
+
+    op.create_table(
+        'sales_rollup_monthly',
+        sa.Column('cabinet_id', sa.Integer(), nullable=False),
+        sa.Column('nm_id', sa.BigInteger(), nullable=False),
+        sa.Column('month_start', sa.Date(), nullable=False),
+        *_value_columns(),
+        sa.ForeignKeyConstraint(['cabinet_id'], ['cabinets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cabinet_id', 'nm_id', 'month_start'),
+    )
+    op.create_index('idx_rollup_monthly_month', 'sales_rollup_monthly', ['month_start', 'cabinet_id'], unique=False)
+
+    op.create_table(
+        'cabinet_daily_totals',
+        sa.Column('cabinet_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        *_value_columns(),
+        sa.ForeignKeyConstraint(['cabinet_id'], ['cabinets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('cabinet_id', 'date'),
+    )
+    op.create_index('idx_cabinet_daily_date', 'cabinet_daily_totals', ['date'], unique=False)
+
+    # Первичное заполнение из уже накопленной истории
+    sums = "COALESCE(SUM(orders_count), 0), COALESCE(SUM(buyouts_count), 0), COALESCE(SUM(revenue), 0)"
+    op.execute(
+        f"INSERT INTO sales_rollup_weekly (cabinet_id, nm_id, week_start, orders_count, buyouts_count, revenue) "
+        f"SELECT cabinet_id, nm_id, date_trunc('week', date)::date, {sums} "
+        f"FROM sales_history GROUP BY 1, 2, 3"
+    )
+    op.execute(
+        f"INSERT INTO sales_rollup_monthly (cabinet_id, nm_id, month_start, orders_count, buyouts_count, revenue) "
+        f"SELECT cabinet_id, nm_id, date_trunc('month', date)::date, {sums} "
+        f"FROM sales_history GROUP BY 1, 2, 3"
+    )
+    op.execute(
+        f"INSERT INTO cabinet_daily_totals (cabinet_id, date, orders_count, buyouts_count, revenue) "
+        f"SELECT cabinet_id, date, {sums} "
+        f"FROM sales_history GROUP BY 1, 2"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_cabinet_daily_date', table_name='cabinet_daily_totals')
+    op.drop_table('cabinet_daily_totals')
+    op.drop_index('idx_rollup_monthly_month', table_name='sales_rollup_monthly')
+    op.drop_table('sales_rollup_monthly')
+    op.drop_index('idx_rollup_weekly_week', table_name='sales_rollup_weekly')
+    op.drop_table('sales_rollup_weekly')
@@ -0,0 +1,100 @@
+"""Partition sales_history by month (RANGE on date)
+
+Revision ID: b6f8c0e2a457
+Revises: a5e7b9d1f346
+Create Date: 2026-10-17 00:00:00.000000
+
+Существующая таблица переименовывается, на её месте создаётся секционированная
+с партициями от самого раннего месяца в данных до текущего + 3 и партицией
+default, затем строки копируются. Копирование держит блокировку на время
+переноса, миграцию нужно выполнять в окно без синхронизаций.
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f8c0e2a457'
+down_revision: Union[str, None] = 'a5e7b9d1f346'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, nm_id, cabinet_id, date, orders_count, buyouts_count, revenue, created_at"
+MONTHS_AHEAD = 3
+
+
+def _shift_months(month: date, months: int) -> date:
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, index + 1, 1)
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE sales_history RENAME TO sales_history_old")
+    op.execute("ALTER TABLE sales_history_old RENAME CONSTRAINT sales_history_pkey TO sales_history_old_pkey")
+    op.execute("ALTER TABLE sales_history_old RENAME CONSTRAINT uq_sales_nm_date TO uq_sales_nm_date_old")
+    op.execute("ALTER INDEX idx_sales_nm_date RENAME TO idx_sales_nm_date_old")
+    op.execute("ALTER INDEX idx_sales_cabinet_date RENAME TO idx_sales_cabinet_date_old")
+
+    op.execute("""
+        CREATE TABLE sales_history (
+            id INTEGER NOT NULL DEFAULT nextval('sales_history_id_seq'),
+            nm_id BIGINT NOT NULL REFERENCES products (nm_id) ON DELETE CASCADE,
+            cabinet_id INTEGER NOT NULL REFERENCES cabinets (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            orders_count INTEGER,
+            buyouts_count INTEGER,
+            revenue NUMERIC(12, 2),
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT sales_history_pkey PRIMARY KEY (id, date),
+            CONSTRAINT uq_sales_nm_date UNIQUE (nm_id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    # Отдельный индекс (nm_id, date) не нужен: его покрывает uq_sales_nm_date
+    op.create_index('idx_sales_cabinet_date', 'sales_history', ['cabinet_id', 'date'], unique=False)
+    op.execute("CREATE TABLE sales_history_default PARTITION OF sales_history DEFAULT")
+
+    current = date.today().replace(day=1)
+    earliest = op.get_bind().execute(sa.text("SELECT min(date) FROM sales_history_old")).scalar()
+    month = min(earliest.replace(day=1), current) if earliest else current
+    while month <= _shift_months(current, MONTHS_AHEAD):
+        upper = _shift_months(month, 1)
+        op.execute(
+            f"CREATE TABLE sales_history_y{month.year}m{month.month:02d} PARTITION OF sales_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.execute(f"INSERT INTO sales_history ({COLUMNS}) SELECT {COLUMNS} FROM sales_history_old")
+    op.execute("ALTER SEQUENCE sales_history_id_seq OWNED BY sales_history.id")
+    op.execute("DROP TABLE sales_history_old")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE sales_history RENAME TO sales_history_partitioned")
+    op.execute("ALTER TABLE sales_history_partitioned RENAME CONSTRAINT sales_history_pkey TO sales_history_partitioned_pkey")
+    op.execute("ALTER TABLE sales_history_partitioned RENAME CONSTRAINT uq_sales_nm_date TO uq_sales_nm_date_partitioned")
+    op.execute("ALTER INDEX idx_sales_cabinet_date RENAME TO idx_sales_cabinet_date_partitioned")
+
+    op.execute("""
+        CREATE TABLE sales_history (
+            id INTEGER NOT NULL DEFAULT nextval('sales_history_id_seq'),
+            nm_id BIGINT NOT NULL REFERENCES products (nm_id) ON DELETE CASCADE,
+            cabinet_id INTEGER NOT NULL REFERENCES cabinets (id) ON DELETE CASCADE,
+            date DATE NOT NULL,
+            orders_count INTEGER,
+            buyouts_count INTEGER,
+            revenue NUMERIC(12, 2),
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT sales_history_pkey PRIMARY KEY (id),
+            CONSTRAINT uq_sales_nm_date UNIQUE (nm_id, date)
+        )
+    """)
+    op.create_index('idx_sales_nm_date', 'sales_history', ['nm_id', 'date'], unique=False)
+    op.create_index('idx_sales_cabinet_date', 'sales_history', ['cabinet_id', 'date'], unique=False)
+
+    op.execute(f"INSERT INTO sales_history ({COLUMNS}) SELECT {COLUMNS} FROM sales_history_partitioned")
+    op.execute("ALTER SEQUENCE sales_history_id_seq OWNED BY sales_history.id")
+    op.execute("DROP TABLE sales_history_partitioned")
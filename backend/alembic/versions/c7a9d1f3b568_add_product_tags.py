@@ -0,0 +1,43 @@
+"""Add product_tags association table
+
+Revision ID: c7a9d1f3b568
+Revises: b6f8c0e2a457
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a9d1f3b568'
+down_revision: Union[str, None] = 'b6f8c0e2a457'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'product_tags',
+        sa.Column('nm_id', sa.BigInteger(), nullable=False),
+        sa.Column('tag', sa.String(length=100), nullable=False),
+        sa.ForeignKeyConstraint(['nm_id'], ['products.nm_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('nm_id', 'tag'),
+    )
+    op.create_index('idx_product_tags_tag', 'product_tags', ['tag', 'nm_id'], unique=False)
+
+    # Теги уже синхронизированных товаров из строки Product.manager
+    op.execute("""
+        INSERT INTO product_tags (nm_id, tag)
+        SELECT DISTINCT p.nm_id, left(btrim(t.tag), 100)
+        FROM products p, unnest(string_to_array(p.manager, ',')) AS t(tag)
+        WHERE btrim(t.tag) <> ''
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_product_tags_tag', table_name='product_tags')
+    op.drop_table('product_tags')
@@ -0,0 +1,56 @@
+"""Add sync watermarks and sales events for incremental sales sync
+
+Revision ID: d2a4e6f8b013
+Revises: c1234567890a
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a4e6f8b013'
+down_revision: Union[str, None] = 'c1234567890a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Курсоры lastChangeDate по кабинету и типу синхронизации
+    op.create_table('sync_watermarks',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('cabinet_id', sa.Integer(), nullable=False),
+        sa.Column('sync_type', postgresql.ENUM('stocks', 'sales', 'orders', 'products', name='synctype', create_type=False), nullable=False),
+        sa.Column('last_change_date', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['cabinet_id'], ['cabinets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cabinet_id', 'sync_type', name='uq_sync_watermark_cabinet_type')
+    )
+
+    # Исходные строки заказов и продаж для пересчёта затронутых (nm_id, date)
+    op.create_table('sales_events',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('cabinet_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False, comment='order | sale'),
+        sa.Column('external_id', sa.String(length=100), nullable=False, comment='srid заказа или saleID продажи'),
+        sa.Column('nm_id', sa.BigInteger(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('is_buyout', sa.Boolean(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column('last_change_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['cabinet_id'], ['cabinets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('cabinet_id', 'kind', 'external_id', name='uq_sales_event_key')
+    )
+    op.create_index('idx_sales_event_cabinet_nm_date', 'sales_events', ['cabinet_id', 'nm_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_sales_event_cabinet_nm_date', table_name='sales_events')
+    op.drop_table('sales_events')
+    op.drop_table('sync_watermarks')
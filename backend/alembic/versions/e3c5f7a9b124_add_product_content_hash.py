@@ -0,0 +1,27 @@
+"""Add products.content_hash for change detection
+
+Revision ID: e3c5f7a9b124
+Revises: d2a4e6f8b013
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c5f7a9b124'
+down_revision: Union[str, None] = 'd2a4e6f8b013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Пустой хэш у существующих строк: первая синхронизация перезапишет их один раз
+    op.add_column('products', sa.Column('content_hash', sa.String(length=32), nullable=True, comment='Хэш нормализованной карточки WB'))
+
+
+def downgrade() -> None:
+    op.drop_column('products', 'content_hash')
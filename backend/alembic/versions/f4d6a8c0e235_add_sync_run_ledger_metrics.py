@@ -0,0 +1,44 @@
+"""Turn sync_history into a per-run ledger with timings and row counts
+
+Revision ID: f4d6a8c0e235
+Revises: e3c5f7a9b124
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4d6a8c0e235'
+down_revision: Union[str, None] = 'e3c5f7a9b124'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sync_history', sa.Column('mode', sa.String(length=20), nullable=True))
+    op.add_column('sync_history', sa.Column('finished_at', sa.DateTime(), nullable=True))
+    op.add_column('sync_history', sa.Column('duration', sa.Float(), nullable=True, comment='Длительность запуска, сек'))
+    op.add_column('sync_history', sa.Column('stages', sa.JSON(), nullable=True, comment='Длительности стадий fetch/parse/write, сек'))
+    op.add_column('sync_history', sa.Column('pages', sa.Integer(), nullable=True))
+    op.add_column('sync_history', sa.Column('rows_read', sa.Integer(), nullable=True))
+    op.add_column('sync_history', sa.Column('rows_written', sa.Integer(), nullable=True))
+    op.add_column('sync_history', sa.Column('throttle_wait', sa.Float(), nullable=True, comment='Ожидание квот WB, сек'))
+    op.add_column('sync_history', sa.Column('peak_memory', sa.BigInteger(), nullable=True, comment='Пиковый RSS процесса, байты'))
+    op.create_index('idx_sync_type_started', 'sync_history', ['sync_type', 'last_sync_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_sync_type_started', table_name='sync_history')
+    op.drop_column('sync_history', 'peak_memory')
+    op.drop_column('sync_history', 'throttle_wait')
+    op.drop_column('sync_history', 'rows_written')
+    op.drop_column('sync_history', 'rows_read')
+    op.drop_column('sync_history', 'pages')
+    op.drop_column('sync_history', 'stages')
+    op.drop_column('sync_history', 'duration')
+    op.drop_column('sync_history', 'finished_at')
+    op.drop_column('sync_history', 'mode')
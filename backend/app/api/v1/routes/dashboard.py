@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from sqlalchemy import select, func, literal, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime, timedelta
-from typing import List, Optional
-from app.db.session import get_db
-from app.models import Product, SalesHistory, Cabinet
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+from app.models import Product, Cabinet
 from app.schemas.dashboard import KPIResponse, ProductListResponse, ProductItem, ChartDataResponse
-from app.core.dependencies import get_current_user, require_role
+from app.core.dependencies import get_current_user, require_role, filter_by_user_tags
+from app.core.pagination import decode_cursor, encode_cursor
 from app.models.user import User
+from app.services.sales_rollups import product_sales, cabinet_totals
+from app.services.kpi import PERIOD_DAYS, KpiWindows, kpi_query, resolve_windows
+from app.services.response_cache import cached_response
 
 # Enforce role requirement for all endpoints in this router
 router = APIRouter(
@@ -16,69 +20,32 @@ router = APIRouter(
     dependencies=[Depends(require_role(["admin", "manager"]))]
 )
 
-def get_user_tags(user: User) -> List[str]:
-    """Helper to parse allowed tags from user"""
-    return [tag.strip() for tag in (user.allowed_tags or "").split(",")]
-
 @router.get("/kpi", response_model=KPIResponse)
 async def get_kpi(
+    request: Request,
+    response: Response,
     period: str = Query("week", regex="^(day|week|month|3months)$"),
+    date_from: Optional[date] = Query(None, description="Начало окна (включительно); задаёт окно вместо period"),
+    date_to: Optional[date] = Query(None, description="Конец окна (включительно), по умолчанию сегодня"),
+    compare: str = Query("previous", regex="^(previous|yoy|none)$"),
     cabinet_id: Optional[int] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
-    """Получить KPI метрики за период"""
-
-    # Определить date_from на основе period
-    period_map = {
-        'day': 1,
-        'week': 7,
-        'month': 30,
-        '3months': 90
-    }
-    days = period_map[period]
-    date_from = datetime.utcnow().date() - timedelta(days=days)
-    date_from_prev = date_from - timedelta(days=days)
-
-    # Базовый запрос
-    query = select(
-        func.sum(SalesHistory.revenue).label('total_revenue'),
-        func.sum(SalesHistory.orders_count).label('total_orders'),
-        func.sum(SalesHistory.buyouts_count).label('total_buyouts')
-    ).where(SalesHistory.date >= date_from)
-
-    # Фильтр по кабинету
-    if cabinet_id:
-        query = query.where(SalesHistory.cabinet_id == cabinet_id)
-
-    # Фильтр для менеджеров
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        # Using explicit join condition for safety
-        query = query.join(Product, SalesHistory.nm_id == Product.nm_id).where(Product.manager.in_(user_tags))
-
-    result = await db.execute(query)
-    current = result.one()
-
-    # Запрос для предыдущего периода
-    query_prev = select(
-        func.sum(SalesHistory.revenue).label('total_revenue'),
-        func.sum(SalesHistory.orders_count).label('total_orders'),
-        func.sum(SalesHistory.buyouts_count).label('total_buyouts')
-    ).where(
-        SalesHistory.date >= date_from_prev,
-        SalesHistory.date < date_from
+    """Получить KPI метрики за период и изменение относительно окна сравнения"""
+    try:
+        windows = resolve_windows(period, date_from, date_to, compare)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return await cached_response(
+        "kpi", current_user, cabinet_id, windows._asdict(),
+        lambda db: build_kpi(db, windows, cabinet_id, current_user),
+        request, response,
     )
 
-    if cabinet_id:
-        query_prev = query_prev.where(SalesHistory.cabinet_id == cabinet_id)
-
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        query_prev = query_prev.join(Product, SalesHistory.nm_id == Product.nm_id).where(Product.manager.in_(user_tags))
-
-    result_prev = await db.execute(query_prev)
-    previous = result_prev.one()
+async def build_kpi(db: AsyncSession, windows: KpiWindows, cabinet_id: Optional[int], current_user: User) -> KPIResponse:
+    result = await db.execute(kpi_query(windows, cabinet_id, current_user))
+    row = result.one()
 
     # Вычисление процентов изменения
     def calc_change(curr, prev):
@@ -86,12 +53,13 @@ async def get_kpi(
             return 0.0
         return round(((curr - prev) / prev) * 100, 1)
 
-    total_revenue = float(current.total_revenue or 0)
-    total_orders = int(current.total_orders or 0)
-    total_buyouts = int(current.total_buyouts or 0)
+    total_revenue = float(row.revenue or 0)
+    total_orders = int(row.orders or 0)
+    total_buyouts = int(row.buyouts or 0)
 
-    revenue_change = calc_change(total_revenue, float(previous.total_revenue or 0))
-    orders_change = calc_change(total_orders, int(previous.total_orders or 0))
+    revenue_change = calc_change(total_revenue, float(row.revenue_prev or 0))
+    orders_change = calc_change(total_orders, int(row.orders_prev or 0))
+    buyouts_change = calc_change(total_buyouts, int(row.buyouts_prev or 0))
 
     # Средний % выкупа
     avg_buyout_rate = round((total_buyouts / total_orders * 100), 1) if total_orders > 0 else 0.0
@@ -99,113 +67,151 @@ async def get_kpi(
     # Средний чек
     avg_check = round(total_revenue / total_buyouts, 2) if total_buyouts > 0 else 0.0
 
-    # Товары с низким остатком
-    low_stock_query = select(func.count(Product.nm_id)).where(
-        (Product.stock_wb + Product.stock_own) < 10
-    )
-    if cabinet_id:
-        low_stock_query = low_stock_query.where(Product.cabinet_id == cabinet_id)
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        low_stock_query = low_stock_query.where(Product.manager.in_(user_tags))
-
-    result_low_stock = await db.execute(low_stock_query)
-    low_stock_count = result_low_stock.scalar()
-
     return KPIResponse(
         total_revenue=total_revenue,
         revenue_change_percent=revenue_change,
         total_orders=total_orders,
         orders_change_percent=orders_change,
         total_buyouts=total_buyouts,
+        buyouts_change_percent=buyouts_change,
         avg_buyout_rate=avg_buyout_rate,
         avg_check=avg_check,
-        low_stock_count=low_stock_count
+        low_stock_count=row.low_stock_count,
+        date_from=windows.date_from,
+        date_to=windows.date_to,
+        compare_from=windows.compare_from,
+        compare_to=windows.compare_to
     )
 
 @router.get("/products", response_model=ProductListResponse)
 async def get_products(
+    request: Request,
+    response: Response,
     period: str = Query("week"),
     cabinet_id: Optional[int] = None,
     sort_by: str = Query("revenue", regex="^(revenue|orders|buyouts|buyout_rate|stock)$"),
     order: str = Query("desc", regex="^(asc|desc)$"),
-    page: int = Query(1, ge=1),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    page: int = Query(1, ge=1, description="Устарело: OFFSET-пагинация, используйте cursor"),
     limit: int = Query(20, ge=10, le=100),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    with_total: bool = Query(True),
+    current_user: User = Depends(get_current_user)
 ):
-    """Получить список товаров с метриками"""
+    """
+    Получить список товаров с метриками.
+
+    Страницы листаются по курсору (значение сортировки, nm_id): следующая
+    страница начинается сразу после последней строки предыдущей, поэтому время
+    ответа не растёт с номером страницы. Для последующих страниц передавайте
+    with_total=false — total нужен только для первой.
+    """
+    params = dict(
+        period=period, today=datetime.utcnow().date(), sort_by=sort_by, order=order,
+        cursor=cursor, page=page, limit=limit, with_total=with_total,
+    )
+    return await cached_response(
+        "products", current_user, cabinet_id, params,
+        lambda db: build_products(db, period, cabinet_id, sort_by, order, cursor, page, limit, with_total, current_user),
+        request, response,
+    )
 
-    # Период
-    period_map = {'day': 1, 'week': 7, 'month': 30, '3months': 90}
-    days = period_map.get(period, 7)
-    date_from = datetime.utcnow().date() - timedelta(days=days)
-    date_from_prev = date_from - timedelta(days=days)
+async def build_products(
+    db: AsyncSession,
+    period: str,
+    cabinet_id: Optional[int],
+    sort_by: str,
+    order: str,
+    cursor: Optional[str],
+    page: int,
+    limit: int,
+    with_total: bool,
+    current_user: User
+) -> ProductListResponse:
+    # Окна те же, что у KPI: period дней по сегодня и столько же дней перед ними
+    windows = resolve_windows(period if period in PERIOD_DAYS else 'week')
 
     # Подзапрос для текущего периода
+    current = product_sales(windows.date_from, windows.date_to, cabinet_id)
     subq_current = select(
-        SalesHistory.nm_id,
-        func.sum(SalesHistory.orders_count).label('orders'),
-        func.sum(SalesHistory.buyouts_count).label('buyouts'),
-        func.sum(SalesHistory.revenue).label('revenue')
-    ).where(SalesHistory.date >= date_from).group_by(SalesHistory.nm_id).subquery()
-
-    # Подзапрос для предыдущего периода
-    subq_prev = select(
-        SalesHistory.nm_id,
-        func.sum(SalesHistory.orders_count).label('orders_prev'),
-        func.sum(SalesHistory.buyouts_count).label('buyouts_prev'),
-        func.sum(SalesHistory.revenue).label('revenue_prev')
-    ).where(
-        SalesHistory.date >= date_from_prev,
-        SalesHistory.date < date_from
-    ).group_by(SalesHistory.nm_id).subquery()
+        current.c.nm_id,
+        func.sum(current.c.orders_count).label('orders'),
+        func.sum(current.c.buyouts_count).label('buyouts'),
+        func.sum(current.c.revenue).label('revenue')
+    ).group_by(current.c.nm_id).subquery()
+
+    orders_col = func.coalesce(subq_current.c.orders, 0)
+    buyouts_col = func.coalesce(subq_current.c.buyouts, 0)
+    revenue_col = func.coalesce(subq_current.c.revenue, 0)
+
+    # Ключ сортировки; nm_id делает порядок строк однозначным
+    sort_keys = {
+        'revenue': revenue_col,
+        'orders': orders_col,
+        'buyouts': buyouts_col,
+        'buyout_rate': func.coalesce(buyouts_col * 100.0 / func.nullif(orders_col, 0), 0),
+        'stock': Product.stock_wb + Product.stock_own,
+    }
+    sort_key = sort_keys[sort_by]
 
     # Основной запрос
     query = select(
         Product,
-        subq_current.c.orders,
-        subq_current.c.buyouts,
-        subq_current.c.revenue,
-        subq_prev.c.orders_prev,
-        subq_prev.c.buyouts_prev,
-        subq_prev.c.revenue_prev
-    ).outerjoin(subq_current, Product.nm_id == subq_current.c.nm_id)\
-     .outerjoin(subq_prev, Product.nm_id == subq_prev.c.nm_id)
+        orders_col,
+        buyouts_col,
+        revenue_col,
+        sort_key.label('sort_key')
+    ).outerjoin(subq_current, Product.nm_id == subq_current.c.nm_id)
 
     # Фильтры
     if cabinet_id:
         query = query.where(Product.cabinet_id == cabinet_id)
 
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        query = query.where(Product.manager.in_(user_tags))
-
-    # Сортировка
-    if sort_by == 'revenue':
-        col = subq_current.c.revenue
-    elif sort_by == 'orders':
-        col = subq_current.c.orders
-    elif sort_by == 'buyouts':
-        col = subq_current.c.buyouts
-    elif sort_by == 'stock':
-        col = Product.stock_wb + Product.stock_own
+    query = filter_by_user_tags(query, current_user)
+
+    # Пагинация: строки строго после (значение сортировки, nm_id) из курсора
+    position = tuple_(sort_key, Product.nm_id)
+    if cursor:
+        after = decode_cursor(cursor)
+        if after.get('sort_by') != sort_by or after.get('order') != order:
+            raise HTTPException(400, "Cursor does not match sort_by/order")
+        try:
+            bound = tuple_(literal(Decimal(after['key'])), literal(int(after['nm_id'])))
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise HTTPException(400, "Invalid cursor")
+        query = query.where(position < bound if order == 'desc' else position > bound)
+    elif page > 1:
+        query = query.offset((page - 1) * limit)
+
+    if order == 'desc':
+        query = query.order_by(sort_key.desc(), Product.nm_id.desc())
     else:
-        col = subq_current.c.revenue # default
+        query = query.order_by(sort_key.asc(), Product.nm_id.asc())
 
-    if col is not None: # check just in case
-        if order == 'desc':
-            query = query.order_by(col.desc().nulls_last())
-        else:
-            query = query.order_by(col.asc().nulls_first())
-
-    # Пагинация
-    offset = (page - 1) * limit
-    query = query.offset(offset).limit(limit)
-
-    result = await db.execute(query)
+    # Лишняя строка показывает, есть ли следующая страница
+    result = await db.execute(query.limit(limit + 1))
     rows = result.all()
 
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by=sort_by, order=order, key=str(last.sort_key), nm_id=last[0].nm_id)
+
+    # Предыдущий период считается только для товаров страницы
+    page_ids = [row[0].nm_id for row in rows]
+    previous = {}
+    if page_ids:
+        prev = product_sales(windows.compare_from, windows.compare_to, cabinet_id)
+        result_prev = await db.execute(
+            select(
+                prev.c.nm_id,
+                func.sum(prev.c.orders_count),
+                func.sum(prev.c.buyouts_count),
+                func.sum(prev.c.revenue)
+            ).where(prev.c.nm_id.in_(page_ids)).group_by(prev.c.nm_id)
+        )
+        previous = {row[0]: row[1:] for row in result_prev.all()}
+
     # Формирование ответа
     items = []
     for row in rows:
@@ -213,9 +219,10 @@ async def get_products(
         orders = int(row[1] or 0)
         buyouts = int(row[2] or 0)
         revenue = float(row[3] or 0)
-        orders_prev = int(row[4] or 0)
-        buyouts_prev = int(row[5] or 0)
-        revenue_prev = float(row[6] or 0)
+        prev_orders, prev_buyouts, prev_revenue = previous.get(product.nm_id, (0, 0, 0))
+        orders_prev = int(prev_orders or 0)
+        buyouts_prev = int(prev_buyouts or 0)
+        revenue_prev = float(prev_revenue or 0)
 
         # Вычисление динамики
         def calc_change(curr, prev):
@@ -246,47 +253,61 @@ async def get_products(
             total_stock=product.stock_wb + product.stock_own
         ))
 
-    # Подсчет total
-    count_query = select(func.count(Product.nm_id))
-    if cabinet_id:
-        count_query = count_query.where(Product.cabinet_id == cabinet_id)
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        count_query = count_query.where(Product.manager.in_(user_tags))
+    # Подсчет total (по индексам products, без агрегации продаж)
+    total = None
+    if with_total:
+        count_query = select(func.count(Product.nm_id))
+        if cabinet_id:
+            count_query = count_query.where(Product.cabinet_id == cabinet_id)
+        count_query = filter_by_user_tags(count_query, current_user)
 
-    result_count = await db.execute(count_query)
-    total = result_count.scalar()
+        result_count = await db.execute(count_query)
+        total = result_count.scalar()
 
     return ProductListResponse(
         items=items,
         total=total,
         page=page,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
     )
 
 @router.get("/charts/sales-by-cabinet", response_model=ChartDataResponse)
 async def get_sales_by_cabinet(
+    request: Request,
+    response: Response,
     period: str = Query("week", regex="^(day|week|month|3months)$"),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """График продаж по кабинетам"""
+    return await cached_response(
+        "sales-by-cabinet", current_user, None, {"period": period, "today": datetime.utcnow().date()},
+        lambda db: build_sales_by_cabinet(db, period, current_user),
+        request, response,
+    )
+
+async def build_sales_by_cabinet(db: AsyncSession, period: str, current_user: User) -> ChartDataResponse:
     period_map = {'day': 1, 'week': 7, 'month': 30, '3months': 90}
     days = period_map[period]
     date_from = datetime.utcnow().date() - timedelta(days=days)
 
-    query = select(
-        Cabinet.title,
-        func.sum(SalesHistory.revenue).label('total_revenue')
-    ).join(SalesHistory, Cabinet.id == SalesHistory.cabinet_id)\
-     .where(SalesHistory.date >= date_from)
+    today = datetime.utcnow().date()
 
     if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        query = query.join(Product, SalesHistory.nm_id == Product.nm_id)\
-                     .where(Product.manager.in_(user_tags))
+        source = product_sales(date_from, today)
+        query = select(
+            Cabinet.name,
+            func.sum(source.c.revenue).label('total_revenue')
+        ).join(source, Cabinet.id == source.c.cabinet_id)
+        query = filter_by_user_tags(query, current_user, source.c.nm_id)
+    else:
+        source = cabinet_totals(date_from, today)
+        query = select(
+            Cabinet.name,
+            func.sum(source.c.revenue).label('total_revenue')
+        ).join(source, Cabinet.id == source.c.cabinet_id)
 
-    query = query.group_by(Cabinet.title)
+    query = query.group_by(Cabinet.id, Cabinet.name)
 
     result = await db.execute(query)
     rows = result.all()
@@ -299,11 +320,19 @@ async def get_sales_by_cabinet(
 
 @router.get("/charts/stock-distribution", response_model=ChartDataResponse)
 async def get_stock_distribution(
+    request: Request,
+    response: Response,
     cabinet_id: Optional[int] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """Распределение остатков (WB vs Свой склад)"""
+    return await cached_response(
+        "stock-distribution", current_user, cabinet_id, {},
+        lambda db: build_stock_distribution(db, cabinet_id, current_user),
+        request, response,
+    )
+
+async def build_stock_distribution(db: AsyncSession, cabinet_id: Optional[int], current_user: User) -> ChartDataResponse:
     query = select(
         func.sum(Product.stock_wb).label('stock_wb'),
         func.sum(Product.stock_own).label('stock_own')
@@ -312,9 +341,7 @@ async def get_stock_distribution(
     if cabinet_id:
         query = query.where(Product.cabinet_id == cabinet_id)
 
-    if current_user.role == 'manager':
-        user_tags = get_user_tags(current_user)
-        query = query.where(Product.manager.in_(user_tags))
+    query = filter_by_user_tags(query, current_user)
 
     result = await db.execute(query)
     row = result.one()
@@ -336,10 +363,3 @@ async def sync_cabinet(
     # TODO: Добавить проверку прав на кабинет и запуск Celery задачи
 
     return {"status": "ok", "message": f"Sync started for cabinet {cabinet_id}"}
-from fastapi import APIRouter
-
-router = APIRouter()
-
-@router.get("/")
-async def read_dashboard():
-    return {"message": "Dashboard route"}
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func, case, desc, and_
-from app.core.dependencies import get_db, get_current_user
+from app.core.dependencies import get_current_user, filter_by_user_tags, tag_scope
+from app.db.session import get_read_db
 from app.models import Product, User, SalesHistory
 from pydantic import BaseModel
 from typing import List, Optional
@@ -32,7 +33,7 @@ async def list_products(
     cabinet_id: Optional[int] = None,
     manager: Optional[str] = None,
     period: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -100,7 +101,9 @@ async def list_products(
         query = query.where(Product.cabinet_id == cabinet_id)
     
     if manager:
-        query = query.where(Product.manager.contains(manager))
+        query = query.where(tag_scope([manager]))
+
+    query = filter_by_user_tags(query, current_user)
 
     result = await db.execute(query)
     
@@ -128,7 +131,7 @@ async def list_products(
 @router.get("/{nm_id}", response_model=ProductSchema)
 async def get_product(
     nm_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Получить товар по nm_id"""
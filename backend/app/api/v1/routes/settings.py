@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
 from app.db.session import get_db
-from app.models import Cabinet, User, Product
-from app.schemas.settings import CabinetCreate, CabinetResponse, UserCreate, UserUpdate, UserResponse
+from app.models import Cabinet, User, Product, SyncHistory
+from app.models.sync_history import SyncStatus, SyncType
+from app.schemas.settings import CabinetCreate, CabinetResponse, UserCreate, UserUpdate, UserResponse, SyncRunStatsResponse, SyncLockStatsResponse, CacheStatsResponse
 from app.core.dependencies import get_current_user, require_role
 from app.core.security import get_password_hash
-from app.services.wb_api import WildberriesAPIClient
+from app.services.wb_api import get_wb_client
+from app.services.response_cache import bump_data_version, cache_stats
+from app.tasks.fleet import lock_stats
 from app.models.user import User as UserModel
 import os
 
@@ -46,7 +50,7 @@ async def create_cabinet(
     """Создать новый кабинет с проверкой токена"""
 
     # Проверка валидности токена через WB API
-    wb_client = WildberriesAPIClient()
+    wb_client = get_wb_client()
     try:
         # Тестовый запрос
         await wb_client.get_stocks(cabinet_data.api_token)
@@ -86,7 +90,7 @@ async def update_cabinet(
 
     # Если токен изменился - проверить его
     if cabinet_data.api_token:
-        wb_client = WildberriesAPIClient()
+        wb_client = get_wb_client()
         try:
             await wb_client.get_stocks(cabinet_data.api_token)
             encrypted_token = fernet.encrypt(cabinet_data.api_token.encode()).decode()
@@ -97,6 +101,7 @@ async def update_cabinet(
     cabinet.name = cabinet_data.name
     await db.commit()
     await db.refresh(cabinet)
+    await bump_data_version(cabinet.id)
 
     return CabinetResponse(
         id=cabinet.id,
@@ -117,6 +122,7 @@ async def delete_cabinet(
 
     await db.delete(cabinet)
     await db.commit()
+    await bump_data_version(cabinet_id)
 
     return {"message": "Cabinet deleted successfully"}
 
@@ -280,6 +286,7 @@ async def upload_excel(
 
         # Обновление products
         updated_count = 0
+        updated_cabinets = set()
         for _, row in df.iterrows():
             vendor_code = row['Артикул продавца']
             stock = int(row['Остаток склад'])
@@ -290,10 +297,14 @@ async def upload_excel(
             product = result.scalar_one_or_none()
 
             if product:
+                if product.stock_own != stock:
+                    updated_cabinets.add(product.cabinet_id)
                 product.stock_own = stock
                 updated_count += 1
 
         await db.commit()
+        if updated_cabinets:
+            await bump_data_version(*updated_cabinets)
 
         return {
             "success": True,
@@ -307,10 +318,77 @@ async def upload_excel(
         # Удалить временный файл
         if os.path.exists(temp_path):
             os.remove(temp_path)
-from fastapi import APIRouter
 
-router = APIRouter()
+# ========== SYNC RUNS ==========
 
-@router.get("/")
-async def read_settings():
-    return {"message": "Settings route"}
+def _percentile(fraction: float, column):
+    return func.percentile_cont(fraction).within_group(column)
+
+def _stage(name: str):
+    return SyncHistory.stages[name].as_float()
+
+@router.get("/sync/stats", response_model=List[SyncRunStatsResponse])
+async def get_sync_stats(
+    days: int = Query(7, ge=1, le=90),
+    sync_type: Optional[SyncType] = Query(None),
+    cabinet_id: Optional[int] = Query(None),
+    current_user: UserModel = Depends(require_role(['admin'])),
+    db: AsyncSession = Depends(get_db)
+):
+    """p50/p95 длительности и объёмов завершённых запусков синхронизации по типу и кабинету"""
+    query = select(
+        SyncHistory.sync_type,
+        SyncHistory.cabinet_id,
+        func.count().label('runs'),
+        func.count().filter(SyncHistory.status == SyncStatus.failed).label('failed'),
+        _percentile(0.5, SyncHistory.duration).label('duration_p50'),
+        _percentile(0.95, SyncHistory.duration).label('duration_p95'),
+        _percentile(0.95, _stage('fetch')).label('fetch_p95'),
+        _percentile(0.95, _stage('parse')).label('parse_p95'),
+        _percentile(0.95, _stage('write')).label('write_p95'),
+        _percentile(0.5, SyncHistory.rows_written).label('rows_written_p50'),
+        _percentile(0.95, SyncHistory.throttle_wait).label('throttle_wait_p95'),
+        _percentile(0.95, SyncHistory.process_rss).label('process_rss_p95'),
+    ).where(
+        SyncHistory.last_sync_date >= datetime.utcnow() - timedelta(days=days),
+        SyncHistory.finished_at.isnot(None),
+    ).group_by(SyncHistory.sync_type, SyncHistory.cabinet_id)\
+     .order_by(SyncHistory.sync_type, SyncHistory.cabinet_id)
+
+    if sync_type:
+        query = query.where(SyncHistory.sync_type == sync_type)
+    if cabinet_id:
+        query = query.where(SyncHistory.cabinet_id == cabinet_id)
+
+    result = await db.execute(query)
+    return [SyncRunStatsResponse(**row._mapping) for row in result.all()]
+
+@router.get("/sync/locks", response_model=List[SyncLockStatsResponse])
+async def get_sync_lock_stats(
+    current_user: UserModel = Depends(require_role(['admin']))
+):
+    """Число запусков, объединённых с идущей синхронизацией кабинета или отброшенных, по типам"""
+    stats = await lock_stats()
+    return [
+        SyncLockStatsResponse(sync_type=sync_type, **values)
+        for sync_type, values in sorted(stats.items())
+    ]
+
+@router.get("/cache/stats", response_model=List[CacheStatsResponse])
+async def get_cache_stats(
+    current_user: UserModel = Depends(require_role(['admin']))
+):
+    """Доля попаданий и сэкономленное время кэша дашборда по эндпоинтам (с момента очистки Redis)"""
+    stats = await cache_stats()
+    return [
+        CacheStatsResponse(
+            endpoint=endpoint,
+            hits=int(values["hit"]),
+            stale=int(values["stale"]),
+            not_modified=int(values["not_modified"]),
+            misses=int(values["miss"]),
+            hit_ratio=values["hit_ratio"],
+            saved_seconds=round(values["saved"], 3),
+        )
+        for endpoint, values in sorted(stats.items())
+    ]
@@ -1,13 +1,72 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: str
     SECRET_KEY: str
+    # Реплика для тяжёлых чтений дашборда; не задана — чтения идут в основную БД
+    DATABASE_READ_URL: Optional[str] = None
     ALGORITHM: str = "RS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # Пулы соединений: основная БД — API и синхронизации, реплика — чтения дашборда
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_READ_POOL_SIZE: int = 20
+    DB_READ_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    # При отставании реплики больше REPLICA_MAX_LAG секунд чтения уходят в основную БД;
+    # отставание проверяется не чаще раза в REPLICA_LAG_CHECK_INTERVAL секунд
+    REPLICA_MAX_LAG: float = 30.0
+    REPLICA_LAG_CHECK_INTERVAL: float = 5.0
+
+    # Синхронизация WB
+    SYNC_BATCH_SIZE: int = 1000
+    # Сколько синхронизаций одновременно выполняет один процесс воркера на общем event loop
+    SYNC_WORKER_CONCURRENCY: int = 8
+    # Глобальный предел одновременных синхронизаций кабинетов по всем воркерам
+    SYNC_MAX_CONCURRENT: int = 16
+    # Слот продлевается вместе с арендой блокировки, TTL освобождает слоты упавших воркеров
+    SYNC_SLOT_TTL: int = 3600
+    SYNC_SLOT_POLL_INTERVAL: float = 2.0
+    # Аренда блокировки (кабинет, тип синхронизации); продлевается каждые TTL/3
+    SYNC_LOCK_TTL: int = 120
+
+    # Помесячные партиции sales_history: сколько месяцев создавать наперёд и сколько
+    # хранить; старые партиции отсоединяются и переносятся в схему архива ("" — удаляются)
+    SALES_PARTITION_MONTHS_AHEAD: int = 3
+    SALES_PARTITION_RETENTION_MONTHS: int = 25
+    SALES_PARTITION_ARCHIVE_SCHEMA: str = "archive"
+
+    # HTTP-клиент WB API (один на процесс)
+    WB_HTTP_TIMEOUT: float = 30.0
+    WB_HTTP_MAX_CONNECTIONS: int = 100
+    WB_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    WB_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    WB_HTTP2: bool = False
+
+    # Квоты WB API на токен (общие для всех воркеров через Redis)
+    WB_CONTENT_RATE_PER_MINUTE: int = 100
+    WB_CONTENT_BURST: int = 5
+    WB_STATISTICS_RATE_PER_MINUTE: int = 1
+    WB_STATISTICS_BURST: int = 1
+    # При X-Ratelimit-Remaining <= порога оставшиеся запросы растягиваются до сброса окна
+    WB_RATELIMIT_LOW_REMAINING: int = 2
+
+    # Дашборд читает целые недели и месяцы из предагрегатов (sales_rollup_*)
+    DASHBOARD_USE_ROLLUPS: bool = True
+    # Кэш ответов дашборда в Redis (0 — выключен). Запись инвалидируется версией данных
+    # кабинета; устаревшая запись не старше MAX_STALE секунд отдаётся сразу и
+    # пересчитывается в фоне
+    DASHBOARD_CACHE_TTL: int = 86400
+    DASHBOARD_CACHE_MAX_STALE: int = 3600
+
+    # Порт экспортера метрик Prometheus в воркере Celery (0 — выключен)
+    METRICS_WORKER_PORT: int = 9808
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
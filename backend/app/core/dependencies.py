@@ -1,14 +1,13 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.security import verify_token
 from app.db.session import get_db
-from app.models import User, Product
-from app.core.security import verify_token
-from app.db.session import get_db
-from app.models import User, Product
+from app.models import User, Product, ProductTag
+from app.models.product_tag import split_tags
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
@@ -40,13 +39,20 @@ def require_role(allowed_roles: List[str]):
         return current_user
     return role_checker
 
-async def filter_by_user_tags(
-    products: List[Product],
-    current_user: User
-) -> List[Product]:
-    """Фильтрует товары по тегам менеджера"""
+def get_user_tags(user: User) -> List[str]:
+    """Теги, по которым пользователю доступны товары"""
+    return split_tags(user.allowed_tags)
+
+def tag_scope(tags: List[str], nm_id=Product.nm_id):
+    """
+    Условие «у товара есть один из тегов»: полусоединение по индексу
+    product_tags (tag, nm_id) вместо сравнения строки Product.manager
+    """
+    return nm_id.in_(select(ProductTag.nm_id).where(ProductTag.tag.in_(tags)))
+
+def filter_by_user_tags(query, current_user: User, nm_id=Product.nm_id):
+    """Ограничивает запрос товарами, доступными менеджеру по тегам"""
     if current_user.role in ['admin', 'leader']:
-        return products
+        return query
 
-    user_tags = [tag.strip() for tag in (current_user.allowed_tags or "").split(",") if tag.strip()]
-    return [p for p in products if p.manager in user_tags]
+    return query.where(tag_scope(get_user_tags(current_user), nm_id))
@@ -0,0 +1,173 @@
+"""
+Метрики Prometheus для API и воркеров Celery.
+
+Все метрики — счётчики и гистограммы prometheus_client с ограниченным набором
+меток (шаблон маршрута, семейство эндпоинтов WB, тип SQL-операции), поэтому
+сбор стоит доли микросекунды на событие и может оставаться включённым под
+нагрузкой. При нескольких процессах (uvicorn --workers, prefork-воркер)
+задайте PROMETHEUS_MULTIPROC_DIR — тогда отдаются суммарные значения.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+# Бакеты под типичные времена: API и SQL — миллисекунды, WB и синхронизации — секунды
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Время выполнения SQL-запроса (count — число запросов)",
+    ["role", "operation"],
+    buckets=FAST_BUCKETS,
+)
+
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Отставание реплики по последней проверке",
+    multiprocess_mode="max",
+)
+
+DB_READ_FALLBACKS = Counter(
+    "db_read_fallback_total",
+    "Чтения, переведённые на основную БД из-за отставания или недоступности реплики",
+)
+
+WB_REQUEST_DURATION = Histogram(
+    "wb_api_request_duration_seconds",
+    "Время запроса к WB API",
+    ["family", "status"],
+    buckets=SLOW_BUCKETS,
+)
+
+WB_LIMITER_WAIT = Histogram(
+    "wb_api_limiter_wait_seconds",
+    "Ожидание квоты WB перед запросом",
+    ["family"],
+    buckets=SLOW_BUCKETS,
+)
+
+SYNC_DURATION = Histogram(
+    "sync_run_duration_seconds",
+    "Длительность запуска синхронизации",
+    ["sync_type", "status"],
+    buckets=SLOW_BUCKETS,
+)
+
+SYNC_ROWS = Counter(
+    "sync_rows_total",
+    "Строки, прочитанные из WB и записанные в БД синхронизацией",
+    ["sync_type", "direction"],
+)
+
+CACHE_REQUESTS = Counter(
+    "dashboard_cache_requests_total",
+    "Запросы к кэшу дашборда: hit, stale (отдана устаревшая запись), not_modified (304) или miss",
+    ["endpoint", "result"],
+)
+
+CACHE_SAVED = Counter(
+    "dashboard_cache_saved_seconds_total",
+    "Время расчёта, сэкономленное ответами из кэша",
+    ["endpoint"],
+)
+
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    return head if head in _SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine, role: str = "primary"):
+    """Подписывает движок SQLAlchemy на учёт числа и длительности запросов"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_QUERY_DURATION.labels(role, _operation(statement)).observe(time.perf_counter() - started)
+
+
+def observe_sync_run(sync_type: str, status: str, run):
+    SYNC_DURATION.labels(sync_type, status).observe(run.duration)
+    SYNC_ROWS.labels(sync_type, "read").inc(run.rows_read)
+    SYNC_ROWS.labels(sync_type, "written").inc(run.rows_written)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: гистограмма времени ответа по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон пути вместо фактического: /products/{nm_id}, а не каждый nm_id
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], path, str(status)).observe(time.perf_counter() - started)
+
+
+def _registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    """(тело, content-type) для эндпоинта /metrics"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_exporter(port: int):
+    """HTTP-экспортер метрик для процессов без веб-сервера (воркер Celery)"""
+    start_http_server(port, registry=_registry())
+
+
+def mark_process_dead():
+    """Убирает live-gauge завершившегося процесса в multiprocess-режиме"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
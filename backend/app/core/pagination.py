@@ -0,0 +1,26 @@
+"""
+Непрозрачные курсоры для keyset-пагинации.
+
+Курсор — base64url от JSON с ключом сортировки последней строки страницы;
+клиент передаёт его обратно как есть и не должен разбирать.
+"""
+import base64
+from typing import Any, Dict
+
+import msgspec
+from fastapi import HTTPException
+
+
+def encode_cursor(**values: Any) -> str:
+    return base64.urlsafe_b64encode(msgspec.json.encode(values)).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = msgspec.json.decode(payload)
+    except (ValueError, msgspec.DecodeError):
+        raise HTTPException(400, "Invalid cursor")
+    if not isinstance(values, dict):
+        raise HTTPException(400, "Invalid cursor")
+    return values
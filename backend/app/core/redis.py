@@ -0,0 +1,23 @@
+from typing import Optional
+from redis.asyncio import Redis
+from app.core.config import settings
+
+_redis: Optional[Redis] = None
+
+def get_redis() -> Redis:
+    """Общий для процесса асинхронный клиент Redis"""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(settings.REDIS_URL, decode_responses=False)
+    return _redis
+
+async def close_redis():
+    global _redis
+    client, _redis = _redis, None
+    if client is not None:
+        await client.aclose()
+
+def reset_redis():
+    """Сбрасывает унаследованный после fork клиент"""
+    global _redis
+    _redis = None
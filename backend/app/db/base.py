@@ -4,5 +4,9 @@ from app.db.base_class import Base
 from app.models.user import User  # noqa
 from app.models.cabinet import Cabinet  # noqa
 from app.models.product import Product  # noqa
+from app.models.product_tag import ProductTag  # noqa
 from app.models.sales_history import SalesHistory  # noqa
 from app.models.sync_history import SyncHistory  # noqa
+from app.models.sync_watermark import SyncWatermark  # noqa
+from app.models.sales_event import SalesEvent  # noqa
+from app.models.sales_rollup import SalesWeekly, SalesMonthly, CabinetDailyTotal  # noqa
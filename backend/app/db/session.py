@@ -1,11 +1,44 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import structlog
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.core.metrics import DB_READ_FALLBACKS, DB_REPLICA_LAG, instrument_engine
 import os
 
+log = structlog.get_logger()
+
 DATABASE_URL = os.getenv("DATABASE_URL", settings.DATABASE_URL)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", settings.DATABASE_READ_URL)
+
+# Основная БД: запись синхронизаций, авторизация, настройки
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.DB_ECHO,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+instrument_engine(engine)
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Реплика: агрегаты дашборда и списки товаров. Без DATABASE_READ_URL — тот же движок
+if DATABASE_READ_URL:
+    read_engine = create_async_engine(
+        DATABASE_READ_URL,
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    instrument_engine(read_engine, role="replica")
+else:
+    read_engine = engine
 
 async_session = async_sessionmaker(
     engine,
@@ -13,9 +46,103 @@ async_session = async_sessionmaker(
     expire_on_commit=False
 )
 
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
+# Секунды с последней применённой транзакции; 0, если реплика догнала основную
+# БД или это не реплика (например, второй независимый инстанс при разработке).
+# NULL (реплика устарела), если WAL receiver не в состоянии streaming: без связи
+# с основной БД принятый и применённый LSN совпадают, хотя данные не обновляются.
+# Статус виден только ролям с pg_read_all_stats (или pg_monitor)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaLagGuard:
+    """
+    Решает, можно ли читать с реплики. Отставание измеряется не чаще раза
+    в check_interval секунд на процесс; при превышении max_lag или ошибке
+    соединения чтения идут в основную БД до следующей проверки.
+    """
+
+    def __init__(self, engine, max_lag: float, check_interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None
+        # Момент (time.time()), все коммиты до которого уже применены на реплике
+        self.synced_until: Optional[float] = None
+        self._checked_at = float("-inf")
+
+    async def is_fresh(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            # Отметка ставится до запроса, чтобы параллельные запросы не проверяли повторно
+            self._checked_at = now
+            measured_at = time.time()
+            self.lag = await self._measure()
+            if self.lag is not None:
+                DB_REPLICA_LAG.set(self.lag)
+                # Реплика только догоняет, поэтому оценка остаётся верной до следующей проверки
+                self.synced_until = measured_at - self.lag
+            if not self._fresh:
+                log.warning("replica_stale", lag=self.lag, max_lag=self.max_lag)
+
+        return self._fresh
+
+    def covers(self, since: float) -> bool:
+        """Видны ли на реплике коммиты, сделанные до since (time.time())"""
+        return self.synced_until is not None and self.synced_until >= since
+
+    @property
+    def _fresh(self) -> bool:
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def _measure(self) -> Optional[float]:
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(REPLICA_LAG_SQL)).scalar()
+        except Exception as e:
+            log.warning("replica_lag_check_failed", error=str(e))
+            return None
+        return float(lag) if lag is not None else None
+
+
+replica_guard = ReplicaLagGuard(read_engine, settings.REPLICA_MAX_LAG, settings.REPLICA_LAG_CHECK_INTERVAL)
+
+
 async def get_db():
     async with async_session() as session:
         yield session
 
+@asynccontextmanager
+async def read_db(since: Optional[float] = None):
+    """
+    Сессия только для чтения: реплика, если она не отстаёт, иначе основная БД.
+    since — время коммита, который обязательно должен быть виден (например,
+    последней синхронизации): пока реплика его не применила, читается основная БД.
+    """
+    factory = async_session
+    if read_engine is not engine:
+        if await replica_guard.is_fresh() and (since is None or replica_guard.covers(since)):
+            factory = read_session
+        else:
+            DB_READ_FALLBACKS.inc()
+
+    async with factory() as session:
+        yield session
+
+async def get_read_db():
+    async with read_db() as session:
+        yield session
@@ -1,10 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.api.v1.routes import auth, products
+from app.api.v1.routes import auth, products, dashboard, settings as settings_routes
 from app.db.session import engine, Base, async_session
 from app.models import User
 from app.core.security import get_password_hash
+from app.services.wb_api import get_wb_client, close_wb_client
+from app.core.redis import close_redis
+from app.core.metrics import MetricsMiddleware, render_metrics
 from sqlalchemy.future import select
 
 @asynccontextmanager
@@ -12,9 +15,12 @@ async def lifespan(app: FastAPI):
     # Startup
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    get_wb_client()
 
     yield
     # Shutdown
+    await close_wb_client()
+    await close_redis()
 
 app = FastAPI(title="Wildberries Analytics Electra API", lifespan=lifespan)
 
@@ -27,9 +33,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # Routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(products.router, prefix="/api/v1", tags=["products"])
+app.include_router(dashboard.router, prefix="/api/v1")
+app.include_router(settings_routes.router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -38,3 +48,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,4 +1,9 @@
 from .user import User
 from .cabinet import Cabinet
 from .product import Product
+from .product_tag import ProductTag
 from .sales_history import SalesHistory
+from .sync_history import SyncHistory
+from .sync_watermark import SyncWatermark
+from .sales_event import SalesEvent
+from .sales_rollup import SalesWeekly, SalesMonthly, CabinetDailyTotal
@@ -23,6 +23,9 @@ class Product(Base):
     sales = Column(Integer, default=0)
     revenue = Column(Float, default=0.0)
     
+    # Хэш нормализованной карточки WB: строка перезаписывается только при его изменении
+    content_hash = Column(String(32))
+
     last_update = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,21 @@
+from typing import List, Optional
+from sqlalchemy import Column, String, BigInteger, ForeignKey, Index
+from app.db.base_class import Base
+
+
+def split_tags(value: Optional[str]) -> List[str]:
+    """Теги из строки через запятую (Product.manager, User.allowed_tags) без пустых и повторов"""
+    return list(dict.fromkeys(tag.strip() for tag in (value or "").split(",") if tag.strip()))
+
+
+class ProductTag(Base):
+    """Тег WB карточки товара; по тегам менеджерам назначаются товары"""
+    __tablename__ = "product_tags"
+
+    nm_id = Column(BigInteger, ForeignKey('products.nm_id', ondelete='CASCADE'), primary_key=True)
+    tag = Column(String(100), primary_key=True)
+
+    __table_args__ = (
+        # Область видимости менеджера: tag IN (...) -> nm_id только по индексу
+        Index('idx_product_tags_tag', 'tag', 'nm_id'),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, BigInteger, Boolean, ForeignKey, Numeric, Index, UniqueConstraint
+from app.db.base_class import Base
+
+class SalesEvent(Base):
+    """Исходная строка заказа или продажи WB, из которой пересчитывается sales_history"""
+    __tablename__ = "sales_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), nullable=False)
+    kind = Column(String(10), nullable=False, comment="order | sale")
+    external_id = Column(String(100), nullable=False, comment="srid заказа или saleID продажи")
+    nm_id = Column(BigInteger, nullable=False)
+    date = Column(Date, nullable=False)
+    is_buyout = Column(Boolean, nullable=False, default=False)
+    amount = Column(Numeric(12, 2), default=0)
+    last_change_date = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('cabinet_id', 'kind', 'external_id', name='uq_sales_event_key'),
+        Index('idx_sales_event_cabinet_nm_date', 'cabinet_id', 'nm_id', 'date'),
+    )
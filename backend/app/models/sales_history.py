@@ -1,25 +1,36 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, Date, DateTime, BigInteger, ForeignKey, Numeric, Index, UniqueConstraint
+from sqlalchemy import DDL, Column, Integer, Date, DateTime, BigInteger, ForeignKey, Numeric, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from app.db.base_class import Base
-from app.db.base_class import Base
 
 class SalesHistory(Base):
     __tablename__ = "sales_history"
 
+    # Таблица секционирована по месяцам (RANGE по date), поэтому ключ партиции
+    # входит в первичный ключ и в уникальное ограничение
     id = Column(Integer, primary_key=True, autoincrement=True)
     nm_id = Column(BigInteger, ForeignKey('products.nm_id', ondelete='CASCADE'), nullable=False)
     cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), nullable=False)
-    date = Column(Date, nullable=False)
+    date = Column(Date, primary_key=True)
     orders_count = Column(Integer, default=0)
     buyouts_count = Column(Integer, default=0)
     revenue = Column(Numeric(12, 2), default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
-        Index('idx_sales_nm_date', 'nm_id', 'date'),
+        # (nm_id, date) покрывается индексом uq_sales_nm_date
         Index('idx_sales_cabinet_date', 'cabinet_id', 'date'),
         UniqueConstraint('nm_id', 'date', name='uq_sales_nm_date'),
+        {'postgresql_partition_by': 'RANGE (date)'},
     )
 
     product = relationship("Product", back_populates="sales_history")
+
+
+# Партиции месяцев создаёт app.services.partitions; default принимает строки,
+# для которых партиции ещё нет (нужна и для create_all при старте API)
+event.listen(
+    SalesHistory.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS sales_history_default PARTITION OF sales_history DEFAULT").execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, Date, BigInteger, ForeignKey, Numeric, Index
+from app.db.base_class import Base
+
+# Предагрегаты sales_history. Обновляются синхронизацией продаж только для
+# затронутых ею недель, месяцев и дней (см. data_sync.refresh_sales_rollups)
+
+
+class SalesWeekly(Base):
+    """Продажи товара за календарную неделю (week_start — понедельник)"""
+    __tablename__ = "sales_rollup_weekly"
+
+    cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), primary_key=True)
+    nm_id = Column(BigInteger, primary_key=True)
+    week_start = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    buyouts_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_rollup_weekly_week', 'week_start', 'cabinet_id'),
+    )
+
+
+class SalesMonthly(Base):
+    """Продажи товара за календарный месяц (month_start — первое число)"""
+    __tablename__ = "sales_rollup_monthly"
+
+    cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), primary_key=True)
+    nm_id = Column(BigInteger, primary_key=True)
+    month_start = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    buyouts_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_rollup_monthly_month', 'month_start', 'cabinet_id'),
+    )
+
+
+class CabinetDailyTotal(Base):
+    """Итоги кабинета за день"""
+    __tablename__ = "cabinet_daily_totals"
+
+    cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), primary_key=True)
+    date = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)
+    buyouts_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_cabinet_daily_date', 'date'),
+    )
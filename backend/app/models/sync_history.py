@@ -1,6 +1,6 @@
 from datetime import datetime
 import enum
-from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey, Enum, Index
+from sqlalchemy import Column, Integer, BigInteger, Float, String, DateTime, Text, ForeignKey, Enum, Index, JSON
 from app.db.base_class import Base
 
 class SyncType(str, enum.Enum):
@@ -15,6 +15,7 @@ class SyncStatus(str, enum.Enum):
     in_progress = "in_progress"
 
 class SyncHistory(Base):
+    """Журнал запусков синхронизации: каждый запуск — отдельная строка"""
     __tablename__ = "sync_history"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -25,6 +26,18 @@ class SyncHistory(Base):
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Метрики запуска (заполняются по завершении)
+    mode = Column(String(20), nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)
+    stages = Column(JSON, nullable=True)  # {'fetch': сек, 'parse': сек, 'write': сек}
+    pages = Column(Integer, nullable=True)
+    rows_read = Column(Integer, nullable=True)
+    rows_written = Column(Integer, nullable=True)
+    throttle_wait = Column(Float, nullable=True)
+    process_rss = Column(BigInteger, nullable=True)  # максимальный RSS всего процесса воркера за запуск, байты
+
     __table_args__ = (
         Index('idx_sync_cabinet_type', 'cabinet_id', 'sync_type'),
+        Index('idx_sync_type_started', 'sync_type', 'last_sync_date'),
     )
@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Enum, UniqueConstraint
+from app.db.base_class import Base
+from app.models.sync_history import SyncType
+
+class SyncWatermark(Base):
+    """Курсор lastChangeDate статистики WB по кабинету и типу синхронизации"""
+    __tablename__ = "sync_watermarks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cabinet_id = Column(Integer, ForeignKey('cabinets.id', ondelete='CASCADE'), nullable=False)
+    sync_type = Column(Enum(SyncType), nullable=False)
+    last_change_date = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('cabinet_id', 'sync_type', name='uq_sync_watermark_cabinet_type'),
+    )
@@ -1,3 +1,4 @@
+from datetime import date
 from pydantic import BaseModel
 from typing import List, Optional, Any
 
@@ -7,9 +8,15 @@ class KPIResponse(BaseModel):
     total_orders: int
     orders_change_percent: float
     total_buyouts: int
+    buyouts_change_percent: float = 0.0
     avg_buyout_rate: float
     avg_check: float
     low_stock_count: int
+    # Окно расчёта и окно сравнения (None при compare=none)
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    compare_from: Optional[date] = None
+    compare_to: Optional[date] = None
 
 class ProductItem(BaseModel):
     nm_id: int
@@ -32,9 +39,10 @@ class ProductItem(BaseModel):
 
 class ProductListResponse(BaseModel):
     items: List[ProductItem]
-    total: int
+    total: Optional[int] = None
     page: int
     limit: int
+    next_cursor: Optional[str] = None
 
 class ChartDataPoint(BaseModel):
     name: str
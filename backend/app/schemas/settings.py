@@ -32,3 +32,31 @@ class UserResponse(BaseModel):
     role: str
     allowed_tags: Optional[str] = None
     created_at: datetime
+
+class SyncRunStatsResponse(BaseModel):
+    sync_type: str
+    cabinet_id: int
+    runs: int
+    failed: int
+    duration_p50: Optional[float] = None
+    duration_p95: Optional[float] = None
+    fetch_p95: Optional[float] = None
+    parse_p95: Optional[float] = None
+    write_p95: Optional[float] = None
+    rows_written_p50: Optional[float] = None
+    throttle_wait_p95: Optional[float] = None
+    process_rss_p95: Optional[float] = None
+
+class SyncLockStatsResponse(BaseModel):
+    sync_type: str
+    coalesced: int
+    skipped: int
+
+class CacheStatsResponse(BaseModel):
+    endpoint: str
+    hits: int
+    stale: int
+    not_modified: int
+    misses: int
+    hit_ratio: float
+    saved_seconds: float
@@ -0,0 +1,582 @@
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+import msgspec
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Date, Float, Integer, String, and_, any_, bindparam, func, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models import Product, ProductTag, SalesHistory, SalesEvent, SyncWatermark, SalesWeekly, SalesMonthly, CabinetDailyTotal
+from app.models.product_tag import split_tags
+from app.models.sync_history import SyncType
+from app.services.wb_schemas import Card, Order, Sale
+
+
+# Колонки результата агрегации продаж и их типы
+AGGREGATE_COLUMNS = {
+    "nm_id": np.int64,
+    "date": "datetime64[D]",
+    "orders_count": np.int64,
+    "buyouts_count": np.int64,
+    "revenue": np.float64,
+}
+
+
+# Упаковка ключа (nm_id, день): 20 младших бит под номер дня от 1900-01-01
+_DAY_BITS = 20
+_DAY_MASK = (1 << _DAY_BITS) - 1
+_DAY_OFFSET = int(np.datetime64("1900-01-01", "D").astype(np.int64))
+
+
+def _batches(rows: List[Dict[str, Any]], batch_size: int) -> Iterable[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Колонки DateTime без часового пояса: WB обычно отдаёт naive-время, но изредка с 'Z'"""
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+# Поля products, которые заполняются из карточки WB и входят в content_hash
+PRODUCT_CONTENT_FIELDS = ("vendor_code", "barcode", "title", "manager", "image_url", "sizes")
+
+
+def content_hash(row: Dict[str, Any]) -> str:
+    """Хэш нормализованного содержимого карточки (128 бит, hex)"""
+    payload = msgspec.json.encode([row[field] for field in PRODUCT_CONTENT_FIELDS])
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def product_row(card: Card, cabinet_id: int, now: datetime) -> Dict[str, Any]:
+    """Преобразует карточку WB в строку таблицы products"""
+    row = {
+        "nm_id": card.nm_id,
+        "cabinet_id": cabinet_id,
+        "vendor_code": card.vendor_code,
+        "barcode": card.barcode,
+        "title": card.object,
+        "manager": ",".join(card.tag_names),
+        "image_url": card.photo,
+        "sizes": msgspec.to_builtins(card.sizes),
+        "last_update": now,
+    }
+    row["content_hash"] = content_hash(row)
+    return row
+
+
+async def replace_product_tags(session: AsyncSession, rows: List[Dict[str, Any]]) -> int:
+    """Перезаписывает product_tags для переданных строк товаров (два запроса на пакет)"""
+    if not rows:
+        return 0
+
+    nm_ids = [row["nm_id"] for row in rows]
+    pairs = {(row["nm_id"], tag[:100]) for row in rows for tag in split_tags(row["manager"])}
+
+    await session.execute(
+        ProductTag.__table__.delete().where(
+            ProductTag.nm_id == any_(bindparam("nm_ids", nm_ids, type_=ARRAY(BigInteger)))
+        )
+    )
+    if not pairs:
+        return 0
+
+    tag_nm_ids, tags = zip(*pairs)
+    source = select(
+        func.unnest(bindparam("tag_nm_ids", list(tag_nm_ids), type_=ARRAY(BigInteger))),
+        func.unnest(bindparam("tags", list(tags), type_=ARRAY(String))),
+    )
+    stmt = insert(ProductTag).from_select(["nm_id", "tag"], source).on_conflict_do_nothing()
+    result = await session.execute(stmt)
+    return result.rowcount
+
+
+async def upsert_products(
+    session: AsyncSession,
+    cabinet_id: int,
+    cards: List[Card],
+    batch_size: int = None,
+) -> Tuple[int, int, int]:
+    """
+    Пакетный upsert карточек через INSERT ... ON CONFLICT (nm_id) DO UPDATE.
+    Существующая строка перезаписывается только при изменении content_hash,
+    поэтому неизменившиеся карточки не создают новых версий строк и записей в WAL.
+    Для вставленных и изменённых карточек перезаписываются их product_tags.
+    Возвращает (inserted, changed, unchanged). Коммит остаётся за вызывающим кодом.
+    """
+    batch_size = batch_size or settings.SYNC_BATCH_SIZE
+    now = datetime.utcnow()
+
+    # Дубликаты nm_id в одном INSERT дают ошибку ON CONFLICT — оставляем последнюю карточку
+    rows = list({card.nm_id: product_row(card, cabinet_id, now) for card in cards}.values())
+
+    inserted = changed = unchanged = 0
+    for batch in _batches(rows, batch_size):
+        stmt = insert(Product).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.nm_id],
+            set_={
+                "vendor_code": stmt.excluded.vendor_code,
+                "barcode": stmt.excluded.barcode,
+                "title": stmt.excluded.title,
+                "manager": stmt.excluded.manager,
+                "image_url": stmt.excluded.image_url,
+                "sizes": stmt.excluded.sizes,
+                "content_hash": stmt.excluded.content_hash,
+                "last_update": stmt.excluded.last_update,
+            },
+            # Строки с тем же хэшем не трогаются и не попадают в RETURNING
+            where=Product.content_hash.is_distinct_from(stmt.excluded.content_hash),
+        ).returning(Product.nm_id, literal_column("xmax = 0").label("inserted"))
+
+        result = await session.execute(stmt)
+        written = result.all()
+        batch_inserted = sum(1 for row in written if row.inserted)
+        inserted += batch_inserted
+        changed += len(written) - batch_inserted
+        unchanged += len(batch) - len(written)
+
+        written_ids = {row.nm_id for row in written}
+        await replace_product_tags(session, [row for row in batch if row["nm_id"] in written_ids])
+
+    return inserted, changed, unchanged
+
+
+async def upsert_sales_history(
+    session: AsyncSession,
+    cabinet_id: int,
+    columns: Dict[str, np.ndarray],
+    batch_size: int = None,
+) -> int:
+    """
+    Пакетный upsert агрегатов по (nm_id, date) из колонок SalesAggregator.result_columns().
+    Каждый пакет — один INSERT ... SELECT unnest(...) ON CONFLICT (nm_id, date)
+    DO UPDATE с пятью параметрами-массивами.
+    Все пакеты выполняются в транзакции вызывающей сессии.
+    """
+    batch_size = batch_size or settings.SYNC_BATCH_SIZE
+    total = len(columns["nm_id"])
+
+    written = 0
+    for start in range(0, total, batch_size):
+        part = slice(start, start + batch_size)
+        source = select(
+            func.unnest(bindparam("nm_ids", columns["nm_id"][part].tolist(), type_=ARRAY(BigInteger))),
+            literal(cabinet_id),
+            func.unnest(bindparam("dates", columns["date"][part].tolist(), type_=ARRAY(Date))),
+            func.unnest(bindparam("orders", columns["orders_count"][part].tolist(), type_=ARRAY(Integer))),
+            func.unnest(bindparam("buyouts", columns["buyouts_count"][part].tolist(), type_=ARRAY(Integer))),
+            func.unnest(bindparam("revenue", columns["revenue"][part].tolist(), type_=ARRAY(Float))),
+        )
+        stmt = insert(SalesHistory).from_select(
+            ["nm_id", "cabinet_id", "date", "orders_count", "buyouts_count", "revenue"],
+            source,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["nm_id", "date"],
+            set_={
+                "orders_count": stmt.excluded.orders_count,
+                "buyouts_count": stmt.excluded.buyouts_count,
+                "revenue": stmt.excluded.revenue,
+            },
+        )
+        result = await session.execute(stmt)
+        written += result.rowcount
+
+    return written
+
+
+async def apply_stocks(session: AsyncSession, cabinet_id: int, stocks_dict: Dict[int, int]) -> int:
+    """
+    Применяет агрегированные остатки WB к товарам кабинета одним UPDATE ... FROM.
+    Остатки передаются двумя массивами и разворачиваются через unnest, поэтому
+    размер запроса не зависит от числа SKU. Товары кабинета, отсутствующие в
+    ответе WB, получают stock_wb = 0. Обновляются только товары, у которых
+    остаток изменился; возвращается их число.
+    """
+    nm_ids = list(stocks_dict.keys())
+    quantities = [int(qty) for qty in stocks_dict.values()]
+
+    incoming = select(
+        func.unnest(bindparam("nm_ids", nm_ids, type_=ARRAY(BigInteger))).label("nm_id"),
+        func.unnest(bindparam("quantities", quantities, type_=ARRAY(Integer))).label("quantity"),
+    ).subquery("incoming")
+
+    cabinet_product = aliased(Product)
+    source = (
+        select(
+            cabinet_product.nm_id,
+            func.coalesce(incoming.c.quantity, 0).label("quantity"),
+        )
+        .outerjoin(incoming, incoming.c.nm_id == cabinet_product.nm_id)
+        .where(cabinet_product.cabinet_id == cabinet_id)
+        .subquery("source")
+    )
+
+    stmt = (
+        update(Product)
+        .where(
+            Product.nm_id == source.c.nm_id,
+            Product.stock_wb.is_distinct_from(source.c.quantity),
+        )
+        .values(stock_wb=source.c.quantity, last_update=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    return result.rowcount
+
+
+def _to_days(moments: List[datetime]) -> np.ndarray:
+    """
+    Векторное усечение datetime до дня (datetime64[D]). День берётся по времени
+    строки, как datetime.date() в sales_events, даже если в пачке смешаны
+    naive и aware значения.
+    """
+    return pd.DatetimeIndex([_naive(moment) for moment in moments]).values.astype("datetime64[D]")
+
+
+class SalesAggregator:
+    """
+    Колоночная агрегация заказов и выкупов по (nm_id, date).
+
+    Пачки строк (в т.ч. из потокового чтения ответа WB) сразу превращаются
+    в компактные массивы numpy; группировка выполняется один раз по всем строкам.
+    Если задан date_from, строки с более ранней датой пропускаются.
+    """
+
+    def __init__(self, date_from: Optional[date] = None):
+        self.date_from = date_from
+        self._chunks: List[Dict[str, np.ndarray]] = []
+
+    def add_orders(self, orders: List[Order]):
+        if not orders:
+            return
+        count = len(orders)
+        self._chunks.append({
+            "nm_id": np.fromiter((order.nm_id for order in orders), dtype=np.int64, count=count),
+            "date": _to_days([order.date for order in orders]),
+            "orders_count": np.ones(count, dtype=np.int64),
+            "buyouts_count": np.zeros(count, dtype=np.int64),
+            "revenue": np.zeros(count, dtype=np.float64),
+        })
+
+    def add_sales(self, sales: List[Sale]):
+        if not sales:
+            return
+        count = len(sales)
+        # Выкуп — продажа без отмены; выручка считается только по выкупам
+        is_buyout = np.fromiter((sale.is_buyout for sale in sales), dtype=bool, count=count)
+        price = np.fromiter((sale.price_with_disc for sale in sales), dtype=np.float64, count=count)
+        self._chunks.append({
+            "nm_id": np.fromiter((sale.nm_id for sale in sales), dtype=np.int64, count=count),
+            "date": _to_days([sale.date for sale in sales]),
+            "orders_count": np.zeros(count, dtype=np.int64),
+            "buyouts_count": is_buyout.astype(np.int64),
+            "revenue": np.where(is_buyout, price, 0.0),
+        })
+
+    def result_columns(self) -> Dict[str, np.ndarray]:
+        """Агрегаты в виде колонок nm_id, date, orders_count, buyouts_count, revenue"""
+        if not self._chunks:
+            return {name: np.array([], dtype=dtype) for name, dtype in AGGREGATE_COLUMNS.items()}
+
+        data = {name: np.concatenate([chunk[name] for chunk in self._chunks]) for name in AGGREGATE_COLUMNS}
+        days = data["date"].astype(np.int64)
+        if self.date_from:
+            keep = days >= np.datetime64(self.date_from, "D").astype(np.int64)
+            data = {name: values[keep] for name, values in data.items()}
+            days = days[keep]
+
+        # (nm_id, день) упаковываются в один int64: хеш-факторизация одной колонки
+        # и суммирование через bincount заметно быстрее groupby по двум ключам
+        keys = (data["nm_id"] << _DAY_BITS) | (days - _DAY_OFFSET)
+        codes, uniques = pd.factorize(keys, sort=False)
+        size = len(uniques)
+
+        return {
+            "nm_id": uniques >> _DAY_BITS,
+            "date": ((uniques & _DAY_MASK) + _DAY_OFFSET).astype("datetime64[D]"),
+            "orders_count": np.bincount(codes, weights=data["orders_count"], minlength=size).astype(np.int64),
+            "buyouts_count": np.bincount(codes, weights=data["buyouts_count"], minlength=size).astype(np.int64),
+            "revenue": np.bincount(codes, weights=data["revenue"], minlength=size),
+        }
+
+    def result(self) -> Dict[Tuple[int, date], Dict[str, Any]]:
+        """Те же агрегаты в виде словаря {(nm_id, date): {'orders', 'buyouts', 'revenue'}}"""
+        columns = self.result_columns()
+        return {
+            (nm_id, day): {'orders': orders, 'buyouts': buyouts, 'revenue': revenue}
+            for nm_id, day, orders, buyouts, revenue in zip(
+                columns["nm_id"].tolist(),
+                columns["date"].tolist(),
+                columns["orders_count"].tolist(),
+                columns["buyouts_count"].tolist(),
+                columns["revenue"].tolist(),
+            )
+        }
+
+
+def aggregate_sales(orders: List[Order], sales: List[Sale], date_from: Optional[date] = None) -> Dict[Tuple[int, date], Dict[str, Any]]:
+    """Агрегирует заказы и выкупы по (nm_id, date) за один вызов"""
+    aggregator = SalesAggregator(date_from)
+    aggregator.add_orders(orders)
+    aggregator.add_sales(sales)
+    return aggregator.result()
+
+
+def _event_row(cabinet_id: int, kind: str, external_id: str, item: Union[Order, Sale], is_buyout: bool) -> Dict[str, Any]:
+    return {
+        "cabinet_id": cabinet_id,
+        "kind": kind,
+        "external_id": str(external_id),
+        "nm_id": item.nm_id,
+        "date": item.date.date(),
+        "is_buyout": is_buyout,
+        "amount": item.price_with_disc,
+        "last_change_date": _naive(item.last_change_date),
+    }
+
+
+async def upsert_sales_events(
+    session: AsyncSession,
+    cabinet_id: int,
+    orders: List[Order],
+    sales: List[Sale],
+    batch_size: int = None,
+) -> Set[Tuple[int, date]]:
+    """
+    Сохраняет строки заказов/продаж WB в sales_events (ON CONFLICT по srid/saleID).
+    Возвращает множество затронутых ключей (nm_id, date).
+    """
+    batch_size = batch_size or settings.SYNC_BATCH_SIZE
+
+    # WB отдаёт строки по возрастанию lastChangeDate — последняя версия строки побеждает
+    events = {}
+    for order in orders:
+        external_id = order.external_id
+        if external_id:
+            events[('order', external_id)] = _event_row(cabinet_id, 'order', external_id, order, False)
+    for sale in sales:
+        if sale.sale_id:
+            events[('sale', sale.sale_id)] = _event_row(cabinet_id, 'sale', sale.sale_id, sale, sale.is_buyout)
+
+    rows = list(events.values())
+    for batch in _batches(rows, batch_size):
+        stmt = insert(SalesEvent).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_sales_event_key",
+            set_={
+                "nm_id": stmt.excluded.nm_id,
+                "date": stmt.excluded.date,
+                "is_buyout": stmt.excluded.is_buyout,
+                "amount": stmt.excluded.amount,
+                "last_change_date": stmt.excluded.last_change_date,
+            },
+        )
+        await session.execute(stmt)
+
+    return {(row["nm_id"], row["date"]) for row in rows}
+
+
+async def reaggregate_sales_buckets(
+    session: AsyncSession,
+    cabinet_id: int,
+    keys: Set[Tuple[int, date]],
+) -> int:
+    """
+    Пересчитывает sales_history только для затронутых (nm_id, date) из sales_events
+    одним INSERT ... SELECT ... GROUP BY ... ON CONFLICT DO UPDATE.
+    """
+    if not keys:
+        return 0
+
+    nm_ids, dates = zip(*keys)
+    affected = select(
+        func.unnest(bindparam("nm_ids", list(nm_ids), type_=ARRAY(BigInteger))).label("nm_id"),
+        func.unnest(bindparam("dates", list(dates), type_=ARRAY(Date))).label("date"),
+    ).subquery("affected")
+
+    is_order = SalesEvent.kind == 'order'
+    is_buyout = and_(SalesEvent.kind == 'sale', SalesEvent.is_buyout.is_(True))
+
+    aggregated = (
+        select(
+            SalesEvent.nm_id,
+            literal(cabinet_id).label("cabinet_id"),
+            SalesEvent.date,
+            func.count(SalesEvent.id).filter(is_order).label("orders_count"),
+            func.count(SalesEvent.id).filter(is_buyout).label("buyouts_count"),
+            func.coalesce(func.sum(SalesEvent.amount).filter(is_buyout), 0).label("revenue"),
+        )
+        .join(affected, and_(affected.c.nm_id == SalesEvent.nm_id, affected.c.date == SalesEvent.date))
+        .where(SalesEvent.cabinet_id == cabinet_id)
+        .group_by(SalesEvent.nm_id, SalesEvent.date)
+    )
+
+    stmt = insert(SalesHistory).from_select(
+        ["nm_id", "cabinet_id", "date", "orders_count", "buyouts_count", "revenue"],
+        aggregated,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["nm_id", "date"],
+        set_={
+            "orders_count": stmt.excluded.orders_count,
+            "buyouts_count": stmt.excluded.buyouts_count,
+            "revenue": stmt.excluded.revenue,
+        },
+    )
+    result = await session.execute(stmt)
+    return result.rowcount
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month_start(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _rollup_sums():
+    return (
+        func.coalesce(func.sum(SalesHistory.orders_count), 0).label("orders_count"),
+        func.coalesce(func.sum(SalesHistory.buyouts_count), 0).label("buyouts_count"),
+        func.coalesce(func.sum(SalesHistory.revenue), 0).label("revenue"),
+    )
+
+
+async def _refresh_nm_rollup(
+    session: AsyncSession,
+    model,
+    start_column: str,
+    cabinet_id: int,
+    buckets: Set[Tuple[int, date, date]],
+) -> int:
+    """Пересчитывает строки rollup-таблицы для (nm_id, начало, конец) из sales_history"""
+    nm_ids, starts, ends = zip(*buckets)
+    affected = select(
+        func.unnest(bindparam("nm_ids", list(nm_ids), type_=ARRAY(BigInteger))).label("nm_id"),
+        func.unnest(bindparam("starts", list(starts), type_=ARRAY(Date))).label("start"),
+        func.unnest(bindparam("ends", list(ends), type_=ARRAY(Date))).label("end"),
+    ).subquery("affected")
+
+    aggregated = (
+        select(literal(cabinet_id).label("cabinet_id"), SalesHistory.nm_id, affected.c.start, *_rollup_sums())
+        .join(affected, and_(
+            affected.c.nm_id == SalesHistory.nm_id,
+            SalesHistory.date >= affected.c.start,
+            SalesHistory.date < affected.c.end,
+        ))
+        .where(SalesHistory.cabinet_id == cabinet_id)
+        .group_by(SalesHistory.nm_id, affected.c.start)
+    )
+
+    stmt = insert(model).from_select(
+        ["cabinet_id", "nm_id", start_column, "orders_count", "buyouts_count", "revenue"],
+        aggregated,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cabinet_id", "nm_id", start_column],
+        set_={
+            "orders_count": stmt.excluded.orders_count,
+            "buyouts_count": stmt.excluded.buyouts_count,
+            "revenue": stmt.excluded.revenue,
+        },
+    )
+    result = await session.execute(stmt)
+    return result.rowcount
+
+
+async def _refresh_daily_totals(session: AsyncSession, cabinet_id: int, days: List[date]) -> int:
+    aggregated = (
+        select(literal(cabinet_id).label("cabinet_id"), SalesHistory.date, *_rollup_sums())
+        .where(
+            SalesHistory.cabinet_id == cabinet_id,
+            SalesHistory.date == any_(bindparam("days", days, type_=ARRAY(Date))),
+        )
+        .group_by(SalesHistory.date)
+    )
+    stmt = insert(CabinetDailyTotal).from_select(
+        ["cabinet_id", "date", "orders_count", "buyouts_count", "revenue"],
+        aggregated,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["cabinet_id", "date"],
+        set_={
+            "orders_count": stmt.excluded.orders_count,
+            "buyouts_count": stmt.excluded.buyouts_count,
+            "revenue": stmt.excluded.revenue,
+        },
+    )
+    result = await session.execute(stmt)
+    return result.rowcount
+
+
+async def refresh_sales_rollups(
+    session: AsyncSession,
+    cabinet_id: int,
+    keys: Set[Tuple[int, date]],
+) -> Dict[str, int]:
+    """
+    Обновляет недельные и месячные предагрегаты товаров и дневные итоги кабинета
+    только для недель, месяцев и дней, в которые попали затронутые (nm_id, date).
+    Вызывается после записи sales_history в той же транзакции.
+    """
+    if not keys:
+        return {}
+
+    weeks = {(nm_id, week_start(day), week_start(day) + timedelta(days=7)) for nm_id, day in keys}
+    months = {(nm_id, month_start(day), next_month_start(day)) for nm_id, day in keys}
+    days = sorted({day for _, day in keys})
+
+    return {
+        "weekly": await _refresh_nm_rollup(session, SalesWeekly, "week_start", cabinet_id, weeks),
+        "monthly": await _refresh_nm_rollup(session, SalesMonthly, "month_start", cabinet_id, months),
+        "daily": await _refresh_daily_totals(session, cabinet_id, days),
+    }
+
+
+async def get_watermark(session: AsyncSession, cabinet_id: int, sync_type: SyncType) -> Optional[datetime]:
+    """Текущий курсор lastChangeDate кабинета или None, если полной синхронизации ещё не было"""
+    result = await session.execute(
+        select(SyncWatermark.last_change_date).where(
+            SyncWatermark.cabinet_id == cabinet_id,
+            SyncWatermark.sync_type == sync_type,
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def set_watermark(session: AsyncSession, cabinet_id: int, sync_type: SyncType, last_change_date: datetime):
+    """Сдвигает курсор вперёд (никогда не назад)"""
+    stmt = insert(SyncWatermark).values(
+        cabinet_id=cabinet_id,
+        sync_type=sync_type,
+        last_change_date=last_change_date,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_sync_watermark_cabinet_type",
+        set_={
+            "last_change_date": func.greatest(SyncWatermark.last_change_date, stmt.excluded.last_change_date),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await session.execute(stmt)
+
+
+def max_last_change_date(rows: List[Union[Order, Sale]], current: Optional[datetime] = None) -> Optional[datetime]:
+    """Максимальный lastChangeDate среди строк WB (и текущего значения current)"""
+    values = [_naive(row.last_change_date) for row in rows if row.last_change_date]
+    if current is not None:
+        values.append(current)
+    return max(values) if values else None
@@ -1,7 +1,9 @@
 class APIError(Exception):
-    def __init__(self, message, status_code=None):
+    def __init__(self, message, status_code=None, retry_after=None):
         super().__init__(message)
         self.status_code = status_code
+        # Сколько секунд ждать перед повтором по заголовкам WB (None — не указано)
+        self.retry_after = retry_after
 
 class InvalidTokenError(APIError):
     pass
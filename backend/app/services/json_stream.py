@@ -0,0 +1,130 @@
+"""
+Инкрементальный разбор JSON-массива верхнего уровня из потока байтов.
+
+Ответы статистики WB — это один огромный массив плоских объектов. Сплиттер
+находит границы целых элементов в уже полученных байтах и отдаёт их пачкой
+в виде b'[...]', которую затем за один вызов разбирает msgspec. В памяти
+остаётся только хвост незавершённого элемента.
+"""
+from typing import Optional
+
+_WHITESPACE = b" \t\r\n"
+_SEPARATORS = b" \t\r\n,"
+
+
+class JsonArraySplitter:
+    def __init__(self):
+        self._buf = b""
+        self._started = False
+        self.finished = False
+
+    def feed(self, chunk: bytes) -> Optional[bytes]:
+        """Добавляет байты и возвращает пачку завершённых элементов как JSON-массив (или None)"""
+        if self.finished:
+            if chunk.strip(_WHITESPACE):
+                raise ValueError("Unexpected data after the end of JSON array")
+            return None
+
+        buf = self._buf + chunk
+        pos = 0
+
+        if not self._started:
+            pos = self._skip(buf, pos, _WHITESPACE)
+            if pos >= len(buf):
+                self._buf = b""
+                return None
+            if buf[pos:pos + 1] != b"[":
+                raise ValueError("Expected a JSON array")
+            self._started = True
+            pos += 1
+
+        batch_start = batch_end = None
+        while True:
+            pos = self._skip(buf, pos, _SEPARATORS)
+            if pos >= len(buf):
+                break
+            if buf[pos:pos + 1] == b"]":
+                self.finished = True
+                pos += 1
+                break
+
+            end = self._element_end(buf, pos)
+            if end < 0:
+                break
+            if batch_start is None:
+                batch_start = pos
+            batch_end = pos = end
+
+        self._buf = buf[pos:] if not self.finished else b""
+        if batch_start is None:
+            return None
+        return b"[" + buf[batch_start:batch_end] + b"]"
+
+    def close(self):
+        """Проверяет, что массив закрыт; вызывается после последнего чанка"""
+        if not self.finished:
+            raise ValueError("Truncated JSON array")
+
+    @staticmethod
+    def _skip(buf: bytes, pos: int, chars: bytes) -> int:
+        length = len(buf)
+        while pos < length and buf[pos] in chars:
+            pos += 1
+        return pos
+
+    def _element_end(self, buf: bytes, pos: int) -> int:
+        """Индекс сразу после элемента, начинающегося в pos, или -1, если он ещё не получен целиком"""
+        if buf[pos:pos + 1] == b"{":
+            # Быстрый путь для плоских объектов: ближайшая '}' закрывает объект,
+            # если до неё чётное число кавычек и нет экранирования/вложенности
+            search = pos + 1
+            while True:
+                close = buf.find(b"}", search)
+                if close < 0:
+                    return -1
+                segment = buf[pos + 1:close]
+                if b"\\" in segment or b"{" in segment or b"[" in segment:
+                    break
+                if segment.count(b'"') % 2 == 0:
+                    return close + 1
+                search = close + 1
+
+        return self._scan(buf, pos)
+
+    @staticmethod
+    def _scan(buf: bytes, pos: int) -> int:
+        """Посимвольный разбор для вложенных значений, строк с экранированием и скаляров"""
+        depth = 0
+        in_string = False
+        escaped = False
+        length = len(buf)
+        i = pos
+
+        while i < length:
+            ch = buf[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == 0x5C:  # backslash
+                    escaped = True
+                elif ch == 0x22:  # quote
+                    in_string = False
+                    if depth == 0:
+                        return i + 1
+            elif ch == 0x22:
+                in_string = True
+            elif ch in (0x7B, 0x5B):  # { [
+                depth += 1
+            elif ch in (0x7D, 0x5D):  # } ]
+                if depth == 0:
+                    # Конец массива верхнего уровня после скаляра
+                    return i
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            elif depth == 0 and (ch == 0x2C or ch in _WHITESPACE):
+                # Конец числа/литерала
+                return i
+            i += 1
+
+        return -1
@@ -0,0 +1,113 @@
+"""
+KPI дашборда за произвольное окно с окном сравнения.
+
+Текущее окно и окно сравнения считаются одним запросом: строки обоих окон
+читаются за один проход и раскладываются по окнам агрегатами
+FILTER (WHERE ...). Число товаров с низким остатком подставляется скалярным
+подзапросом, так что KPI — один round-trip к БД.
+"""
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, null, or_, select
+
+from app.core.dependencies import filter_by_user_tags
+from app.models import Product
+from app.models.user import User
+from app.services.sales_rollups import cabinet_daily_source, product_sales_windows
+
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30, '3months': 90}
+COMPARE_MODES = ('previous', 'yoy', 'none')
+LOW_STOCK_THRESHOLD = 10
+
+
+class KpiWindows(NamedTuple):
+    date_from: date
+    date_to: date
+    compare_from: Optional[date] = None
+    compare_to: Optional[date] = None
+
+
+def shift_year(day: date, years: int = -1) -> date:
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        # 29 февраля -> 28 февраля невисокосного года
+        return day.replace(year=day.year + years, day=28)
+
+
+def resolve_windows(
+    period: str = 'week',
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    compare: str = 'previous',
+) -> KpiWindows:
+    """
+    Окно [date_from, date_to] (включительно) и окно сравнения.
+    Без date_from окно — period дней по date_to (по умолчанию сегодня) включительно.
+    previous — окно той же длины непосредственно перед текущим, yoy — те же даты годом ранее.
+    """
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=PERIOD_DAYS[period] - 1)
+    if date_from > date_to:
+        raise ValueError("date_from must not be later than date_to")
+
+    if compare == 'previous':
+        compare_to = date_from - timedelta(days=1)
+        return KpiWindows(date_from, date_to, compare_to - (date_to - date_from), compare_to)
+    if compare == 'yoy':
+        return KpiWindows(date_from, date_to, shift_year(date_from), shift_year(date_to))
+    return KpiWindows(date_from, date_to)
+
+
+def _sums(revenue, orders, buyouts, condition, suffix: str):
+    if condition is None:
+        return [null().label(f"revenue{suffix}"), null().label(f"orders{suffix}"), null().label(f"buyouts{suffix}")]
+    return [
+        func.sum(revenue).filter(condition).label(f"revenue{suffix}"),
+        func.sum(orders).filter(condition).label(f"orders{suffix}"),
+        func.sum(buyouts).filter(condition).label(f"buyouts{suffix}"),
+    ]
+
+
+def kpi_query(windows: KpiWindows, cabinet_id: Optional[int], current_user: User):
+    """
+    Запрос одной строки: revenue/orders/buyouts за текущее окно, те же
+    колонки с суффиксом _prev за окно сравнения (NULL без сравнения)
+    и low_stock_count.
+    """
+    current = (windows.date_from, windows.date_to)
+    compare = (windows.compare_from, windows.compare_to) if windows.compare_from else None
+
+    if current_user.role == 'manager':
+        # Нужна разбивка по товарам: недели/месяцы из rollup-таблиц, окна помечены в колонке window
+        ranges = {'current': current}
+        if compare:
+            ranges['compare'] = compare
+        source = product_sales_windows(ranges, cabinet_id)
+        in_current = source.c.window == 'current'
+        in_compare = source.c.window == 'compare' if compare else None
+        query = select(
+            *_sums(source.c.revenue, source.c.orders_count, source.c.buyouts_count, in_current, ""),
+            *_sums(source.c.revenue, source.c.orders_count, source.c.buyouts_count, in_compare, "_prev"),
+        )
+        query = filter_by_user_tags(query, current_user, source.c.nm_id)
+    else:
+        totals = cabinet_daily_source()
+        in_current = totals.date.between(*current)
+        in_compare = totals.date.between(*compare) if compare else None
+        query = select(
+            *_sums(totals.revenue, totals.orders_count, totals.buyouts_count, in_current, ""),
+            *_sums(totals.revenue, totals.orders_count, totals.buyouts_count, in_compare, "_prev"),
+        ).where(or_(in_current, in_compare) if compare else in_current)
+        if cabinet_id:
+            query = query.where(totals.cabinet_id == cabinet_id)
+
+    low_stock = select(func.count(Product.nm_id)).where(
+        (Product.stock_wb + Product.stock_own) < LOW_STOCK_THRESHOLD
+    )
+    if cabinet_id:
+        low_stock = low_stock.where(Product.cabinet_id == cabinet_id)
+    low_stock = filter_by_user_tags(low_stock, current_user)
+
+    return query.add_columns(low_stock.scalar_subquery().label("low_stock_count"))
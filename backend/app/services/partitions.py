@@ -0,0 +1,165 @@
+"""
+Обслуживание помесячных партиций sales_history.
+
+Таблица секционирована по RANGE (date): партиция sales_history_yYYYYmMM на
+каждый месяц плюс sales_history_default для дат, под которые партиции ещё
+нет. Ежесуточная задача создаёт партиции на несколько месяцев вперёд,
+переносит в собственные партиции строки, попавшие в default, и отсоединяет
+партиции старше срока хранения (в схему архива или с удалением). Строки
+default за месяцы старше срока хранения тоже уходят в архив или удаляются.
+"""
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.data_sync import month_start, next_month_start
+
+log = structlog.get_logger()
+
+SALES_TABLE = "sales_history"
+DEFAULT_PARTITION = "sales_history_default"
+
+_PARTITION_NAME = re.compile(r"^sales_history_y(\d{4})m(\d{2})$")
+
+# Ключ advisory-lock: обслуживание не должно выполняться параллельно
+_MAINTENANCE_LOCK = "sales_history_partitions"
+
+
+def partition_name(month: date) -> str:
+    return f"{SALES_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def shift_months(month: date, months: int) -> date:
+    """Первое число месяца, отстоящего от month на months (может быть отрицательным)"""
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return date(year, index + 1, 1)
+
+
+async def list_sales_partitions(session: AsyncSession) -> Dict[date, str]:
+    """Помесячные партиции sales_history: {первое число месяца: имя таблицы}"""
+    result = await session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass)"
+    ), {"table": SALES_TABLE})
+
+    partitions = {}
+    for (name,) in result:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+async def create_sales_partition(session: AsyncSession, month: date) -> int:
+    """
+    Создаёт партицию месяца и переносит в неё строки из default-партиции.
+    Возвращает число перенесённых строк.
+
+    CREATE TABLE ... PARTITION OF завершился бы ошибкой, если в default уже
+    есть строки этого месяца, поэтому таблица создаётся отдельно, заполняется
+    и присоединяется через ATTACH PARTITION (индексы и ограничения родителя
+    при этом создаются автоматически).
+    """
+    name = partition_name(month)
+    lower, upper = month, next_month_start(month)
+
+    await session.execute(text(f"CREATE TABLE {name} (LIKE {SALES_TABLE} INCLUDING DEFAULTS)"))
+    moved = await session.execute(text(
+        f"WITH moved AS ("
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE date >= :lower AND date < :upper RETURNING *"
+        f") INSERT INTO {name} SELECT * FROM moved"
+    ), {"lower": lower, "upper": upper})
+    await session.execute(text(
+        f"ALTER TABLE {SALES_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    ))
+    return moved.rowcount
+
+
+async def detach_sales_partition(session: AsyncSession, name: str, archive_schema: Optional[str]):
+    await session.execute(text(f"ALTER TABLE {SALES_TABLE} DETACH PARTITION {name}"))
+    if archive_schema:
+        await session.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        await session.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+    else:
+        await session.execute(text(f"DROP TABLE {name}"))
+
+
+async def expire_default_rows(session: AsyncSession, month: date, archive_schema: Optional[str]) -> int:
+    """
+    Убирает из default-партиции строки месяца старше срока хранения: переносит
+    в архивную таблицу месяца (она же принимает отсоединённую партицию) или
+    удаляет. Возвращает число строк.
+    """
+    bounds = {"lower": month, "upper": next_month_start(month)}
+    condition = "date >= :lower AND date < :upper"
+    if not archive_schema:
+        result = await session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {condition}"), bounds)
+        return result.rowcount
+
+    archive = f"{archive_schema}.{partition_name(month)}"
+    await session.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+    await session.execute(text(f"CREATE TABLE IF NOT EXISTS {archive} (LIKE {SALES_TABLE} INCLUDING DEFAULTS)"))
+    result = await session.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {condition} RETURNING *) "
+        f"INSERT INTO {archive} SELECT * FROM moved"
+    ), bounds)
+    return result.rowcount
+
+
+async def maintain_sales_partitions(
+    session: AsyncSession,
+    today: Optional[date] = None,
+    months_ahead: Optional[int] = None,
+    retention_months: Optional[int] = None,
+    archive_schema: Optional[str] = None,
+) -> Dict[str, List[str]]:
+    """
+    Создаёт недостающие партиции (текущий месяц + months_ahead, а также месяцы,
+    строки которых лежат в default) и отсоединяет партиции старше retention_months.
+    Строки default старше срока хранения архивируются без создания партиций.
+    Выполняется в транзакции вызывающего под advisory-lock.
+    """
+    today = today or datetime.utcnow().date()
+    months_ahead = settings.SALES_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    retention_months = settings.SALES_PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+    archive_schema = settings.SALES_PARTITION_ARCHIVE_SCHEMA if archive_schema is None else archive_schema
+
+    await session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": _MAINTENANCE_LOCK})
+
+    current = month_start(today)
+    cutoff = shift_months(current, -retention_months)
+    existing = await list_sales_partitions(session)
+
+    result = await session.execute(text(
+        f"SELECT DISTINCT CAST(date_trunc('month', date) AS date) FROM {DEFAULT_PARTITION}"
+    ))
+    stray = {month for (month,) in result}
+    wanted = {shift_months(current, i) for i in range(months_ahead + 1)} | {month for month in stray if month >= cutoff}
+
+    created = []
+    for month in sorted(wanted - set(existing)):
+        moved = await create_sales_partition(session, month)
+        created.append(partition_name(month))
+        if moved:
+            log.info("sales_partition_rows_moved", partition=partition_name(month), rows=moved)
+
+    archived = []
+    for month, name in sorted(existing.items()):
+        if month < cutoff:
+            await detach_sales_partition(session, name, archive_schema)
+            archived.append(name)
+
+    expired = []
+    for month in sorted(month for month in stray if month < cutoff):
+        rows = await expire_default_rows(session, month, archive_schema)
+        expired.append(partition_name(month))
+        log.info("sales_default_rows_expired", month=month.isoformat(), rows=rows, archive_schema=archive_schema or None)
+
+    return {"created": created, "archived": archived, "expired": expired}
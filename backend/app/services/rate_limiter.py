@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+from typing import Dict, Tuple
+from redis.asyncio import Redis
+
+# Token bucket с резервированием: токены списываются сразу, даже в минус,
+# а скрипт возвращает, сколько миллисекунд вызывающему нужно подождать.
+# Так конкурирующие воркеры выстраиваются в очередь за один round trip,
+# а время берётся из Redis и не зависит от часов воркеров.
+TOKEN_BUCKET_SCRIPT = """
+local key = KEYS[1]
+local block_key = KEYS[2]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+tokens = tokens - requested
+
+local wait_ms = 0
+if tokens < 0 then
+    wait_ms = math.ceil(-tokens * 1000 / rate)
+end
+
+-- Пауза, выставленная по заголовкам ответа WB (429 / мало Remaining)
+local blocked_ms = redis.call('PTTL', block_key)
+if blocked_ms > wait_ms then
+    wait_ms = blocked_ms
+end
+
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + wait_ms + 1000)
+return wait_ms
+"""
+
+# Продлевает паузу токена, но никогда не сокращает уже выставленную
+PENALTY_SCRIPT = """
+local current = redis.call('PTTL', KEYS[1])
+local requested = tonumber(ARGV[1])
+if current < requested then
+    redis.call('SET', KEYS[1], '1', 'PX', requested)
+    return requested
+end
+return current
+"""
+
+class RedisTokenBucket:
+    """
+    Распределённый лимитер запросов WB API.
+    Корзина хранится в Redis по ключу (хэш API токена, семейство эндпоинтов),
+    поэтому квота соблюдается для всех воркеров и процессов сразу.
+    """
+
+    def __init__(self, redis: Redis, limits: Dict[str, Tuple[float, float]], prefix: str = "wb:ratelimit"):
+        # limits: family -> (запросов в секунду, размер burst)
+        self.redis = redis
+        self.limits = limits
+        self.prefix = prefix
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self._penalty_script = redis.register_script(PENALTY_SCRIPT)
+
+    def _key(self, api_token: str, family: str) -> str:
+        token_hash = hashlib.sha256(api_token.encode()).hexdigest()[:16]
+        return f"{self.prefix}:{family}:{token_hash}"
+
+    def _block_key(self, api_token: str, family: str) -> str:
+        return f"{self._key(api_token, family)}:block"
+
+    async def reserve(self, api_token: str, family: str, tokens: int = 1) -> float:
+        """Резервирует токены и возвращает время ожидания в секундах (0 — можно сразу)"""
+        rate, capacity = self.limits[family]
+        keys = [self._key(api_token, family), self._block_key(api_token, family)]
+        wait_ms = await self._script(keys=keys, args=[rate, capacity, tokens])
+        return int(wait_ms) / 1000
+
+    async def penalize(self, api_token: str, family: str, seconds: float) -> float:
+        """Приостанавливает выдачу токенов для (token, family) на всех воркерах"""
+        ms = max(1, int(seconds * 1000))
+        result = await self._penalty_script(keys=[self._block_key(api_token, family)], args=[ms])
+        return int(result) / 1000
+
+    async def acquire(self, api_token: str, family: str, tokens: int = 1) -> float:
+        """Ждёт своей очереди и возвращает фактическое время ожидания в секундах"""
+        wait = await self.reserve(api_token, family, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+# Счётный семафор на ZSET: участник — id задачи, score — срок аренды слота.
+# Просроченные аренды (упавший воркер) освобождаются при следующем захвате.
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local member = ARGV[2]
+local ttl_ms = tonumber(ARGV[3])
+
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+if redis.call('ZSCORE', key, member) or redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now + ttl_ms, member)
+    redis.call('PEXPIRE', key, ttl_ms)
+    return 1
+end
+return 0
+"""
+
+# Продление слота, пока он ещё принадлежит member (не истёк и не освобождён)
+SEMAPHORE_RENEW_SCRIPT = """
+local key = KEYS[1]
+local member = ARGV[1]
+local ttl_ms = tonumber(ARGV[2])
+
+if not redis.call('ZSCORE', key, member) then
+    return 0
+end
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+redis.call('ZADD', key, now + ttl_ms, member)
+redis.call('PEXPIRE', key, ttl_ms)
+return 1
+"""
+
+class RedisSemaphore:
+    """
+    Глобальное ограничение числа одновременно выполняемых операций
+    для всех воркеров и процессов.
+    """
+
+    def __init__(self, redis: Redis, key: str, limit: int, ttl: float, poll_interval: float = 1.0):
+        self.redis = redis
+        self.key = key
+        self.limit = limit
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._script = redis.register_script(SEMAPHORE_ACQUIRE_SCRIPT)
+        self._renew_script = redis.register_script(SEMAPHORE_RENEW_SCRIPT)
+
+    async def try_acquire(self, member: str) -> bool:
+        """Занимает (или продлевает) слот; False — все слоты заняты"""
+        acquired = await self._script(keys=[self.key], args=[self.limit, member, int(self.ttl * 1000)])
+        return bool(acquired)
+
+    async def acquire(self, member: str) -> float:
+        """Ждёт свободный слот и возвращает время ожидания в секундах"""
+        waited = 0.0
+        while not await self.try_acquire(member):
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+        return waited
+
+    async def renew(self, member: str) -> bool:
+        """Продлевает занятый слот на ttl; False — слот не занят member"""
+        return bool(await self._renew_script(keys=[self.key], args=[member, int(self.ttl * 1000)]))
+
+    async def release(self, member: str):
+        await self.redis.zrem(self.key, member)
@@ -0,0 +1,243 @@
+"""
+Кэш ответов дашборда в Redis.
+
+Данные дашборда меняются только после синхронизации, поэтому запись кэша
+помечается версией данных: счётчиком кабинета wb:data:version:<id> (или общим
+для запросов по всем кабинетам), который синхронизации увеличивают после
+коммита. Запись с текущей версией отдаётся сразу. Запись со старой версией,
+но не старше DASHBOARD_CACHE_MAX_STALE, тоже отдаётся сразу, а пересчёт идёт
+в фоне (stale-while-revalidate) — один на ключ по всем процессам API.
+
+Ключ записи — эндпоинт, область видимости пользователя (все товары или его
+теги) и параметры запроса. Счётчики попаданий и сэкономленного времени
+пишутся в Redis-хэш (сводка по всем процессам) и в метрики Prometheus.
+
+Запись хранит сильный ETag — хэш своих данных. Пока запись не пересчитана,
+повторный запрос с If-None-Match получает 304 без обращения к базе —
+открытый на весь день дашборд опрашивает API почти бесплатно.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+import msgspec
+import structlog
+from fastapi import Request, Response
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS, CACHE_SAVED
+from app.core.redis import get_redis
+from app.db.session import read_db
+from app.models.product_tag import split_tags
+from app.models.user import User
+
+log = structlog.get_logger()
+
+CACHE_PREFIX = "wb:cache"
+STATS_KEY = "wb:cache:stats"
+VERSION_PREFIX = "wb:data:version"
+GLOBAL_VERSION_KEY = f"{VERSION_PREFIX}:all"
+# Пересчёт устаревшей записи дольше этого считается зависшим
+REFRESH_LOCK_TTL = 60
+
+Compute = Callable[[AsyncSession], Awaitable[BaseModel]]
+
+# Ссылки на фоновые пересчёты, чтобы задачи не собрал сборщик мусора
+_refreshing = set()
+
+
+def version_key(cabinet_id: Optional[int]) -> str:
+    return f"{VERSION_PREFIX}:{cabinet_id}" if cabinet_id else GLOBAL_VERSION_KEY
+
+
+def bumped_at_key(cabinet_id: Optional[int]) -> str:
+    return f"{version_key(cabinet_id)}:at"
+
+
+async def bump_data_version(*cabinet_ids: int):
+    """
+    Инвалидирует кэш дашборда для кабинетов (и запросов по всем кабинетам).
+    Вызывается после коммита; время увеличения версии не даёт пересчитать
+    запись на реплике, ещё не получившей эти данные.
+    """
+    now = time.time()
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        for cabinet_id in (*cabinet_ids, None):
+            pipe.incr(version_key(cabinet_id))
+            pipe.set(bumped_at_key(cabinet_id), now)
+        await pipe.execute()
+    except RedisError as e:
+        # Кэш обновится по DASHBOARD_CACHE_TTL; синхронизацию это не прерывает
+        log.warning("data_version_bump_failed", cabinet_ids=cabinet_ids, error=str(e))
+
+
+def user_scope(user: User) -> str:
+    if user.role in ['admin', 'leader']:
+        return "all"
+    return "tags:" + ",".join(sorted(split_tags(user.allowed_tags)))
+
+
+def cache_key(endpoint: str, scope: str, params: Dict[str, Any]) -> str:
+    payload = msgspec.json.encode([scope, sorted(params.items())])
+    return f"{CACHE_PREFIX}:{endpoint}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+async def cached_response(
+    endpoint: str,
+    user: User,
+    cabinet_id: Optional[int],
+    params: Dict[str, Any],
+    compute: Compute,
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+) -> Union[Dict[str, Any], Response]:
+    """
+    Ответ эндпоинта из кэша или из compute(session). compute получает собственную
+    сессию чтения: при фоновом пересчёте сессия запроса уже закрыта.
+    При недоступном Redis ответ просто считается заново.
+
+    Если переданы request и response, ответ получает ETag записи, а совпавший
+    If-None-Match возвращает 304. Запись из кэша проверяется без запросов к
+    базе; без кэша (DASHBOARD_CACHE_TTL=0, Redis недоступен) ответ сначала
+    считается, и 304 экономит только передачу тела.
+    """
+    if not settings.DASHBOARD_CACHE_TTL:
+        return _reply(await _compute(compute, version=0), request, response)
+
+    redis = get_redis()
+    key = cache_key(endpoint, user_scope(user), {**params, "cabinet_id": cabinet_id})
+    try:
+        version, bumped_at, raw = await redis.mget(version_key(cabinet_id), bumped_at_key(cabinet_id), key)
+    except RedisError as e:
+        log.warning("dashboard_cache_unavailable", error=str(e))
+        return _reply(await _compute(compute, version=0), request, response)
+
+    version = int(version or 0)
+    since = float(bumped_at) if bumped_at else None
+    entry = msgspec.json.decode(raw) if raw is not None else None
+    if entry and entry["version"] == version:
+        result = "hit"
+    elif entry and time.time() - entry["created"] <= settings.DASHBOARD_CACHE_MAX_STALE:
+        result = "stale"
+        await _schedule_refresh(key, version, since, compute)
+    else:
+        result = "miss"
+        entry = await _refresh(key, version, since, compute)
+
+    if result != "miss" and _client_has(request, entry):
+        result = "not_modified"
+    await _record(endpoint, result, entry["cost"] if result != "miss" else 0.0)
+    return _reply(entry, request, response)
+
+
+def etag(data: Any) -> str:
+    """Сильный ETag по содержимому: одинаковые данные дают побайтно одинаковый ответ"""
+    digest = hashlib.blake2b(msgspec.json.encode(data), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Проверка If-None-Match; для GET сравнение слабое (RFC 9110), префикс W/ отбрасывается"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == tag for value in candidates)
+
+
+def _etag_headers(tag: str) -> Dict[str, str]:
+    # Ответ зависит от пользователя: общим кэшам хранить нельзя, браузер каждый раз перепроверяет
+    return {"ETag": tag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+
+def _reply(entry: Dict[str, Any], request: Optional[Request], response: Optional[Response]) -> Union[Dict[str, Any], Response]:
+    """Данные записи с её ETag или 304, если клиент уже их получил"""
+    if _client_has(request, entry):
+        return Response(status_code=304, headers=_etag_headers(entry["etag"]))
+    if response is not None:
+        response.headers.update(_etag_headers(entry["etag"]))
+    return entry["data"]
+
+
+def _client_has(request: Optional[Request], entry: Dict[str, Any]) -> bool:
+    return request is not None and etag_matches(request.headers.get("if-none-match"), entry["etag"])
+
+
+async def _compute(compute: Compute, version: int, since: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Считает запись кэша: данные, их ETag и время расчёта. Реплика используется,
+    только если уже применила коммит, увеличивший версию (since), иначе запись
+    с данными до синхронизации закэшировалась бы под новой версией.
+    """
+    started = time.perf_counter()
+    async with read_db(since) as session:
+        response = await compute(session)
+    data = response.model_dump(mode="json")
+    return {
+        "version": version,
+        "created": time.time(),
+        "cost": time.perf_counter() - started,
+        "etag": etag(data),
+        "data": data,
+    }
+
+
+async def _refresh(key: str, version: int, since: Optional[float], compute: Compute) -> Dict[str, Any]:
+    entry = await _compute(compute, version, since)
+    try:
+        await get_redis().set(key, msgspec.json.encode(entry), ex=settings.DASHBOARD_CACHE_TTL)
+    except RedisError as e:
+        log.warning("dashboard_cache_store_failed", key=key, error=str(e))
+    return entry
+
+
+async def _schedule_refresh(key: str, version: int, since: Optional[float], compute: Compute):
+    redis = get_redis()
+    lock_key = f"{key}:refresh"
+    if not await redis.set(lock_key, version, nx=True, ex=REFRESH_LOCK_TTL):
+        return
+
+    async def refresh():
+        try:
+            await _refresh(key, version, since, compute)
+        except Exception as e:
+            log.error("dashboard_cache_refresh_failed", key=key, error=str(e))
+        finally:
+            await redis.delete(lock_key)
+
+    task = asyncio.create_task(refresh())
+    _refreshing.add(task)
+    task.add_done_callback(_refreshing.discard)
+
+
+async def _record(endpoint: str, result: str, saved: float = 0.0):
+    CACHE_REQUESTS.labels(endpoint, result).inc()
+    if saved:
+        CACHE_SAVED.labels(endpoint).inc(saved)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(STATS_KEY, f"{endpoint}:{result}", 1)
+        if saved:
+            pipe.hincrbyfloat(STATS_KEY, f"{endpoint}:saved", saved)
+        await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def cache_stats() -> Dict[str, Dict[str, float]]:
+    """Попадания, устаревшие ответы, ответы 304, промахи, доля попаданий и сэкономленное время по эндпоинтам"""
+    raw = await get_redis().hgetall(STATS_KEY)
+    stats: Dict[str, Dict[str, float]] = {}
+    for field, value in raw.items():
+        endpoint, _, name = field.decode().rpartition(":")
+        stats.setdefault(endpoint, {"hit": 0, "stale": 0, "not_modified": 0, "miss": 0, "saved": 0.0})[name] = float(value)
+
+    for values in stats.values():
+        served = values["hit"] + values["stale"] + values["not_modified"]
+        total = served + values["miss"]
+        values["hit_ratio"] = round(served / total, 4) if total else 0.0
+    return stats
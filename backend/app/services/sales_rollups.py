@@ -0,0 +1,126 @@
+"""
+Чтение продаж за период из предагрегатов.
+
+Окно [date_from, date_to] раскладывается на целые календарные месяцы,
+целые недели и оставшиеся дни. Месяцы и недели читаются из rollup-таблиц,
+края — из sales_history, результат склеивается UNION ALL. Для 90-дневного
+окна это ~20 строк на товар вместо ~90. Итоги кабинета без разбивки по
+товарам берутся из cabinet_daily_totals. При DASHBOARD_USE_ROLLUPS=false
+всё читается из sales_history.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, literal, or_, select, union_all
+
+from app.core.config import settings
+from app.models import SalesHistory, SalesWeekly, SalesMonthly, CabinetDailyTotal
+from app.services.data_sync import next_month_start
+
+
+class PeriodPlan(NamedTuple):
+    months: List[date]
+    weeks: List[date]
+    days: List[Tuple[date, date]]  # включительные диапазоны дней
+
+
+def plan_period(date_from: date, date_to: date) -> PeriodPlan:
+    """Раскладывает окно на месяцы, недели и диапазоны отдельных дней"""
+    months, weeks, days = [], [], []
+    if not settings.DASHBOARD_USE_ROLLUPS:
+        return PeriodPlan(months, weeks, [(date_from, date_to)] if date_from <= date_to else [])
+
+    day = date_from
+    while day <= date_to:
+        if day.day == 1 and next_month_start(day) - timedelta(days=1) <= date_to:
+            months.append(day)
+            day = next_month_start(day)
+        elif day.weekday() == 0 and day + timedelta(days=6) <= date_to:
+            weeks.append(day)
+            day += timedelta(days=7)
+        else:
+            if days and days[-1][1] == day - timedelta(days=1):
+                days[-1] = (days[-1][0], day)
+            else:
+                days.append((day, day))
+            day += timedelta(days=1)
+
+    return PeriodPlan(months, weeks, days)
+
+
+def product_sales(date_from: date, date_to: date, cabinet_id: Optional[int] = None):
+    """
+    Подзапрос строк продаж товаров за окно с колонками
+    cabinet_id, nm_id, orders_count, buyouts_count, revenue (суммировать по nm_id).
+    """
+    parts = _window_parts(date_from, date_to, cabinet_id)
+    source = parts[0] if len(parts) == 1 else union_all(*parts)
+    return source.subquery("sales")
+
+
+def product_sales_windows(windows: Dict[str, Tuple[date, date]], cabinet_id: Optional[int] = None):
+    """
+    То же для нескольких окон сразу: к колонкам добавляется window с именем окна.
+    Окна могут пересекаться — строки каждого окна берутся по его собственному плану,
+    поэтому суммы по окнам считаются через FILTER (WHERE window = ...) за один проход.
+    """
+    parts = []
+    for label, (date_from, date_to) in windows.items():
+        parts += _window_parts(date_from, date_to, cabinet_id, label)
+    source = parts[0] if len(parts) == 1 else union_all(*parts)
+    return source.subquery("sales")
+
+
+def _window_parts(date_from: date, date_to: date, cabinet_id: Optional[int], label: Optional[str] = None):
+    plan = plan_period(date_from, date_to)
+    parts = []
+
+    if plan.days:
+        parts.append(_part(SalesHistory, or_(*(SalesHistory.date.between(start, end) for start, end in plan.days)), cabinet_id, label))
+    if plan.weeks:
+        parts.append(_part(SalesWeekly, SalesWeekly.week_start.in_(plan.weeks), cabinet_id, label))
+    if plan.months:
+        parts.append(_part(SalesMonthly, SalesMonthly.month_start.in_(plan.months), cabinet_id, label))
+    if not parts:
+        parts.append(_part(SalesHistory, SalesHistory.date.between(date_from, date_to), cabinet_id, label))
+    return parts
+
+
+def _part(model, period_filter, cabinet_id: Optional[int], label: Optional[str] = None):
+    columns = [
+        model.cabinet_id,
+        model.nm_id,
+        model.orders_count,
+        model.buyouts_count,
+        model.revenue,
+    ]
+    if label:
+        columns.append(literal(label).label("window"))
+    query = select(*columns).where(period_filter)
+    if cabinet_id:
+        query = query.where(model.cabinet_id == cabinet_id)
+    return query
+
+
+def cabinet_daily_source():
+    """
+    Таблица с колонками cabinet_id, date, orders_count, buyouts_count, revenue,
+    суммы которой дают итоги кабинетов: cabinet_daily_totals или, без
+    предагрегатов, строки товаров из sales_history
+    """
+    return CabinetDailyTotal if settings.DASHBOARD_USE_ROLLUPS else SalesHistory
+
+
+def cabinet_totals(date_from: date, date_to: date, cabinet_id: Optional[int] = None):
+    """Подзапрос дневных итогов кабинетов за окно (суммировать по cabinet_id)"""
+    model = cabinet_daily_source()
+    query = select(
+        model.cabinet_id,
+        model.date,
+        model.orders_count,
+        model.buyouts_count,
+        model.revenue,
+    ).where(and_(model.date >= date_from, model.date <= date_to))
+    if cabinet_id:
+        query = query.where(model.cabinet_id == cabinet_id)
+    return query.subquery("totals")
@@ -0,0 +1,122 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import structlog
+from redis.asyncio import Redis
+
+log = structlog.get_logger()
+
+# Захват аренды или объединение с уже идущей синхронизацией.
+# Если блокировка занята, запрос сохраняется как отложенный повтор: один на
+# кабинет и тип, дубликаты отбрасываются (override — заменить отложенный).
+LEASE_ACQUIRE_SCRIPT = """
+local lock_key = KEYS[1]
+local pending_key = KEYS[2]
+local owner = ARGV[1]
+local ttl_ms = tonumber(ARGV[2])
+
+if redis.call('SET', lock_key, owner, 'NX', 'PX', ttl_ms) then
+    -- Отложенный запрос, оставшийся от упавшего владельца, выполнится повтором
+    -- после этого прогона, если только он не совпадает с самим прогоном
+    if redis.call('GET', pending_key) == ARGV[3] then
+        redis.call('DEL', pending_key)
+    end
+    return 'acquired'
+end
+if redis.call('GET', lock_key) == owner then
+    redis.call('PEXPIRE', lock_key, ttl_ms)
+    return 'acquired'
+end
+if ARGV[4] == '1' then
+    redis.call('SET', pending_key, ARGV[3], 'EX', ARGV[5])
+    return 'coalesced'
+end
+if redis.call('SET', pending_key, ARGV[3], 'NX', 'EX', ARGV[5]) then
+    return 'coalesced'
+end
+return 'skipped'
+"""
+
+LEASE_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Освобождение аренды. Если за время прогона пришли запросы, владелец
+# сохраняет блокировку и получает отложенный запрос для повторного прогона.
+# abandon=1 (ошибка прогона) снимает только блокировку: отложенный запрос
+# достанется следующему владельцу.
+LEASE_RELEASE_SCRIPT = """
+local lock_key = KEYS[1]
+local pending_key = KEYS[2]
+if redis.call('GET', lock_key) ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] ~= '1' then
+    local pending = redis.call('GET', pending_key)
+    if pending then
+        redis.call('DEL', pending_key)
+        return pending
+    end
+end
+redis.call('DEL', lock_key)
+return 1
+"""
+
+PENDING_TTL = 24 * 3600
+
+
+class SyncLease:
+    """
+    Аренда синхронизации (кабинет, тип) в Redis с продлением по heartbeat.
+    Повторные запросы, пришедшие во время прогона, объединяются в один
+    дополнительный прогон того же владельца вместо параллельного запуска.
+    """
+
+    def __init__(self, redis: Redis, sync_type: str, cabinet_id: int, owner: str, ttl: float, prefix: str = "wb:sync:lock"):
+        self.redis = redis
+        self.owner = owner
+        self.ttl = ttl
+        self.lock_key = f"{prefix}:{sync_type}:{cabinet_id}"
+        self.pending_key = f"{self.lock_key}:pending"
+        self._acquire_script = redis.register_script(LEASE_ACQUIRE_SCRIPT)
+        self._renew_script = redis.register_script(LEASE_RENEW_SCRIPT)
+        self._release_script = redis.register_script(LEASE_RELEASE_SCRIPT)
+
+    @property
+    def _ttl_ms(self) -> int:
+        return int(self.ttl * 1000)
+
+    async def acquire(self, request: Dict[str, Any], override: bool = False) -> str:
+        """'acquired' — можно выполнять; 'coalesced' — запрос отложен за текущим прогоном; 'skipped' — уже есть отложенный"""
+        outcome = await self._acquire_script(
+            keys=[self.lock_key, self.pending_key],
+            args=[self.owner, self._ttl_ms, json.dumps(request), int(override), PENDING_TTL],
+        )
+        return outcome.decode() if isinstance(outcome, bytes) else outcome
+
+    async def renew(self) -> bool:
+        return bool(await self._renew_script(keys=[self.lock_key], args=[self.owner, self._ttl_ms]))
+
+    async def heartbeat(self, also: Optional[Callable[[], Awaitable[Any]]] = None):
+        """Продлевает аренду (и вызывает also, например продление слота), пока задача не отменена"""
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if not await self.renew():
+                log.warning("sync_lock_lost", lock=self.lock_key, owner=self.owner)
+                return
+            if also is not None:
+                await also()
+
+    async def release(self, abandon: bool = False) -> Optional[Dict[str, Any]]:
+        """Снимает аренду; возвращает отложенный запрос, если нужен ещё один прогон"""
+        result = await self._release_script(
+            keys=[self.lock_key, self.pending_key],
+            args=[self.owner, int(abandon)],
+        )
+        if isinstance(result, bytes):
+            return json.loads(result)
+        return None
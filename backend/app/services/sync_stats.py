@@ -0,0 +1,121 @@
+"""
+Учёт одного запуска синхронизации: длительности стадий, страницы, строки и RSS процесса.
+
+Счётчики живут в ContextVar, поэтому клиент WB записывает время загрузки и
+разбора, не зная о задаче, которая его вызвала. Стадии могут перекрываться
+(prefetch загружает следующую страницу во время записи), так что их сумма
+бывает больше общей длительности запуска.
+
+process_rss — максимальный RSS всего процесса воркера за время запуска, а не
+память, выделенная самим запуском: задачи пула threads и общий loop делят
+процесс. Это нагрузка на воркер, при которой шёл запуск.
+"""
+import os
+import resource
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import SyncHistory
+
+_current_run: ContextVar[Optional["SyncRunStats"]] = ContextVar("sync_run_stats", default=None)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss() -> int:
+    """Текущий RSS процесса в байтах (пиковый, если /proc недоступен)"""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class SyncRunStats:
+    STAGES = ("fetch", "parse", "write")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = dict.fromkeys(self.STAGES, 0.0)
+        self.pages = 0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.process_rss = _rss()
+
+    @classmethod
+    def begin(cls) -> "SyncRunStats":
+        """Начинает учёт запуска в текущем контексте"""
+        run = cls()
+        _current_run.set(run)
+        return run
+
+    @property
+    def duration(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+            self.sample_memory()
+
+    def sample_memory(self):
+        self.process_rss = max(self.process_rss, _rss())
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(seconds, 3) for name, seconds in self.stages.items()}
+
+
+def record_stage(name: str, seconds: float):
+    run = _current_run.get()
+    if run is not None:
+        run.add_stage(name, seconds)
+
+
+def record_page():
+    run = _current_run.get()
+    if run is not None:
+        run.pages += 1
+        run.sample_memory()
+
+
+async def finish_sync_run(
+    session: AsyncSession,
+    run_id: int,
+    run: SyncRunStats,
+    status: str,
+    throttle: Optional[Dict[str, float]] = None,
+    error: Optional[str] = None,
+    **values,
+):
+    """Закрывает запись запуска в sync_history (по id); коммит — за вызывающим кодом"""
+    throttle = throttle or {}
+    await session.execute(
+        update(SyncHistory)
+        .where(SyncHistory.id == run_id)
+        .values(
+            status=status,
+            error_message=error,
+            finished_at=datetime.utcnow(),
+            duration=round(run.duration, 3),
+            stages=run.as_dict(),
+            pages=run.pages,
+            rows_read=run.rows_read,
+            rows_written=run.rows_written,
+            throttle_wait=round(throttle.get("limiter_wait", 0) + throttle.get("retry_wait", 0), 3),
+            process_rss=run.process_rss,
+            **values,
+        )
+    )
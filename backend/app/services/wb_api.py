@@ -1,13 +1,97 @@
 import asyncio
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from functools import wraps
 import httpx
+import msgspec
 import structlog
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Mapping, Tuple, TypeVar
 from aiolimiter import AsyncLimiter
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.metrics import WB_LIMITER_WAIT, WB_REQUEST_DURATION
+from app.core.redis import get_redis
 from .exceptions import APIError, InvalidTokenError, RateLimitError
+from .json_stream import JsonArraySplitter
+from .rate_limiter import RedisTokenBucket
+from .sync_stats import record_page, record_stage
+from .wb_schemas import (
+    Card,
+    Order,
+    Sale,
+    Stock,
+    cards_page_decoder,
+    orders_decoder,
+    sales_decoder,
+    stocks_decoder,
+)
 
 logger = structlog.get_logger()
 
+# Доля случайной добавки к паузе из заголовков WB, чтобы воркеры не просыпались разом
+RETRY_JITTER = 0.1
+
+# Счётчики троттлинга текущего запуска синхронизации кабинета
+_throttle_scope: ContextVar[Optional[Dict[str, float]]] = ContextVar("wb_throttle_scope", default=None)
+
+class ThrottleStats:
+    """Время ожидания квот WB и число ответов 429 для текущего запуска синхронизации кабинета"""
+    FIELDS = ("limiter_wait", "retry_wait", "throttled_responses")
+
+    def begin(self) -> Dict[str, float]:
+        """Начинает учёт для запуска синхронизации; возвращает счётчики этого запуска"""
+        run = dict.fromkeys(self.FIELDS, 0)
+        _throttle_scope.set(run)
+        return run
+
+    def record(self, field: str, value: float):
+        run = _throttle_scope.get()
+        if run is not None:
+            run[field] += value
+
+throttle_stats = ThrottleStats()
+
+def _header_seconds(value: Optional[str]) -> Optional[float]:
+    """Секунды из заголовка: число или HTTP-дата (Retry-After)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Tuple[Optional[float], Optional[int], Optional[float]]:
+    """Возвращает (retry_after, remaining, reset) из заголовков ответа WB"""
+    retry_after = _header_seconds(headers.get("X-Ratelimit-Retry"))
+    if retry_after is None:
+        retry_after = _header_seconds(headers.get("Retry-After"))
+
+    remaining = None
+    try:
+        remaining = int(headers["X-Ratelimit-Remaining"])
+    except (KeyError, ValueError):
+        pass
+
+    reset = _header_seconds(headers.get("X-Ratelimit-Reset"))
+    return retry_after, remaining, reset
+
+def _retry_delay(error: Exception, backoff_delay: float) -> float:
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after + random.uniform(0, RETRY_JITTER * max(retry_after, 1))
+    # Экспоненциальная пауза с "equal jitter"
+    return backoff_delay / 2 + random.uniform(0, backoff_delay / 2)
+
 def retry(tries=3, delay=1, backoff=2):
     def decorator(func):
         @wraps(func)
@@ -21,114 +105,236 @@ def retry(tries=3, delay=1, backoff=2):
                 except (RateLimitError, httpx.RequestError) as e:
                     if mtries == 1:
                         raise
-                    logger.warning("retry_request", method=func.__name__, error=str(e), attempt=tries-mtries+1)
+                    sleep_for = _retry_delay(e, mdelay)
+                    logger.warning("retry_request", method=func.__name__, error=str(e), attempt=tries-mtries+1, delay=round(sleep_for, 3))
                 except APIError as e:
                     if e.status_code and e.status_code >= 500:
                         if mtries == 1:
                             raise
-                        logger.warning("retry_request", method=func.__name__, error=str(e), status=e.status_code, attempt=tries-mtries+1)
+                        sleep_for = _retry_delay(e, mdelay)
+                        logger.warning("retry_request", method=func.__name__, error=str(e), status=e.status_code, attempt=tries-mtries+1, delay=round(sleep_for, 3))
                     else:
                         raise
 
-                await asyncio.sleep(mdelay)
+                throttle_stats.record("retry_wait", sleep_for)
+                await asyncio.sleep(sleep_for)
                 mtries -= 1
                 mdelay *= backoff
         return wrapper
     return decorator
 
+T = TypeVar("T")
+
+async def prefetch(pages: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Обёртка над асинхронным итератором: пока потребитель обрабатывает страницу N,
+    страница N+1 уже запрашивается. В памяти не больше двух страниц.
+    """
+    iterator = pages.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            try:
+                page = await pending
+            except StopAsyncIteration:
+                return
+            pending = asyncio.ensure_future(iterator.__anext__())
+            yield page
+    finally:
+        if not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
 class WildberriesAPIClient:
-    def __init__(self):
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(
+        self,
+        http_client: Optional[httpx.AsyncClient] = None,
+        rate_limiter: Optional[RedisTokenBucket] = None,
+    ):
+        self.client = http_client or httpx.AsyncClient(timeout=30.0)
+        self.rate_limiter = rate_limiter
+        # Локальные лимитеры — запасной вариант без Redis
         self.content_limiter = AsyncLimiter(100, 60)
         self.statistics_limiter = AsyncLimiter(1, 60)
+        self._blocked_until: Dict[Tuple[str, str], float] = {}
         self.logger = logger.bind(service="wb_api")
 
     async def close(self):
         await self.client.aclose()
 
-    @retry(tries=3, delay=1, backoff=2)
-    async def _request(self, method: str, url: str, headers: Dict[str, str], **kwargs) -> Any:
-        if "content-api" in url:
-            limiter = self.content_limiter
-        else:
-            limiter = self.statistics_limiter
-
-        async with limiter:
-            response = await self.client.request(method, url, headers=headers, **kwargs)
-
-        self.logger.info("wb_api_request", method=method, url=url, status=response.status_code)
+    async def _throttle(self, api_token: str, family: str) -> float:
+        """Ожидает квоту WB для токена и возвращает время ожидания в секундах"""
+        if self.rate_limiter is not None:
+            try:
+                return await self.rate_limiter.acquire(api_token, family)
+            except RedisError as e:
+                self.logger.warning("rate_limiter_unavailable", family=family, error=str(e))
+
+        limiter = self.content_limiter if family == "content" else self.statistics_limiter
+        started = time.monotonic()
+        blocked = self._blocked_until.get((api_token, family), 0) - started
+        if blocked > 0:
+            await asyncio.sleep(blocked)
+        await limiter.acquire()
+        return time.monotonic() - started
+
+    async def _penalize(self, api_token: str, family: str, seconds: float):
+        """Приостанавливает запросы токена к семейству эндпоинтов на seconds"""
+        if self.rate_limiter is not None:
+            try:
+                await self.rate_limiter.penalize(api_token, family, seconds)
+                return
+            except RedisError as e:
+                self.logger.warning("rate_limiter_unavailable", family=family, error=str(e))
+
+        key = (api_token, family)
+        self._blocked_until[key] = max(self._blocked_until.get(key, 0), time.monotonic() + seconds)
+
+    async def _send(self, method: str, url: str, headers: Dict[str, str], stream: bool = False, **kwargs) -> httpx.Response:
+        """Отправляет запрос с учётом квот и проверяет статус ответа"""
+        family = "content" if "content-api" in url else "statistics"
+        api_token = headers.get("Authorization", "")
+        limiter_wait = await self._throttle(api_token, family)
+        throttle_stats.record("limiter_wait", limiter_wait)
+        WB_LIMITER_WAIT.labels(family).observe(limiter_wait)
+
+        request = self.client.build_request(method, url, headers=headers, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = await self.client.send(request, stream=stream)
+        except httpx.RequestError:
+            WB_REQUEST_DURATION.labels(family, "error").observe(time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        WB_REQUEST_DURATION.labels(family, str(response.status_code)).observe(elapsed)
+        record_stage("fetch", elapsed)
+        record_page()
+        retry_after, remaining, reset = parse_rate_limit_headers(response.headers)
+
+        self.logger.info(
+            "wb_api_request",
+            method=method,
+            url=url,
+            status=response.status_code,
+            limiter_wait=round(limiter_wait, 3),
+            ratelimit_remaining=remaining,
+        )
+
+        if response.status_code >= 400 and stream:
+            await response.aclose()
+
+        if response.status_code == 429:
+            pause = retry_after if retry_after is not None else reset
+            if pause:
+                await self._penalize(api_token, family, pause)
+            throttle_stats.record("throttled_responses", 1)
+            raise RateLimitError("Too Many Requests", status_code=429, retry_after=pause)
+
+        if remaining is not None and reset and remaining <= settings.WB_RATELIMIT_LOW_REMAINING:
+            # Квота почти исчерпана: растянуть оставшиеся запросы до сброса окна
+            await self._penalize(api_token, family, reset / (remaining + 1))
 
         if response.status_code == 401:
             raise InvalidTokenError("Неверный API токен", status_code=401)
-        elif response.status_code == 429:
-            raise RateLimitError("Too Many Requests", status_code=429)
         elif response.status_code >= 500:
-            raise APIError(f"WB API error: {response.status_code}", status_code=response.status_code)
+            raise APIError(f"WB API error: {response.status_code}", status_code=response.status_code, retry_after=retry_after)
         elif response.status_code >= 400:
             raise APIError(f"WB API error: {response.status_code}", status_code=response.status_code)
 
+        return response
+
+    @retry(tries=3, delay=1, backoff=2)
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        decoder: Optional[msgspec.json.Decoder] = None,
+        **kwargs,
+    ) -> Any:
+        response = await self._send(method, url, headers, **kwargs)
+
+        started = time.perf_counter()
         try:
+            if decoder is not None:
+                return decoder.decode(response.content)
             return response.json()
+        except msgspec.ValidationError as e:
+            raise APIError(f"Unexpected WB payload: {e}", status_code=response.status_code)
         except Exception:
             raise APIError("Invalid JSON response", status_code=response.status_code)
+        finally:
+            record_stage("parse", time.perf_counter() - started)
+
+    @retry(tries=3, delay=1, backoff=2)
+    async def _open_stream(self, method: str, url: str, headers: Dict[str, str], **kwargs) -> httpx.Response:
+        # Повторяется только установка соединения: после начала чтения тела
+        # часть строк уже отдана потребителю
+        return await self._send(method, url, headers, stream=True, **kwargs)
+
+    async def _stream_array(
+        self,
+        url: str,
+        headers: Dict[str, str],
+        decoder: msgspec.json.Decoder,
+        batch_size: int,
+        **kwargs,
+    ) -> AsyncIterator[list]:
+        """
+        Разбирает JSON-массив ответа по мере получения байтов и отдаёт
+        пачки декодированных строк размером до batch_size.
+        """
+        response = await self._open_stream("GET", url, headers, **kwargs)
+        splitter = JsonArraySplitter()
+        pending = []
+        try:
+            fetch_started = time.perf_counter()
+            async for chunk in response.aiter_bytes():
+                parse_started = time.perf_counter()
+                record_stage("fetch", parse_started - fetch_started)
+                raw = splitter.feed(chunk)
+                if raw is not None:
+                    pending.extend(decoder.decode(raw))
+                record_stage("parse", time.perf_counter() - parse_started)
+                while len(pending) >= batch_size:
+                    yield pending[:batch_size]
+                    pending = pending[batch_size:]
+                # Время обработки пачки потребителем не относится к загрузке
+                fetch_started = time.perf_counter()
+            splitter.close()
+        except msgspec.ValidationError as e:
+            raise APIError(f"Unexpected WB payload: {e}", status_code=response.status_code)
+        except (ValueError, msgspec.DecodeError):
+            raise APIError("Invalid JSON response", status_code=response.status_code)
+        finally:
+            await response.aclose()
 
-    async def get_products(self, api_token: str, limit: int = 100) -> List[dict]:
+        if pending:
+            yield pending
+
+    async def iter_products(self, api_token: str, limit: int = 100) -> AsyncIterator[List[Card]]:
+        """Постранично отдаёт карточки, не накапливая весь каталог"""
         url = "https://content-api.wildberries.ru/content/v2/get/cards/list"
         headers = {"Authorization": api_token}
 
-        products = []
         cursor_data = {"limit": limit}
 
         while True:
             payload = {"settings": {"cursor": cursor_data}}
-            response_data = await self._request("POST", url, headers=headers, json=payload)
+            page = await self._request("POST", url, headers=headers, decoder=cards_page_decoder, json=payload)
 
-            cards = response_data.get("cards", [])
-            if not cards:
+            if not page.cards:
                 break
 
-            for card in cards:
-                nm_id = card.get("nmID")
-                vendor_code = card.get("vendorCode")
-                brand = card.get("brand")
-                obj_name = card.get("object")
-
-                barcode = None
-                sizes = card.get("sizes", [])
-                if sizes and isinstance(sizes, list) and len(sizes) > 0:
-                     first_size = sizes[0]
-                     if isinstance(first_size, dict):
-                         skus = first_size.get("skus", [])
-                         if skus and isinstance(skus, list) and len(skus) > 0:
-                             barcode = skus[0]
-
-                tag_names = []
-                tags = card.get("tags", [])
-                if isinstance(tags, list):
-                    for tag in tags:
-                        if isinstance(tag, dict) and "name" in tag:
-                            tag_names.append(tag["name"])
-                        elif isinstance(tag, str):
-                            tag_names.append(tag)
-
-                photo = None
-                media_files = card.get("mediaFiles", [])
-                if media_files and isinstance(media_files, list) and len(media_files) > 0:
-                    photo = media_files[0]
-
-                products.append({
-                    "nmID": nm_id,
-                    "vendorCode": vendor_code,
-                    "brand": brand,
-                    "object": obj_name,
-                    "barcode": barcode,
-                    "tags": tag_names,
-                    "photo": photo
-                })
-
-            response_cursor = response_data.get("cursor", {})
-            updated_at = response_cursor.get("updatedAt")
-            nm_id_cursor = response_cursor.get("nmID")
+            yield page.cards
+
+            updated_at = page.cursor.updated_at
+            nm_id_cursor = page.cursor.nm_id
 
             if not updated_at and not nm_id_cursor:
                 break
@@ -139,46 +345,115 @@ class WildberriesAPIClient:
                 "nmID": nm_id_cursor
             }
 
-            if len(cards) < limit:
+            if len(page.cards) < limit:
                 break
 
+    async def get_products(self, api_token: str, limit: int = 100) -> List[Card]:
+        products = []
+        async for page in self.iter_products(api_token, limit=limit):
+            products.extend(page)
         return products
 
-    async def get_stocks(self, api_token: str, date_from: str = None) -> List[dict]:
+    async def get_stocks(self, api_token: str, date_from: str = None) -> List[Stock]:
         url = "https://statistics-api.wildberries.ru/api/v1/supplier/stocks"
         headers = {"Authorization": api_token}
         params = {}
         if date_from:
             params["dateFrom"] = date_from
 
-        return await self._request("GET", url, headers=headers, params=params)
+        stocks = await self._request("GET", url, headers=headers, decoder=stocks_decoder, params=params)
+        return _with_nm_id(stocks)
 
-    async def get_sales(self, api_token: str, date_from: str, flag: int = 0) -> List[dict]:
+    async def get_sales(self, api_token: str, date_from: str, flag: int = 0) -> List[Sale]:
         url = "https://statistics-api.wildberries.ru/api/v1/supplier/sales"
         headers = {"Authorization": api_token}
         params = {"dateFrom": date_from, "flag": flag}
 
-        data = await self._request("GET", url, headers=headers, params=params)
+        sales = await self._request("GET", url, headers=headers, decoder=sales_decoder, params=params)
+        # Строки без saleID не являются продажами
+        return [sale for sale in _with_nm_id(sales) if sale.sale_id]
 
-        if isinstance(data, list):
-            results = []
-            for item in data:
-                sale_id = item.get("saleID")
-                if not sale_id:
-                    continue
+    async def stream_sales(self, api_token: str, date_from: str, flag: int = 0, batch_size: int = None) -> AsyncIterator[List[Sale]]:
+        """Потоковый вариант get_sales: пачки строк без буферизации всего ответа"""
+        url = "https://statistics-api.wildberries.ru/api/v1/supplier/sales"
+        headers = {"Authorization": api_token}
+        params = {"dateFrom": date_from, "flag": flag}
 
-                cancel_id = item.get("cancelID")
-                # is_buyout if cancelID is empty/None
-                is_buyout = not cancel_id
+        async for batch in self._stream_array(url, headers, sales_decoder, batch_size or settings.SYNC_BATCH_SIZE, params=params):
+            sales = [sale for sale in _with_nm_id(batch) if sale.sale_id]
+            if sales:
+                yield sales
+
+    async def stream_orders(self, api_token: str, date_from: str, flag: int = 0, batch_size: int = None) -> AsyncIterator[List[Order]]:
+        """Потоковый вариант get_orders"""
+        url = "https://statistics-api.wildberries.ru/api/v1/supplier/orders"
+        headers = {"Authorization": api_token}
+        params = {"dateFrom": date_from, "flag": flag}
 
-                item["is_buyout"] = is_buyout
-                results.append(item)
-            return results
-        return data
+        async for batch in self._stream_array(url, headers, orders_decoder, batch_size or settings.SYNC_BATCH_SIZE, params=params):
+            orders = _with_nm_id(batch)
+            if orders:
+                yield orders
 
-    async def get_orders(self, api_token: str, date_from: str, flag: int = 0) -> List[dict]:
+    async def get_orders(self, api_token: str, date_from: str, flag: int = 0) -> List[Order]:
         url = "https://statistics-api.wildberries.ru/api/v1/supplier/orders"
         headers = {"Authorization": api_token}
         params = {"dateFrom": date_from, "flag": flag}
 
-        return await self._request("GET", url, headers=headers, params=params)
+        orders = await self._request("GET", url, headers=headers, decoder=orders_decoder, params=params)
+        return _with_nm_id(orders)
+
+
+def _with_nm_id(rows: List[T]) -> List[T]:
+    """Отбрасывает строки статистики без nmId: их нельзя отнести к товару"""
+    return [row for row in rows if row.nm_id is not None]
+
+
+# ========== SHARED CLIENT ==========
+
+_shared_client: Optional[WildberriesAPIClient] = None
+
+def _build_http_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.WB_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.WB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.WB_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+    http2 = settings.WB_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("wb_http2_unavailable", reason="package 'h2' is not installed")
+            http2 = False
+
+    return httpx.AsyncClient(timeout=settings.WB_HTTP_TIMEOUT, limits=limits, http2=http2)
+
+def _build_rate_limiter() -> RedisTokenBucket:
+    return RedisTokenBucket(get_redis(), {
+        "content": (settings.WB_CONTENT_RATE_PER_MINUTE / 60, settings.WB_CONTENT_BURST),
+        "statistics": (settings.WB_STATISTICS_RATE_PER_MINUTE / 60, settings.WB_STATISTICS_BURST),
+    })
+
+def get_wb_client() -> WildberriesAPIClient:
+    """Общий для процесса клиент WB API с пулом keep-alive соединений"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = WildberriesAPIClient(
+            http_client=_build_http_client(),
+            rate_limiter=_build_rate_limiter(),
+        )
+    return _shared_client
+
+async def close_wb_client():
+    """Закрывает общий клиент (shutdown API или воркера)"""
+    global _shared_client
+    client, _shared_client = _shared_client, None
+    if client is not None:
+        await client.close()
+
+def reset_wb_client():
+    """Сбрасывает унаследованный после fork клиент, не трогая сокеты родителя"""
+    global _shared_client
+    _shared_client = None
@@ -0,0 +1,103 @@
+"""
+Типизированные структуры ответов WB API.
+
+Декодирование и валидация выполняются msgspec за один проход прямо из байтов
+ответа; поля, которые не используются синхронизацией, отбрасываются. Поля,
+которые WB присылает не во всех строках (nmId, имя тега), необязательны:
+одна некорректная строка не должна ломать разбор всего ответа, такие строки
+отфильтровывает клиент WB API.
+"""
+from datetime import datetime
+from typing import List, Optional, Union
+import msgspec
+
+
+class Tag(msgspec.Struct):
+    name: Optional[str] = None
+
+
+class Size(msgspec.Struct, omit_defaults=True):
+    chrt_id: Optional[int] = msgspec.field(default=None, name="chrtID")
+    tech_size: Optional[str] = msgspec.field(default=None, name="techSize")
+    wb_size: Optional[str] = msgspec.field(default=None, name="wbSize")
+    skus: List[str] = []
+
+
+class Card(msgspec.Struct):
+    nm_id: int = msgspec.field(name="nmID")
+    vendor_code: Optional[str] = msgspec.field(default=None, name="vendorCode")
+    brand: Optional[str] = None
+    object: Optional[str] = None
+    sizes: List[Size] = []
+    tags: List[Union[Tag, str]] = []
+    media_files: List[str] = msgspec.field(default_factory=list, name="mediaFiles")
+
+    @property
+    def barcode(self) -> Optional[str]:
+        if self.sizes and self.sizes[0].skus:
+            return self.sizes[0].skus[0]
+        return None
+
+    @property
+    def tag_names(self) -> List[str]:
+        names = (tag if isinstance(tag, str) else tag.name for tag in self.tags)
+        return [name for name in names if name]
+
+    @property
+    def photo(self) -> Optional[str]:
+        return self.media_files[0] if self.media_files else None
+
+
+class CardsCursor(msgspec.Struct):
+    updated_at: Optional[str] = msgspec.field(default=None, name="updatedAt")
+    nm_id: Optional[int] = msgspec.field(default=None, name="nmID")
+    total: Optional[int] = None
+
+
+class CardsPage(msgspec.Struct):
+    cards: List[Card] = []
+    cursor: CardsCursor = msgspec.field(default_factory=CardsCursor)
+
+
+class Order(msgspec.Struct):
+    date: datetime
+    nm_id: Optional[int] = msgspec.field(default=None, name="nmId")
+    last_change_date: Optional[datetime] = msgspec.field(default=None, name="lastChangeDate")
+    srid: Optional[str] = None
+    g_number: Optional[str] = msgspec.field(default=None, name="gNumber")
+    barcode: Optional[str] = None
+    price_with_disc: float = msgspec.field(default=0.0, name="priceWithDisc")
+
+    @property
+    def external_id(self) -> Optional[str]:
+        if self.srid:
+            return self.srid
+        # gNumber общий для всех позиций заказа, поэтому позицию уточняют товар и баркод
+        if self.g_number:
+            return f"{self.g_number}:{self.nm_id}:{self.barcode or ''}"
+        return None
+
+
+class Sale(msgspec.Struct):
+    date: datetime
+    nm_id: Optional[int] = msgspec.field(default=None, name="nmId")
+    last_change_date: Optional[datetime] = msgspec.field(default=None, name="lastChangeDate")
+    sale_id: Optional[str] = msgspec.field(default=None, name="saleID")
+    cancel_id: Optional[str] = msgspec.field(default=None, name="cancelID")
+    price_with_disc: float = msgspec.field(default=0.0, name="priceWithDisc")
+
+    @property
+    def is_buyout(self) -> bool:
+        return bool(self.sale_id) and not self.cancel_id
+
+
+class Stock(msgspec.Struct):
+    nm_id: Optional[int] = msgspec.field(default=None, name="nmId")
+    quantity: int = 0
+
+
+# Декодеры переиспользуются: их создание дороже самого разбора небольших ответов
+cards_page_decoder = msgspec.json.Decoder(CardsPage)
+orders_decoder = msgspec.json.Decoder(List[Order])
+sales_decoder = msgspec.json.Decoder(List[Sale])
+stocks_decoder = msgspec.json.Decoder(List[Stock])
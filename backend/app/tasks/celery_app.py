@@ -1,27 +1,68 @@
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Queue
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
 from app.core.config import settings
+from app.core.redis import close_redis, reset_redis
+from app.core.metrics import mark_process_dead, start_exporter
+from app.db.session import engine
+from app.services.wb_api import close_wb_client, reset_wb_client
+from app.tasks import runtime
+from app.tasks.fleet import SYNC_QUEUES
+from app.models.sync_history import SyncType
 
-celery = Celery(
+celery_app = Celery(
     "electra_tasks",
     broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
+    backend=settings.REDIS_URL,
+    task_cls="app.tasks.runtime:AsyncTask",
+    include=["app.tasks.sync_tasks", "app.tasks.maintenance_tasks"],
 )
 
-celery.conf.update(
+celery_app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
+    # Задачи ждут ввода-вывода на общем event loop процесса, поэтому
+    # воркер использует потоки: N кабинетов синхронизируются параллельно
+    worker_pool='threads',
+    worker_concurrency=settings.SYNC_WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=1,
+    # Отдельная очередь на каждый тип синхронизации. Воркер забирает задачи
+    # в порядке очередей (strategy=priority): продажи раньше остатков и товаров,
+    # поэтому длинная синхронизация товаров не задерживает 30-минутные продажи
+    task_default_queue='celery',
+    task_queues=[
+        Queue('celery'),
+        Queue(SYNC_QUEUES[SyncType.sales]),
+        Queue(SYNC_QUEUES[SyncType.stocks]),
+        Queue(SYNC_QUEUES[SyncType.products]),
+    ],
+    task_routes={
+        'app.tasks.sync_tasks.sync_sales': {'queue': SYNC_QUEUES[SyncType.sales]},
+        'app.tasks.sync_tasks.sync_stocks': {'queue': SYNC_QUEUES[SyncType.stocks]},
+        'app.tasks.sync_tasks.sync_products': {'queue': SYNC_QUEUES[SyncType.products]},
+    },
+    broker_transport_options={
+        'queue_order_strategy': 'priority',
+        'priority_steps': list(range(10)),
+        'sep': ':',
+    },
 )
 
 # Celery Beat расписание
-celery.conf.beat_schedule = {
+celery_app.conf.beat_schedule = {
     'sync-sales-every-30-min': {
         'task': 'app.tasks.sync_tasks.sync_all_sales',
         'schedule': 1800.0,  # 30 минут
     },
+    'reconcile-sales-daily': {
+        'task': 'app.tasks.sync_tasks.sync_all_sales',
+        'schedule': crontab(hour=3, minute=0),  # полная сверка за 90 дней
+        'kwargs': {'mode': 'reconcile'},
+    },
     'sync-stocks-every-hour': {
         'task': 'app.tasks.sync_tasks.sync_all_stocks',
         'schedule': 3600.0,  # 1 час
@@ -30,18 +71,39 @@ celery.conf.beat_schedule = {
         'task': 'app.tasks.sync_tasks.sync_all_products',
         'schedule': 21600.0,  # 6 часов
     },
+    'maintain-sales-partitions-daily': {
+        'task': 'app.tasks.maintenance_tasks.maintain_partitions',
+        'schedule': crontab(hour=2, minute=30),  # до суточной сверки продаж
+    },
 }
-import os
-from celery import Celery
 
-redis_url = os.environ.get("REDIS_URL", "redis://redis:6379/0")
+# Прежнее имя приложения; `celery -A app.tasks.celery_app` находит его первым
+celery = celery_app
 
-celery_app = Celery("wb_analytics_electra", broker=redis_url, backend=redis_url)
 
-celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    timezone="UTC",
-    enable_utc=True,
-)
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    # Экспортер поднимается в главном процессе воркера; в prefork дочерние
+    # процессы пишут метрики в PROMETHEUS_MULTIPROC_DIR
+    if settings.METRICS_WORKER_PORT:
+        start_exporter(settings.METRICS_WORKER_PORT)
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Loop, клиенты и соединения пула, унаследованные от родителя через fork,
+    # использовать нельзя: дочерний процесс открывает свои при первой задаче
+    runtime.reset_after_fork()
+    reset_wb_client()
+    reset_redis()
+    engine.sync_engine.dispose(close=False)
+
+async def _close_clients():
+    await close_wb_client()
+    await close_redis()
+    await engine.dispose()
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    runtime.shutdown(_close_clients)
+    mark_process_dead()
@@ -0,0 +1,237 @@
+"""
+Оркестрация синхронизации всех кабинетов.
+
+sync_all_* раздают задачи по кабинетам группой в отдельные очереди по типу
+синхронизации с приоритетами, начиная с давно не синхронизированных. Число
+одновременно идущих синхронизаций ограничено глобальным семафором в Redis.
+Ход батча считается в Redis, и последняя завершившаяся задача пишет итог
+с длительностью синхронизации всего парка кабинетов.
+
+Синхронизация одного кабинета и типа идёт не более чем в одном экземпляре:
+запросы, пришедшие во время прогона, объединяются в один повторный прогон.
+"""
+import asyncio
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, List, Optional
+
+import structlog
+from celery import group
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.models import Cabinet, SyncHistory
+from app.models.sync_history import SyncType
+from app.services.rate_limiter import RedisSemaphore
+from app.services.sync_lock import SyncLease
+
+log = structlog.get_logger()
+
+SYNC_QUEUES = {
+    SyncType.sales: "sync_sales",
+    SyncType.stocks: "sync_stocks",
+    SyncType.products: "sync_products",
+}
+
+# Приоритеты сообщений Redis-транспорта: 0 — наивысший
+SYNC_PRIORITIES = {
+    SyncType.sales: 0,
+    SyncType.stocks: 3,
+    SyncType.products: 6,
+}
+RECONCILE_PRIORITY = 5
+
+SLOTS_KEY = "wb:sync:slots"
+BATCH_PREFIX = "wb:sync:fleet"
+BATCH_TTL = 24 * 3600
+RETRY_COUNTDOWN = 60
+LOCK_STATS_KEY = "wb:sync:lock:stats"
+
+
+def _slots() -> RedisSemaphore:
+    return RedisSemaphore(
+        get_redis(),
+        SLOTS_KEY,
+        limit=settings.SYNC_MAX_CONCURRENT,
+        ttl=settings.SYNC_SLOT_TTL,
+        poll_interval=settings.SYNC_SLOT_POLL_INTERVAL,
+    )
+
+
+@asynccontextmanager
+async def sync_slot(task_id: Optional[str] = None):
+    """
+    Занимает один из SYNC_MAX_CONCURRENT слотов на время синхронизации кабинета.
+    Слот задачи продлевает heartbeat аренды в run_exclusive.
+    """
+    slots = _slots()
+    # Вне воркера (прямой вызов задачи) id запроса нет
+    member = task_id or uuid.uuid4().hex
+    waited = await slots.acquire(member)
+    try:
+        yield waited
+    finally:
+        await slots.release(member)
+
+
+async def stale_first_cabinets(session: AsyncSession, sync_type: SyncType) -> List[int]:
+    """Кабинеты в порядке давности последней синхронизации (никогда — первыми)"""
+    last_sync = (
+        select(SyncHistory.cabinet_id, func.max(SyncHistory.last_sync_date).label("last_sync_date"))
+        .where(SyncHistory.sync_type == sync_type)
+        .group_by(SyncHistory.cabinet_id)
+        .subquery()
+    )
+    result = await session.execute(
+        select(Cabinet.id)
+        .outerjoin(last_sync, last_sync.c.cabinet_id == Cabinet.id)
+        .order_by(last_sync.c.last_sync_date.asc().nullsfirst(), Cabinet.id)
+    )
+    return list(result.scalars().all())
+
+
+def _batch_key(batch_id: str) -> str:
+    return f"{BATCH_PREFIX}:{batch_id}"
+
+
+async def start_batch(sync_type: SyncType, cabinet_ids: List[int]) -> str:
+    batch_id = uuid.uuid4().hex
+    key = _batch_key(batch_id)
+    redis = get_redis()
+    await redis.hset(key, mapping={
+        "sync_type": sync_type.value,
+        "total": len(cabinet_ids),
+        "done": 0,
+        "failed": 0,
+        "started_at": time.time(),
+    })
+    await redis.expire(key, BATCH_TTL)
+    log.info("fleet_sync_started", batch_id=batch_id, sync_type=sync_type.value, cabinets=len(cabinet_ids))
+    if not cabinet_ids:
+        await _complete(batch_id)
+    return batch_id
+
+
+async def finish_cabinet(batch_id: Optional[str], ok: bool):
+    """Учитывает итог по кабинету; последний завершившийся закрывает батч"""
+    if not batch_id:
+        return
+    key = _batch_key(batch_id)
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.hincrby(key, "done" if ok else "failed", 1)
+        pipe.hmget(key, "done", "failed", "total")
+        _, (done, failed, total) = await pipe.execute()
+
+    if total is not None and int(done) + int(failed) >= int(total):
+        await _complete(batch_id)
+
+
+async def _complete(batch_id: str):
+    key = _batch_key(batch_id)
+    redis = get_redis()
+    # Итог пишется ровно один раз, даже если задачи завершились одновременно
+    if not await redis.hsetnx(key, "finished_at", time.time()):
+        return
+
+    state = {k.decode(): v.decode() for k, v in (await redis.hgetall(key)).items()}
+    summary = {
+        "batch_id": batch_id,
+        "sync_type": state["sync_type"],
+        "cabinets": int(state["total"]),
+        "succeeded": int(state["done"]),
+        "failed": int(state["failed"]),
+        "duration": round(float(state["finished_at"]) - float(state["started_at"]), 3),
+        "finished_at": float(state["finished_at"]),
+    }
+    await redis.set(f"{BATCH_PREFIX}:last:{summary['sync_type']}", json.dumps(summary))
+    log.info("fleet_sync_completed", **summary)
+
+
+async def dispatch(task, sync_type: SyncType, cabinet_ids: List[int], batch_id: str, priority: Optional[int] = None, **kwargs):
+    """Отправляет задачи по кабинетам одной группой в очередь типа синхронизации"""
+    if not cabinet_ids:
+        return None
+    options = {
+        "queue": SYNC_QUEUES[sync_type],
+        "priority": SYNC_PRIORITIES[sync_type] if priority is None else priority,
+    }
+    tasks = group(
+        task.s(cabinet_id, batch_id=batch_id, **kwargs).set(**options)
+        for cabinet_id in cabinet_ids
+    )
+    # Публикация в брокер блокирующая и не должна останавливать общий loop процесса
+    return await asyncio.get_running_loop().run_in_executor(None, tasks.apply_async)
+
+
+async def run_exclusive(task, sync_type: SyncType, cabinet_id: int, run, batch_id: Optional[str] = None, override: bool = False, **request):
+    """
+    Выполняет run(task, cabinet_id, batch_id=..., **request) под арендой (кабинет, тип).
+    Если кабинет уже синхронизируется, запрос объединяется с идущим прогоном
+    (override — заменить уже отложенный запрос, например полной сверкой).
+    Ошибка исходного прогона ретраит задачу, ошибка повторного прогона ставит
+    его запрос отдельной задачей.
+    """
+    redis = get_redis()
+    lease = SyncLease(redis, sync_type.value, cabinet_id, owner=task.request.id or uuid.uuid4().hex, ttl=settings.SYNC_LOCK_TTL)
+
+    outcome = await lease.acquire(request, override=override)
+    if outcome != "acquired":
+        await redis.hincrby(LOCK_STATS_KEY, f"{sync_type.value}:{outcome}", 1)
+        log.info(f"sync_{sync_type.value}_{outcome}", cabinet_id=cabinet_id, request=request)
+        # Данные кабинета обновит идущий прогон, для батча кабинет считается обработанным
+        await finish_cabinet(batch_id, True)
+        return
+
+    # Слот семафора берётся в run по id задачи и продлевается вместе с арендой
+    heartbeat = asyncio.create_task(lease.heartbeat(partial(_slots().renew, lease.owner)))
+    rerun = False
+    try:
+        while request is not None:
+            try:
+                await run(task, cabinet_id, batch_id=batch_id, **request)
+            except Exception as e:
+                await lease.release(abandon=True)
+                if not rerun:
+                    raise task.retry(exc=e, countdown=RETRY_COUNTDOWN)
+                # Ретрай исходной задачи повторил бы её аргументы и батч, а не отложенный запрос
+                log.error(f"sync_{sync_type.value}_rerun_failed", cabinet_id=cabinet_id, request=request, error=str(e))
+                await _requeue(task, sync_type, cabinet_id, request)
+                return
+            except BaseException:
+                await lease.release(abandon=True)
+                raise
+            # Повторный прогон по объединённым запросам уже не относится к батчу
+            batch_id, rerun = None, True
+            request = await lease.release()
+            if request is not None:
+                log.info(f"sync_{sync_type.value}_rerun", cabinet_id=cabinet_id, request=request)
+    finally:
+        heartbeat.cancel()
+
+
+async def _requeue(task, sync_type: SyncType, cabinet_id: int, request: Dict):
+    """Ставит отложенный запрос отдельной задачей вне батча"""
+    send = partial(
+        task.apply_async,
+        args=(cabinet_id,),
+        kwargs={**request, "batch_id": None},
+        queue=SYNC_QUEUES[sync_type],
+        priority=SYNC_PRIORITIES[sync_type],
+        countdown=RETRY_COUNTDOWN,
+    )
+    await asyncio.get_running_loop().run_in_executor(None, send)
+
+
+async def lock_stats() -> Dict[str, Dict[str, int]]:
+    """Счётчики объединённых (coalesced) и отброшенных (skipped) запусков по типам"""
+    raw = await get_redis().hgetall(LOCK_STATS_KEY)
+    stats: Dict[str, Dict[str, int]] = {}
+    for field, value in raw.items():
+        sync_type, _, outcome = field.decode().partition(":")
+        stats.setdefault(sync_type, {"coalesced": 0, "skipped": 0})[outcome] = int(value)
+    return stats
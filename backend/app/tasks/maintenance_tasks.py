@@ -0,0 +1,22 @@
+from celery import shared_task
+from app.db.session import async_session
+from app.services.partitions import maintain_sales_partitions
+import structlog
+
+log = structlog.get_logger()
+
+
+@shared_task
+async def maintain_partitions():
+    """Создание будущих и архивация старых партиций sales_history"""
+    async with async_session() as session:
+        try:
+            result = await maintain_sales_partitions(session)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            log.error("sales_partitions_maintenance_failed", error=str(e))
+            raise
+
+    log.info("sales_partitions_maintained", **result)
+    return result
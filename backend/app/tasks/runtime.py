@@ -0,0 +1,110 @@
+"""
+Асинхронная среда выполнения задач Celery.
+
+Каждый процесс воркера держит один долгоживущий event loop в фоновом потоке.
+Корутинные задачи отправляются в этот loop, поэтому общий async_engine,
+HTTP-клиент WB и клиент Redis живут всё время работы процесса и не
+привязываются к циклу, закрытому после первой задачи. Пул потоков Celery
+лишь ожидает результат: несколько кабинетов синхронизируются одновременно
+на одном loop внутри одного процесса.
+
+Стек запросов Celery (self.request) локален для потока, а корутина работает
+в потоке loop вперемешку с корутинами других задач. Поэтому запрос
+захватывается в вызывающем потоке и передаётся корутине через ContextVar:
+у каждой asyncio-задачи своя копия контекста.
+"""
+import asyncio
+import inspect
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+import structlog
+from celery import Task
+from celery._state import _task_stack
+from celery.app.task import Context
+
+log = structlog.get_logger()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_pid: Optional[int] = None
+_lock = threading.Lock()
+# (задача, запрос Celery) выполняющейся в этой asyncio-задаче корутины
+_current_request: ContextVar = ContextVar("celery_request", default=None)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Event loop процесса; после fork создаётся заново"""
+    global _loop, _thread, _pid
+    with _lock:
+        if _loop is None or _pid != os.getpid() or not _thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="celery-asyncio", daemon=True)
+            _thread.start()
+            _pid = os.getpid()
+        return _loop
+
+
+def run(coro):
+    """Выполняет корутину на loop процесса и блокирует вызывающий поток до результата"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def reset_after_fork():
+    """Забывает loop и поток родителя: в дочернем процессе поток не существует"""
+    global _loop, _thread, _pid
+    _loop = _thread = _pid = None
+
+
+def shutdown(cleanup=None):
+    """Выполняет cleanup() на loop процесса и останавливает его"""
+    global _loop, _thread, _pid
+    with _lock:
+        loop, thread = _loop, _thread
+        if loop is None or _pid != os.getpid():
+            return
+        _loop = _thread = _pid = None
+
+    try:
+        if cleanup is not None:
+            asyncio.run_coroutine_threadsafe(cleanup(), loop).result(timeout=30)
+    except Exception as e:
+        log.warning("async_runtime_cleanup_failed", error=str(e))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+class AsyncTask(Task):
+    """Базовый класс задач: async def-тела выполняются на общем loop процесса"""
+
+    def __call__(self, *args, **kwargs):
+        # Воркер и apply() уже положили запрос в стек; прямой вызов task(...)
+        # получает запрос так же, как в Task.__call__
+        called_directly = self.request_stack.top is None
+        if called_directly:
+            _task_stack.push(self)
+            self.push_request(args=args, kwargs=kwargs)
+        try:
+            result = self.run(*args, **kwargs)
+            if inspect.iscoroutine(result):
+                return run(self._with_request(result, self.request))
+            return result
+        finally:
+            if called_directly:
+                self.pop_request()
+                _task_stack.pop()
+
+    async def _with_request(self, coro, request: Context):
+        _current_request.set((self, request))
+        return await coro
+
+    @property
+    def request(self) -> Context:
+        current = _current_request.get()
+        if current is not None and current[0] is self:
+            return current[1]
+        return self._get_request()
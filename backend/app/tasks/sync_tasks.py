@@ -1,291 +1,298 @@
 from celery import shared_task
 from datetime import datetime, timedelta
-from sqlalchemy import select, update
 from app.db.session import async_session
-from app.models import Cabinet, Product, SalesHistory, SyncHistory
-from app.services.wb_api import WildberriesAPIClient
+from app.models import Cabinet, SyncHistory
+from app.models.sync_history import SyncType
+from app.services.wb_api import get_wb_client, prefetch, throttle_stats
+from app.services.sync_stats import SyncRunStats, finish_sync_run
+from app.core.metrics import observe_sync_run
+from app.services.response_cache import bump_data_version
+from app.tasks.fleet import RECONCILE_PRIORITY, dispatch, finish_cabinet, run_exclusive, stale_first_cabinets, start_batch, sync_slot
+from app.services.data_sync import (
+    upsert_products,
+    upsert_sales_history,
+    apply_stocks,
+    SalesAggregator,
+    upsert_sales_events,
+    reaggregate_sales_buckets,
+    refresh_sales_rollups,
+    get_watermark,
+    set_watermark,
+    max_last_change_date,
+)
 import structlog
 
 log = structlog.get_logger()
 
+async def _start_run(session, cabinet_id: int, sync_type: SyncType, mode: str = None) -> int:
+    """Добавляет запись запуска в журнал sync_history; прошлые запуски не перезаписываются"""
+    history = SyncHistory(
+        cabinet_id=cabinet_id,
+        sync_type=sync_type,
+        mode=mode,
+        status='in_progress',
+        last_sync_date=datetime.utcnow(),
+    )
+    session.add(history)
+    await session.commit()
+    return history.id
+
+async def _fail_run(session, sync_type: SyncType, run_id, run, throttle, error: Exception):
+    observe_sync_run(sync_type.value, 'failed', run)
+    await session.rollback()
+    if run_id is not None:
+        await finish_sync_run(session, run_id, run, 'failed', throttle=throttle, error=str(error))
+        await session.commit()
+
+async def _report(task, batch_id, ok: bool):
+    # Кабинет засчитывается батчу после успеха или последней неудачной попытки
+    if ok or task.request.retries >= task.max_retries:
+        await finish_cabinet(batch_id, ok)
+
 @shared_task(bind=True, max_retries=3)
-async def sync_products(self, cabinet_id: int):
+async def sync_products(self, cabinet_id: int, batch_id: str = None):
     """Синхронизация карточек товаров с тегами"""
-    async with async_session() as session:
-        try:
-            # Обновить статус на in_progress
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'products')
-                .values(status='in_progress', last_sync_date=datetime.utcnow())
-            )
-            await session.commit()
-
-            # Получить кабинет
-            cabinet = await session.get(Cabinet, cabinet_id)
-            if not cabinet:
-                raise ValueError(f"Cabinet {cabinet_id} not found")
-
-            # Вызвать WB API
-            wb_client = WildberriesAPIClient()
-            cards = await wb_client.get_products(cabinet.api_token)
-
-            log.info("sync_products_started", cabinet_id=cabinet_id, cards_count=len(cards))
-
-            # Обработка карточек
-            for card in cards:
-                # Извлечь теги менеджера
-                manager_tags = ','.join([tag.get('name', '') for tag in card.get('tags', [])])
-
-                # Извлечь первый баркод
-                barcode = None
-                sizes = card.get('sizes', [])
-                if sizes and sizes[0].get('skus'):
-                    barcode = sizes[0]['skus'][0]
-
-                # Первое фото
-                image_url = None
-                if card.get('mediaFiles'):
-                    image_url = card['mediaFiles'][0]
-
-                # Upsert продукт
-                existing = await session.get(Product, card['nmID'])
-                if existing:
-                    existing.vendor_code = card.get('vendorCode')
-                    existing.barcode = barcode
-                    existing.title = card.get('object')
-                    existing.manager = manager_tags
-                    existing.image_url = image_url
-                    existing.sizes = sizes
-                    existing.last_update = datetime.utcnow()
-                else:
-                    product = Product(
-                        nm_id=card['nmID'],
-                        cabinet_id=cabinet_id,
-                        vendor_code=card.get('vendorCode'),
-                        barcode=barcode,
-                        title=card.get('object'),
-                        manager=manager_tags,
-                        image_url=image_url,
-                        sizes=sizes,
-                        last_update=datetime.utcnow()
-                    )
-                    session.add(product)
-
-            await session.commit()
-
-            # Обновить статус на success
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'products')
-                .values(status='success', error_message=None)
-            )
-            await session.commit()
-
-            log.info("sync_products_completed", cabinet_id=cabinet_id)
-
-        except Exception as e:
-            log.error("sync_products_failed", cabinet_id=cabinet_id, error=str(e))
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'products')
-                .values(status='failed', error_message=str(e))
-            )
-            await session.commit()
-            raise self.retry(exc=e, countdown=60)
+    await run_exclusive(self, SyncType.products, cabinet_id, _sync_products, batch_id=batch_id)
+
+async def _sync_products(self, cabinet_id: int, batch_id: str = None):
+    throttle = throttle_stats.begin()
+    run = SyncRunStats.begin()
+    run_id = None
+    async with sync_slot(self.request.id) as slot_wait:
+        async with async_session() as session:
+            try:
+                run_id = await _start_run(session, cabinet_id, SyncType.products)
+
+                # Получить кабинет
+                cabinet = await session.get(Cabinet, cabinet_id)
+                if not cabinet:
+                    raise ValueError(f"Cabinet {cabinet_id} not found")
+
+                # Вызвать WB API: запись страницы N идёт, пока загружается страница N+1
+                wb_client = get_wb_client()
+                log.info("sync_products_started", cabinet_id=cabinet_id)
+
+                cards_count = inserted = changed = unchanged = 0
+                async for cards in prefetch(wb_client.iter_products(cabinet.api_token)):
+                    with run.stage("write"):
+                        page_inserted, page_changed, page_unchanged = await upsert_products(session, cabinet_id, cards)
+                    cards_count += len(cards)
+                    inserted += page_inserted
+                    changed += page_changed
+                    unchanged += page_unchanged
+                with run.stage("write"):
+                    await session.commit()
+                if inserted or changed:
+                    await bump_data_version(cabinet_id)
+
+                run.rows_read, run.rows_written = cards_count, inserted + changed
+                await finish_sync_run(session, run_id, run, 'success', throttle=throttle)
+                await session.commit()
+                observe_sync_run(SyncType.products.value, 'success', run)
+
+                log.info("sync_products_completed", cabinet_id=cabinet_id, cards_count=cards_count, inserted=inserted, changed=changed, unchanged=unchanged, throttle=throttle, slot_wait=slot_wait, stages=run.as_dict())
+                await _report(self, batch_id, True)
+
+            except Exception as e:
+                log.error("sync_products_failed", cabinet_id=cabinet_id, error=str(e))
+                await _fail_run(session, SyncType.products, run_id, run, throttle, e)
+                await _report(self, batch_id, False)
+                raise
 
 @shared_task(bind=True, max_retries=3)
-async def sync_sales(self, cabinet_id: int, days_back: int = 90):
-    """Синхронизация продаж и заказов за указанный период"""
-    async with async_session() as session:
-        try:
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'sales')
-                .values(status='in_progress', last_sync_date=datetime.utcnow())
-            )
-            await session.commit()
-
-            cabinet = await session.get(Cabinet, cabinet_id)
-            if not cabinet:
-                raise ValueError(f"Cabinet {cabinet_id} not found")
-
-            # Дата начала
-            date_from = (datetime.utcnow() - timedelta(days=days_back)).strftime('%Y-%m-%dT%H:%M:%S')
-
-            wb_client = WildberriesAPIClient()
-
-            # Получить заказы
-            orders = await wb_client.get_orders(cabinet.api_token, date_from)
-
-            # Получить продажи (выкупы)
-            sales = await wb_client.get_sales(cabinet.api_token, date_from)
-
-            log.info("sync_sales_started", cabinet_id=cabinet_id, orders=len(orders), sales=len(sales))
-
-            # Агрегация по (nm_id, date)
-            sales_dict = {}
-
-            # Обработка заказов
-            for order in orders:
-                nm_id = order.get('nmId')
-                date = datetime.fromisoformat(order.get('date').replace('Z', '+00:00')).date()
-                key = (nm_id, date)
-
-                if key not in sales_dict:
-                    sales_dict[key] = {'orders': 0, 'buyouts': 0, 'revenue': 0}
-
-                sales_dict[key]['orders'] += 1
-
-            # Обработка продаж (выкупы)
-            for sale in sales:
-                nm_id = sale.get('nmId')
-                date = datetime.fromisoformat(sale.get('date').replace('Z', '+00:00')).date()
-                key = (nm_id, date)
-
-                if key not in sales_dict:
-                    sales_dict[key] = {'orders': 0, 'buyouts': 0, 'revenue': 0}
-
-                # Проверка что это выкуп (не отмена)
-                if sale.get('saleID') and not sale.get('cancelID'):
-                    sales_dict[key]['buyouts'] += 1
-                    sales_dict[key]['revenue'] += float(sale.get('priceWithDisc', 0))
-
-            # Сохранение в БД (upsert)
-            for (nm_id, date), metrics in sales_dict.items():
-                # Проверить существование записи
-                result = await session.execute(
-                    select(SalesHistory).where(
-                        SalesHistory.nm_id == nm_id,
-                        SalesHistory.date == date
-                    )
-                )
-                existing = result.scalar_one_or_none()
-
-                if existing:
-                    existing.orders_count = metrics['orders']
-                    existing.buyouts_count = metrics['buyouts']
-                    existing.revenue = metrics['revenue']
+async def sync_sales(self, cabinet_id: int, days_back: int = 90, batch_size: int = None, mode: str = 'incremental', batch_id: str = None):
+    """
+    Синхронизация продаж и заказов.
+
+    mode='incremental' — запрашивает только строки, изменённые после сохранённого
+    курсора lastChangeDate, и пересчитывает затронутые (nm_id, date).
+    mode='reconcile' — полная сверка за days_back дней. Выполняется также,
+    если курсора для кабинета ещё нет.
+    """
+    await run_exclusive(
+        self, SyncType.sales, cabinet_id, _sync_sales, batch_id=batch_id,
+        # Сверка вытесняет отложенный инкрементальный запрос, но не наоборот
+        override=mode == 'reconcile',
+        days_back=days_back, batch_size=batch_size, mode=mode,
+    )
+
+async def _sync_sales(self, cabinet_id: int, days_back: int = 90, batch_size: int = None, mode: str = 'incremental', batch_id: str = None):
+    throttle = throttle_stats.begin()
+    run = SyncRunStats.begin()
+    run_id = None
+    async with sync_slot(self.request.id) as slot_wait:
+        async with async_session() as session:
+            try:
+                run_id = await _start_run(session, cabinet_id, SyncType.sales, mode=mode)
+
+                cabinet = await session.get(Cabinet, cabinet_id)
+                if not cabinet:
+                    raise ValueError(f"Cabinet {cabinet_id} not found")
+
+                orders_mark = await get_watermark(session, cabinet_id, SyncType.orders)
+                sales_mark = await get_watermark(session, cabinet_id, SyncType.sales)
+                reconcile = mode == 'reconcile' or orders_mark is None or sales_mark is None
+                run_mode = 'reconcile' if reconcile else 'incremental'
+
+                # Дата начала
+                window_start = datetime.utcnow() - timedelta(days=days_back)
+                if reconcile:
+                    orders_from = sales_from = window_start
                 else:
-                    history = SalesHistory(
-                        nm_id=nm_id,
-                        cabinet_id=cabinet_id,
-                        date=date,
-                        orders_count=metrics['orders'],
-                        buyouts_count=metrics['buyouts'],
-                        revenue=metrics['revenue']
-                    )
-                    session.add(history)
-
-            await session.commit()
-
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'sales')
-                .values(status='success', error_message=None)
-            )
-            await session.commit()
-
-            log.info("sync_sales_completed", cabinet_id=cabinet_id)
-
-        except Exception as e:
-            log.error("sync_sales_failed", cabinet_id=cabinet_id, error=str(e))
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'sales')
-                .values(status='failed', error_message=str(e))
-            )
-            await session.commit()
-            raise self.retry(exc=e, countdown=60)
+                    orders_from, sales_from = orders_mark, sales_mark
+
+                wb_client = get_wb_client()
+                aggregator = SalesAggregator(date_from=window_start.date()) if reconcile else None
+                affected = set()
+                orders_count = sales_count = 0
+                orders_max, sales_max = orders_mark, sales_mark
+
+                log.info("sync_sales_started", cabinet_id=cabinet_id, mode=run_mode)
+
+                # Заказы (flag=0: все строки с lastChangeDate >= dateFrom) разбираются
+                # потоком: каждая пачка сразу пишется в sales_events и агрегируется
+                async for orders in wb_client.stream_orders(
+                    cabinet.api_token, orders_from.strftime('%Y-%m-%dT%H:%M:%S'), batch_size=batch_size
+                ):
+                    with run.stage("write"):
+                        affected |= await upsert_sales_events(session, cabinet_id, orders, [], batch_size=batch_size)
+                    if aggregator:
+                        with run.stage("aggregate"):
+                            aggregator.add_orders(orders)
+                    orders_max = max_last_change_date(orders, orders_max)
+                    orders_count += len(orders)
+
+                # Продажи (выкупы)
+                async for sales in wb_client.stream_sales(
+                    cabinet.api_token, sales_from.strftime('%Y-%m-%dT%H:%M:%S'), batch_size=batch_size
+                ):
+                    with run.stage("write"):
+                        affected |= await upsert_sales_events(session, cabinet_id, [], sales, batch_size=batch_size)
+                    if aggregator:
+                        with run.stage("aggregate"):
+                            aggregator.add_sales(sales)
+                    sales_max = max_last_change_date(sales, sales_max)
+                    sales_count += len(sales)
+
+                if reconcile:
+                    # Полная перезапись агрегатов окна; строки до окна пересчитываются из sales_events
+                    with run.stage("aggregate"):
+                        columns = aggregator.result_columns()
+                    with run.stage("write"):
+                        written = await upsert_sales_history(session, cabinet_id, columns, batch_size=batch_size)
+                        aggregated = set(zip(columns["nm_id"].tolist(), columns["date"].tolist()))
+                        written += await reaggregate_sales_buckets(session, cabinet_id, affected.difference(aggregated))
+                else:
+                    aggregated = set()
+                    with run.stage("write"):
+                        written = await reaggregate_sales_buckets(session, cabinet_id, affected)
+
+                with run.stage("rollup"):
+                    # Недели, месяцы и дни, которых коснулась синхронизация
+                    rollups = await refresh_sales_rollups(session, cabinet_id, affected | aggregated)
+
+                with run.stage("write"):
+                    # Курсоры сдвигаются в той же транзакции, что и данные
+                    if orders_max:
+                        await set_watermark(session, cabinet_id, SyncType.orders, orders_max)
+                    if sales_max:
+                        await set_watermark(session, cabinet_id, SyncType.sales, sales_max)
+
+                    await session.commit()
+                if written:
+                    await bump_data_version(cabinet_id)
+
+                run.rows_read, run.rows_written = orders_count + sales_count, written
+
+                await finish_sync_run(session, run_id, run, 'success', throttle=throttle, mode=run_mode)
+                await session.commit()
+
+                observe_sync_run(SyncType.sales.value, 'success', run)
+
+                log.info("sync_sales_completed", cabinet_id=cabinet_id, orders=orders_count, sales=sales_count, buckets=len(affected), rows_written=written, rollups=rollups, throttle=throttle, slot_wait=slot_wait, stages=run.as_dict())
+                await _report(self, batch_id, True)
+
+            except Exception as e:
+                log.error("sync_sales_failed", cabinet_id=cabinet_id, error=str(e))
+                await _fail_run(session, SyncType.sales, run_id, run, throttle, e)
+                await _report(self, batch_id, False)
+                raise
 
 @shared_task(bind=True, max_retries=3)
-async def sync_stocks(self, cabinet_id: int):
+async def sync_stocks(self, cabinet_id: int, batch_id: str = None):
     """Синхронизация остатков WB"""
-    async with async_session() as session:
-        try:
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'stocks')
-                .values(status='in_progress', last_sync_date=datetime.utcnow())
-            )
-            await session.commit()
-
-            cabinet = await session.get(Cabinet, cabinet_id)
-            if not cabinet:
-                raise ValueError(f"Cabinet {cabinet_id} not found")
-
-            wb_client = WildberriesAPIClient()
-            stocks = await wb_client.get_stocks(cabinet.api_token)
-
-            log.info("sync_stocks_started", cabinet_id=cabinet_id, stocks_count=len(stocks))
-
-            # Агрегация по nm_id
-            stocks_dict = {}
-            for stock in stocks:
-                nm_id = stock.get('nmId')
-                quantity = stock.get('quantity', 0)
-
-                if nm_id not in stocks_dict:
-                    stocks_dict[nm_id] = 0
-
-                stocks_dict[nm_id] += quantity
-
-            # Обновление products
-            for nm_id, total_stock in stocks_dict.items():
-                await session.execute(
-                    update(Product)
-                    .where(Product.nm_id == nm_id)
-                    .values(stock_wb=total_stock, last_update=datetime.utcnow())
-                )
-
-            await session.commit()
-
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'stocks')
-                .values(status='success', error_message=None)
-            )
-            await session.commit()
-
-            log.info("sync_stocks_completed", cabinet_id=cabinet_id)
-
-        except Exception as e:
-            log.error("sync_stocks_failed", cabinet_id=cabinet_id, error=str(e))
-            await session.execute(
-                update(SyncHistory)
-                .where(SyncHistory.cabinet_id == cabinet_id, SyncHistory.sync_type == 'stocks')
-                .values(status='failed', error_message=str(e))
-            )
-            await session.commit()
-            raise self.retry(exc=e, countdown=60)
+    await run_exclusive(self, SyncType.stocks, cabinet_id, _sync_stocks, batch_id=batch_id)
+
+async def _sync_stocks(self, cabinet_id: int, batch_id: str = None):
+    throttle = throttle_stats.begin()
+    run = SyncRunStats.begin()
+    run_id = None
+    async with sync_slot(self.request.id) as slot_wait:
+        async with async_session() as session:
+            try:
+                run_id = await _start_run(session, cabinet_id, SyncType.stocks)
+
+                cabinet = await session.get(Cabinet, cabinet_id)
+                if not cabinet:
+                    raise ValueError(f"Cabinet {cabinet_id} not found")
+
+                wb_client = get_wb_client()
+                stocks = await wb_client.get_stocks(cabinet.api_token)
+
+                log.info("sync_stocks_started", cabinet_id=cabinet_id, stocks_count=len(stocks))
+
+                # Агрегация по nm_id
+                stocks_dict = {}
+                for stock in stocks:
+                    stocks_dict[stock.nm_id] = stocks_dict.get(stock.nm_id, 0) + stock.quantity
+
+                # Обновление products одним запросом, отсутствующие SKU обнуляются
+                with run.stage("write"):
+                    updated = await apply_stocks(session, cabinet_id, stocks_dict)
+                    await session.commit()
+                if updated:
+                    await bump_data_version(cabinet_id)
+
+                run.rows_read, run.rows_written = len(stocks), updated
+                await finish_sync_run(session, run_id, run, 'success', throttle=throttle)
+                await session.commit()
+                observe_sync_run(SyncType.stocks.value, 'success', run)
+
+                log.info("sync_stocks_completed", cabinet_id=cabinet_id, products_updated=updated, throttle=throttle, slot_wait=slot_wait, stages=run.as_dict())
+                await _report(self, batch_id, True)
+
+            except Exception as e:
+                log.error("sync_stocks_failed", cabinet_id=cabinet_id, error=str(e))
+                await _fail_run(session, SyncType.stocks, run_id, run, throttle, e)
+                await _report(self, batch_id, False)
+                raise
 
 # Задачи для синхронизации всех кабинетов
 @shared_task
 async def sync_all_products():
     """Синхронизация товаров для всех кабинетов"""
     async with async_session() as session:
-        result = await session.execute(select(Cabinet))
-        cabinets = result.scalars().all()
+        cabinet_ids = await stale_first_cabinets(session, SyncType.products)
 
-        for cabinet in cabinets:
-            sync_products.delay(cabinet.id)
+    batch_id = await start_batch(SyncType.products, cabinet_ids)
+    await dispatch(sync_products, SyncType.products, cabinet_ids, batch_id)
 
 @shared_task
-async def sync_all_sales():
+async def sync_all_sales(mode: str = 'incremental'):
     """Синхронизация продаж для всех кабинетов"""
     async with async_session() as session:
-        result = await session.execute(select(Cabinet))
-        cabinets = result.scalars().all()
+        cabinet_ids = await stale_first_cabinets(session, SyncType.sales)
 
-        for cabinet in cabinets:
-            sync_sales.delay(cabinet.id)
+    # Суточная сверка не должна задерживать инкрементальные прогоны
+    priority = RECONCILE_PRIORITY if mode == 'reconcile' else None
+    batch_id = await start_batch(SyncType.sales, cabinet_ids)
+    await dispatch(sync_sales, SyncType.sales, cabinet_ids, batch_id, priority=priority, mode=mode)
 
 @shared_task
 async def sync_all_stocks():
     """Синхронизация остатков для всех кабинетов"""
     async with async_session() as session:
-        result = await session.execute(select(Cabinet))
-        cabinets = result.scalars().all()
+        cabinet_ids = await stale_first_cabinets(session, SyncType.stocks)
 
-        for cabinet in cabinets:
-            sync_stocks.delay(cabinet.id)
+    batch_id = await start_batch(SyncType.stocks, cabinet_ids)
+    await dispatch(sync_stocks, SyncType.stocks, cabinet_ids, batch_id)
@@ -0,0 +1,86 @@
+"""
+Бенчмарк /dashboard/products: OFFSET-страницы против keyset-курсора.
+
+Запуск (нужен PostgreSQL из DATABASE_URL):
+    python benchmarks/bench_dashboard_pagination.py --products 20000 --pages 1 10 100 500
+
+Создаёт кабинет с товарами и продажами за 7 дней, вызывает обработчик
+get_products напрямую и откатывает транзакцию в конце. Курсором страницы
+проходятся последовательно, как их листает клиент.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.append(os.getcwd())
+
+from app.api.v1.routes.dashboard import get_products
+from app.db.session import async_session
+from app.models import User, Cabinet
+from app.models.user import UserRole
+
+LIMIT = 20
+
+
+async def seed(session, cabinet_id: int, products: int):
+    await session.execute(text(
+        "INSERT INTO products (nm_id, cabinet_id, title, stock_wb, stock_own) "
+        "SELECT 8000000000 + g, :cabinet_id, 'Bench ' || g, g % 50, 0 FROM generate_series(1, :n) g"
+    ), {"cabinet_id": cabinet_id, "n": products})
+    await session.execute(text(
+        "INSERT INTO sales_history (nm_id, cabinet_id, date, orders_count, buyouts_count, revenue) "
+        "SELECT 8000000000 + g, :cabinet_id, current_date - d, (g * 7 + d) % 13, (g * 3 + d) % 7, ((g * 31 + d) % 997) * 10 "
+        "FROM generate_series(1, :n) g, generate_series(0, 7) d"
+    ), {"cabinet_id": cabinet_id, "n": products})
+
+
+async def call(session, user, cabinet_id: int, **params):
+    start = time.perf_counter()
+    response = await get_products(
+        period="week", cabinet_id=cabinet_id, sort_by="revenue", order="desc",
+        limit=LIMIT, current_user=user, db=session, **params,
+    )
+    return response, time.perf_counter() - start
+
+
+async def main(products: int, pages: list):
+    async with async_session() as session:
+        user = User(email=f"bench-{time.time()}@example.com", password_hash="-", role=UserRole.admin, name="bench")
+        session.add(user)
+        await session.flush()
+        cabinet = Cabinet(user_id=user.id, name="bench", api_token="-")
+        session.add(cabinet)
+        await session.flush()
+
+        try:
+            await seed(session, cabinet.id, products)
+            await session.execute(text("ANALYZE products"))
+
+            print(f"{'page':>6} {'offset, ms':>12} {'cursor, ms':>12}")
+            cursor = None
+            cursor_times = {}
+            for page in range(1, max(pages) + 1):
+                response, elapsed = await call(session, user, cabinet.id, cursor=cursor, page=1, with_total=cursor is None)
+                cursor_times[page] = elapsed
+                cursor = response.next_cursor
+                if cursor is None:
+                    break
+
+            for page in pages:
+                if page not in cursor_times:
+                    break
+                _, offset_elapsed = await call(session, user, cabinet.id, cursor=None, page=page, with_total=True)
+                print(f"{page:>6} {offset_elapsed * 1000:>12.1f} {cursor_times[page] * 1000:>12.1f}")
+        finally:
+            await session.rollback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 500])
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.pages))
@@ -0,0 +1,107 @@
+"""
+Бенчмарк записи карточек: построчный session.get против пакетного ON CONFLICT.
+
+Запуск (нужен PostgreSQL из DATABASE_URL):
+    python benchmarks/bench_product_upsert.py --cards 30000
+
+Все изменения выполняются в одной транзакции и откатываются в конце.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import msgspec
+
+sys.path.append(os.getcwd())
+
+from app.db.session import async_session
+from app.models import User, Cabinet, Product
+from app.models.user import UserRole
+from app.services.data_sync import upsert_products
+from app.services.wb_schemas import Card, Size, Tag
+
+
+def make_cards(count: int, offset: int, title: str = "Bench product") -> list:
+    return [
+        Card(
+            nm_id=offset + i,
+            vendor_code=f"ART-{offset + i}",
+            object=f"{title} {i}",
+            sizes=[Size(skus=[f"46{offset + i:011d}"])],
+            tags=[Tag(name="bench"), Tag(name=f"tag-{i % 7}")],
+            media_files=[f"https://example.com/{offset + i}.jpg"],
+        )
+        for i in range(count)
+    ]
+
+
+async def legacy_upsert(session, cabinet_id: int, cards: list):
+    """Прежний путь из sync_products: session.get на каждую карточку"""
+    for card in cards:
+        existing = await session.get(Product, card.nm_id)
+        if existing:
+            existing.vendor_code = card.vendor_code
+            existing.barcode = card.barcode
+            existing.title = card.object
+            existing.manager = ",".join(card.tag_names)
+            existing.image_url = card.photo
+            existing.sizes = msgspec.to_builtins(card.sizes)
+            existing.last_update = datetime.utcnow()
+        else:
+            session.add(Product(
+                nm_id=card.nm_id,
+                cabinet_id=cabinet_id,
+                vendor_code=card.vendor_code,
+                barcode=card.barcode,
+                title=card.object,
+                manager=",".join(card.tag_names),
+                image_url=card.photo,
+                sizes=msgspec.to_builtins(card.sizes),
+                last_update=datetime.utcnow(),
+            ))
+    await session.flush()
+
+
+async def bulk_upsert(session, cabinet_id: int, cards: list):
+    await upsert_products(session, cabinet_id, cards)
+
+
+async def measure(label: str, func, session, cabinet_id: int, cards: list):
+    start = time.perf_counter()
+    await func(session, cabinet_id, cards)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(cards):>8} rows  {elapsed:8.2f}s  {len(cards) / elapsed:>10.0f} rows/sec")
+
+
+async def main(count: int):
+    async with async_session() as session:
+        user = User(email=f"bench-{time.time()}@example.com", password_hash="-", role=UserRole.admin, name="bench")
+        session.add(user)
+        await session.flush()
+        cabinet = Cabinet(user_id=user.id, name="bench", api_token="-")
+        session.add(cabinet)
+        await session.flush()
+
+        legacy_cards = make_cards(count, 9_000_000_000)
+        bulk_cards = make_cards(count, 9_100_000_000)
+
+        try:
+            await measure("legacy insert", legacy_upsert, session, cabinet.id, legacy_cards)
+            session.expunge_all()
+            await measure("legacy update", legacy_upsert, session, cabinet.id, legacy_cards)
+            await measure("bulk insert", bulk_upsert, session, cabinet.id, bulk_cards)
+            # Повтор без изменений: строки отсекаются по content_hash
+            await measure("bulk unchanged", bulk_upsert, session, cabinet.id, bulk_cards)
+            changed_cards = make_cards(count, 9_100_000_000, title="Renamed product")
+            await measure("bulk changed", bulk_upsert, session, cabinet.id, changed_cards)
+        finally:
+            await session.rollback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=30000)
+    args = parser.parse_args()
+    asyncio.run(main(args.cards))
@@ -0,0 +1,111 @@
+"""
+Бенчмарк агрегации заказов/выкупов: построчный цикл по словарю против колоночной.
+
+Запуск:
+    python benchmarks/bench_sales_aggregation.py --rows 500000
+
+База данных не нужна: сравнивается только стадия агрегации, результаты
+обоих вариантов сверяются между собой.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.getcwd())
+
+from app.services.data_sync import SalesAggregator
+from app.services.wb_schemas import Order, Sale
+
+
+def make_rows(count: int, products: int = 5000, days: int = 90):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    orders = [
+        Order(
+            nm_id=rng.randrange(products),
+            date=start + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400)),
+            srid=f"o{i}",
+            price_with_disc=rng.uniform(100, 5000),
+        )
+        for i in range(count // 2)
+    ]
+    sales = [
+        Sale(
+            nm_id=rng.randrange(products),
+            date=start + timedelta(days=rng.randrange(days), seconds=rng.randrange(86400)),
+            sale_id=f"S{i}",
+            cancel_id="R" if rng.random() < 0.1 else None,
+            price_with_disc=rng.uniform(100, 5000),
+        )
+        for i in range(count - count // 2)
+    ]
+    return orders, sales
+
+
+def legacy_aggregate(orders, sales):
+    """Прежний путь: словарь {(nm_id, date): {...}} с обновлением на каждую строку"""
+    result = {}
+    for order in orders:
+        bucket = result.setdefault((order.nm_id, order.date.date()), {'orders': 0, 'buyouts': 0, 'revenue': 0.0})
+        bucket['orders'] += 1
+    for sale in sales:
+        bucket = result.setdefault((sale.nm_id, sale.date.date()), {'orders': 0, 'buyouts': 0, 'revenue': 0.0})
+        if sale.is_buyout:
+            bucket['buyouts'] += 1
+            bucket['revenue'] += sale.price_with_disc
+    return result
+
+
+def fill_aggregator(orders, sales, batch_size: int = 1000) -> SalesAggregator:
+    aggregator = SalesAggregator()
+    for start in range(0, len(orders), batch_size):
+        aggregator.add_orders(orders[start:start + batch_size])
+    for start in range(0, len(sales), batch_size):
+        aggregator.add_sales(sales[start:start + batch_size])
+    return aggregator
+
+
+def columnar_aggregate(orders, sales):
+    """Путь синхронизации: колонки сразу уходят в upsert_sales_history"""
+    columns = fill_aggregator(orders, sales).result_columns()
+    return columns["nm_id"]
+
+
+def columnar_as_dict(orders, sales):
+    return fill_aggregator(orders, sales).result()
+
+
+def measure(label: str, func, orders, sales):
+    rows = len(orders) + len(sales)
+    start = time.perf_counter()
+    result = func(orders, sales)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {rows:>8} rows  {len(result):>8} buckets  {elapsed:8.3f}s  {rows / elapsed:>10.0f} rows/sec")
+    return result
+
+
+def check(expected, actual):
+    assert expected.keys() == actual.keys(), "bucket sets differ"
+    for key, bucket in expected.items():
+        other = actual[key]
+        assert bucket['orders'] == other['orders'] and bucket['buyouts'] == other['buyouts'], key
+        assert abs(bucket['revenue'] - other['revenue']) < 1e-6 * max(1.0, bucket['revenue']), key
+
+
+def main(count: int):
+    orders, sales = make_rows(count)
+    expected = measure("legacy", legacy_aggregate, orders, sales)
+    measure("columnar", columnar_aggregate, orders, sales)
+    actual = measure("as dict", columnar_as_dict, orders, sales)
+    check(expected, actual)
+    print("results match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+    main(args.rows)
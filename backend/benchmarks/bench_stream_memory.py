@@ -0,0 +1,81 @@
+"""
+Пиковая память при разборе большого ответа /api/v1/supplier/sales:
+буферизованный get_sales против потокового stream_sales.
+
+Ответ отдаётся через httpx.MockTransport чанками по 64 KiB, сеть не нужна.
+Запуск:
+    python benchmarks/bench_stream_memory.py --rows 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+sys.path.append(os.getcwd())
+
+from app.services.data_sync import SalesAggregator
+from app.services.wb_api import WildberriesAPIClient
+from benchmarks.bench_wb_decode import make_payload
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_client(payload: bytes) -> WildberriesAPIClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        async def body():
+            for start in range(0, len(payload), CHUNK_SIZE):
+                yield payload[start:start + CHUNK_SIZE]
+        return httpx.Response(200, content=body())
+
+    return WildberriesAPIClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+async def buffered(client: WildberriesAPIClient):
+    aggregator = SalesAggregator()
+    aggregator.add_sales(await client.get_sales("token", "2024-01-01"))
+    return aggregator.result()
+
+
+async def streamed(client: WildberriesAPIClient):
+    aggregator = SalesAggregator()
+    async for batch in client.stream_sales("token", "2024-01-01"):
+        aggregator.add_sales(batch)
+    return aggregator.result()
+
+
+async def measure(label: str, func, payload: bytes):
+    # Время и пиковая память замеряются в разных прогонах: tracemalloc сильно замедляет код
+    client = make_client(payload)
+    start = time.perf_counter()
+    result = await func(client)
+    elapsed = time.perf_counter() - start
+    await client.close()
+
+    client = make_client(payload)
+    tracemalloc.start()
+    await func(client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await client.close()
+
+    print(f"{label:<10} {elapsed:8.2f}s  peak {peak / 1024 / 1024:8.1f} MiB")
+    return result
+
+
+async def main(rows: int):
+    payload = make_payload(rows)
+    print(f"payload: {rows} rows, {len(payload) / 1024 / 1024:.1f} MiB (исходные байты не входят в замер)")
+    first = await measure("buffered", buffered, payload)
+    second = await measure("streamed", streamed, payload)
+    assert first == second, "результаты агрегации различаются"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows))
@@ -0,0 +1,108 @@
+"""
+Бенчмарк разбора ответа /api/v1/supplier/sales: json + dict + fromisoformat
+против типизированного декодирования msgspec.
+
+Запуск:
+    python benchmarks/bench_wb_decode.py --rows 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.getcwd())
+
+from app.services.data_sync import aggregate_sales
+from app.services.wb_schemas import sales_decoder
+
+
+def make_payload(rows: int) -> bytes:
+    start = datetime(2024, 1, 1)
+    items = []
+    for i in range(rows):
+        moment = start + timedelta(minutes=random.randint(0, 90 * 24 * 60))
+        items.append({
+            "date": moment.strftime("%Y-%m-%dT%H:%M:%S"),
+            "lastChangeDate": (moment + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "warehouseName": "Коледино",
+            "countryName": "Россия",
+            "oblastOkrugName": "Центральный федеральный округ",
+            "regionName": "Московская",
+            "supplierArticle": f"ART-{i % 5000}",
+            "nmId": 100000 + i % 5000,
+            "barcode": f"46{i % 5000:011d}",
+            "category": "Одежда",
+            "subject": "Футболки",
+            "brand": "Electra",
+            "techSize": "M",
+            "incomeID": 123456,
+            "isSupply": False,
+            "isRealization": True,
+            "totalPrice": 1500,
+            "discountPercent": 20,
+            "spp": 5,
+            "paymentSaleAmount": 0,
+            "forPay": 1100.5,
+            "finishedPrice": 1140,
+            "priceWithDisc": 1200,
+            "saleID": f"S{i}" if i % 10 else f"R{i}",
+            "cancelID": "" if i % 13 else f"C{i}",
+            "sticker": "",
+            "gNumber": f"{i:020d}",
+            "srid": f"srid-{i}",
+        })
+    return json.dumps(items, ensure_ascii=False).encode()
+
+
+def legacy_path(payload: bytes):
+    """Прежний путь: response.json(), фильтр get_sales и цикл с fromisoformat"""
+    data = json.loads(payload)
+    sales = []
+    for item in data:
+        if not item.get("saleID"):
+            continue
+        item["is_buyout"] = not item.get("cancelID")
+        sales.append(item)
+
+    sales_dict = {}
+    for sale in sales:
+        nm_id = sale.get("nmId")
+        date = datetime.fromisoformat(sale.get("date").replace("Z", "+00:00")).date()
+        key = (nm_id, date)
+        if key not in sales_dict:
+            sales_dict[key] = {"orders": 0, "buyouts": 0, "revenue": 0}
+        if sale.get("saleID") and not sale.get("cancelID"):
+            sales_dict[key]["buyouts"] += 1
+            sales_dict[key]["revenue"] += float(sale.get("priceWithDisc", 0))
+    return sales_dict
+
+
+def typed_path(payload: bytes):
+    sales = [sale for sale in sales_decoder.decode(payload) if sale.sale_id]
+    return aggregate_sales([], sales)
+
+
+def measure(label: str, func, payload: bytes, rows: int):
+    start = time.perf_counter()
+    result = func(payload)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.3f}s  {rows / elapsed:>12.0f} rows/sec")
+    return result
+
+
+def main(rows: int):
+    payload = make_payload(rows)
+    print(f"payload: {rows} rows, {len(payload) / 1024 / 1024:.1f} MiB")
+    legacy = measure("legacy", legacy_path, payload, rows)
+    typed = measure("msgspec", typed_path, payload, rows)
+    assert legacy == typed, "результаты агрегации различаются"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.rows)
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://127.0.0.1:6379/15")
+# Отдельная БД Postgres для тестов: схема создаётся по моделям, тестовые строки удаляются
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest_asyncio.fixture
+async def redis():
+    client = Redis.from_url(REDIS_URL)
+    try:
+        await client.ping()
+    except (RedisConnectionError, OSError):
+        await client.aclose()
+        pytest.skip(f"Redis is not available at {REDIS_URL}")
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def database_url():
+    if not DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return DATABASE_URL
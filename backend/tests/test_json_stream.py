@@ -0,0 +1,69 @@
+import json
+import random
+
+import pytest
+
+from app.services.json_stream import JsonArraySplitter
+
+TRICKY_STRINGS = ['}', ']', '{"a": 1}', '[1, 2]', 'кавычка " внутри', 'слэш \\ в конце\\', '\\"}', '', ',', 'x}]"']
+
+
+def random_element(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(6 if depth < 2 else 4)
+    if kind == 0:
+        return rng.choice(TRICKY_STRINGS)
+    if kind == 1:
+        return rng.choice([0, -17, 3.25, 1e21, 9_999_999_999, True, False, None])
+    if kind in (2, 3):
+        # Плоский объект, как строки статистики WB
+        return {f"k{i}": rng.choice([rng.choice(TRICKY_STRINGS), rng.randint(-10, 10 ** 12), None]) for i in range(rng.randint(0, 4))}
+    if kind == 4:
+        return [random_element(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {"nested": random_element(rng, depth + 1), "list": [random_element(rng, depth + 1)]}
+
+
+def split(rng: random.Random, data: bytes):
+    cuts = sorted(rng.sample(range(1, len(data)), min(len(data) - 1, rng.randint(1, 40))))
+    return [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+
+
+def feed_all(chunks):
+    splitter = JsonArraySplitter()
+    items = []
+    for chunk in chunks:
+        batch = splitter.feed(chunk)
+        if batch is not None:
+            items.extend(json.loads(batch))
+    splitter.close()
+    return items
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunk_boundaries_preserve_elements(seed):
+    rng = random.Random(seed)
+    elements = [random_element(rng) for _ in range(rng.randint(0, 30))]
+    text = json.dumps(elements, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    data = b"  \n" + text.encode() + b"\n"
+
+    assert feed_all(split(rng, data)) == elements
+
+
+def test_byte_by_byte_feed():
+    elements = [{"a": "}"}, {"b": "\\\""}, ["]"], "[", 12, None]
+    data = json.dumps(elements, ensure_ascii=False).encode()
+
+    assert feed_all([data[i:i + 1] for i in range(len(data))]) == elements
+
+
+def test_truncated_array_is_rejected():
+    splitter = JsonArraySplitter()
+    splitter.feed(b'[{"a": 1}, {"b": "}')
+    with pytest.raises(ValueError):
+        splitter.close()
+
+
+def test_data_after_array_is_rejected():
+    splitter = JsonArraySplitter()
+    splitter.feed(b"[1]")
+    with pytest.raises(ValueError):
+        splitter.feed(b" [2]")
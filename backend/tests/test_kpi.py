@@ -0,0 +1,48 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.core.config import settings
+from app.services.kpi import KpiWindows, kpi_query, resolve_windows
+
+
+def test_previous_window_has_the_same_length():
+    windows = resolve_windows(date_from=date(2026, 9, 1), date_to=date(2026, 9, 30))
+
+    assert windows == KpiWindows(date(2026, 9, 1), date(2026, 9, 30), date(2026, 8, 2), date(2026, 8, 31))
+
+
+def test_year_over_year_clamps_leap_day():
+    windows = resolve_windows(date_from=date(2028, 2, 29), date_to=date(2028, 3, 6), compare="yoy")
+
+    assert (windows.compare_from, windows.compare_to) == (date(2027, 2, 28), date(2027, 3, 6))
+
+
+def test_period_counts_back_from_date_to():
+    windows = resolve_windows("week", date_to=date(2026, 10, 17), compare="none")
+
+    assert windows == KpiWindows(date(2026, 10, 11), date(2026, 10, 17))
+
+
+def test_week_is_compared_with_the_previous_seven_days():
+    windows = resolve_windows("week", date_to=date(2026, 10, 17))
+
+    assert (windows.compare_from, windows.compare_to) == (date(2026, 10, 4), date(2026, 10, 10))
+
+
+def test_reversed_range_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_windows(date_from=date(2026, 10, 2), date_to=date(2026, 10, 1))
+
+
+@pytest.mark.parametrize("use_rollups, table", [(True, "cabinet_daily_totals"), (False, "sales_history")])
+def test_cabinet_kpi_honours_rollup_flag(monkeypatch, use_rollups, table):
+    monkeypatch.setattr(settings, "DASHBOARD_USE_ROLLUPS", use_rollups)
+    admin = SimpleNamespace(role="admin", allowed_tags=None)
+
+    sql = str(kpi_query(resolve_windows("week"), None, admin).compile(dialect=postgresql.dialect()))
+
+    assert f"FROM {table}" in sql
+    assert ("cabinet_daily_totals" in sql) is use_rollups
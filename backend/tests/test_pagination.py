@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(sort_by="revenue", order="desc", key="1520.50", nm_id=123456789)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"sort_by": "revenue", "order": "desc", "key": "1520.50", "nm_id": 123456789}
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "W10", ""])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
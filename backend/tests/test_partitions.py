@@ -0,0 +1,100 @@
+import uuid
+from datetime import date
+
+import numpy as np
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.services.data_sync import upsert_sales_history
+from app.services.partitions import create_sales_partition, maintain_sales_partitions, partition_name, shift_months
+
+
+def test_shift_months_crosses_year_boundaries():
+    assert shift_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert shift_months(date(2026, 1, 1), -25) == date(2023, 12, 1)
+
+
+def test_partition_name():
+    assert partition_name(date(2026, 3, 1)) == "sales_history_y2026m03"
+
+
+@pytest_asyncio.fixture
+async def partitioned(database_url):
+    """
+    Секционированная sales_history в отдельной схеме (без внешних ключей).
+    Всё выполняется в одной транзакции, которая откатывается вместе со схемами.
+    """
+    schema = f"test_partitions_{uuid.uuid4().hex[:8]}"
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+        await conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+        await conn.execute(text(
+            "CREATE TABLE sales_history ("
+            "id serial, nm_id bigint NOT NULL, cabinet_id integer NOT NULL, date date NOT NULL, "
+            "orders_count integer DEFAULT 0, buyouts_count integer DEFAULT 0, "
+            "revenue numeric(12, 2) DEFAULT 0, created_at timestamp, "
+            "PRIMARY KEY (id, date), CONSTRAINT uq_sales_nm_date UNIQUE (nm_id, date)"
+            ") PARTITION BY RANGE (date)"
+        ))
+        await conn.execute(text("CREATE TABLE sales_history_default PARTITION OF sales_history DEFAULT"))
+        yield AsyncSession(bind=conn), schema
+        await transaction.rollback()
+    await engine.dispose()
+
+
+async def count(session, table):
+    return (await session.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+
+
+@pytest.mark.asyncio
+async def test_maintenance_moves_default_rows_and_archives_old_months(partitioned):
+    session, schema = partitioned
+    archive = f"{schema}_archive"
+    await create_sales_partition(session, date(2026, 7, 1))
+    await session.execute(text(
+        "INSERT INTO sales_history (nm_id, cabinet_id, date) VALUES "
+        "(1, 1, '2026-05-10'), (1, 1, '2026-07-10'), (1, 1, '2026-09-10'), (2, 1, '2026-09-11')"
+    ))
+
+    result = await maintain_sales_partitions(
+        session, today=date(2026, 10, 17), months_ahead=1, retention_months=2, archive_schema=archive,
+    )
+
+    assert result == {
+        "created": ["sales_history_y2026m09", "sales_history_y2026m10", "sales_history_y2026m11"],
+        "archived": ["sales_history_y2026m07"],
+        "expired": ["sales_history_y2026m05"],
+    }
+    assert await count(session, "sales_history_default") == 0
+    assert await count(session, "sales_history_y2026m09") == 2
+    assert await count(session, f"{archive}.sales_history_y2026m07") == 1
+    assert await count(session, f"{archive}.sales_history_y2026m05") == 1
+    # Архивные месяцы больше не видны через родительскую таблицу
+    assert await count(session, "sales_history") == 2
+
+
+@pytest.mark.asyncio
+async def test_upsert_conflicts_across_partitions(partitioned):
+    session, _ = partitioned
+    for month in (date(2026, 9, 1), date(2026, 10, 1)):
+        await create_sales_partition(session, month)
+
+    def columns(orders):
+        return {
+            "nm_id": np.array([1, 1], dtype=np.int64),
+            "date": np.array(["2026-09-30", "2026-10-01"], dtype="datetime64[D]"),
+            "orders_count": np.array([orders, orders], dtype=np.int64),
+            "buyouts_count": np.array([0, 0], dtype=np.int64),
+            "revenue": np.array([0.0, 0.0]),
+        }
+
+    assert await upsert_sales_history(session, 1, columns(1)) == 2
+    assert await upsert_sales_history(session, 1, columns(5)) == 2
+
+    rows = await session.execute(text("SELECT tableoid::regclass::text, orders_count FROM sales_history ORDER BY date"))
+    assert rows.all() == [("sales_history_y2026m09", 5), ("sales_history_y2026m10", 5)]
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from app.core.dependencies import filter_by_user_tags
+from app.models import Product
+from app.models.product_tag import split_tags
+
+
+def test_split_tags_drops_blanks_and_duplicates():
+    assert split_tags(" Иванов, Петров,,Иванов ") == ["Иванов", "Петров"]
+    assert split_tags(None) == []
+
+
+def test_manager_scope_uses_product_tags():
+    manager = SimpleNamespace(role="manager", allowed_tags="Иванов,Петров")
+    sql = str(filter_by_user_tags(select(Product.nm_id), manager))
+
+    assert "product_tags" in sql
+    assert "products.manager" not in sql
+
+
+def test_admin_is_not_scoped():
+    query = select(Product.nm_id)
+    assert filter_by_user_tags(query, SimpleNamespace(role="admin", allowed_tags=None)) is query
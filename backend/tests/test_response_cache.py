@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Response
+from pydantic import BaseModel
+from starlette.requests import Request
+
+from app.services import response_cache
+from app.services.response_cache import (
+    bump_data_version, cache_key, cached_response, etag, etag_matches, user_scope,
+)
+
+CABINET_ID = 987654
+
+
+class Payload(BaseModel):
+    value: int
+
+
+@pytest.fixture
+def cache(redis, monkeypatch):
+    monkeypatch.setattr(response_cache, "get_redis", lambda: redis)
+    return redis
+
+
+def test_scope_depends_on_tags_not_their_order():
+    first = SimpleNamespace(role="manager", allowed_tags="Петров, Иванов")
+    second = SimpleNamespace(role="manager", allowed_tags="Иванов,Петров")
+
+    assert user_scope(first) == user_scope(second)
+    assert user_scope(SimpleNamespace(role="admin", allowed_tags="Иванов")) == "all"
+    assert cache_key("kpi", "all", {"period": "week"}) != cache_key("kpi", "all", {"period": "month"})
+
+
+def test_etag_follows_content():
+    tag = etag({"value": 1})
+
+    assert tag.startswith('"') and tag == etag({"value": 1})
+    assert tag != etag({"value": 2})
+    assert etag_matches(f'"other", W/{tag}', tag)
+    assert etag_matches("*", tag)
+    assert not etag_matches(None, tag)
+
+
+def make_request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+@pytest.mark.asyncio
+async def test_etag_is_sent_without_cache(monkeypatch):
+    monkeypatch.setattr(response_cache.settings, "DASHBOARD_CACHE_TTL", 0)
+    admin = SimpleNamespace(role="admin", allowed_tags=None)
+
+    async def compute(db):
+        return Payload(value=1)
+
+    response = Response()
+    assert await cached_response("test", admin, None, {}, compute, make_request(), response) == {"value": 1}
+    tag = response.headers["etag"]
+
+    not_modified = await cached_response("test", admin, None, {}, compute, make_request(tag), Response())
+    assert not_modified.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_hit_then_stale_while_revalidate(cache):
+    await cache.delete(response_cache.version_key(CABINET_ID))
+    admin = SimpleNamespace(role="admin", allowed_tags=None)
+    params = {"test": asyncio.get_running_loop().time()}
+    calls = []
+
+    async def compute(db):
+        calls.append(1)
+        return Payload(value=len(calls))
+
+    assert await cached_response("test", admin, CABINET_ID, params, compute) == {"value": 1}
+    assert await cached_response("test", admin, CABINET_ID, params, compute) == {"value": 1}
+    assert len(calls) == 1
+
+    # После синхронизации старая запись отдаётся сразу, пересчёт идёт в фоне
+    await bump_data_version(CABINET_ID)
+    assert await cached_response("test", admin, CABINET_ID, params, compute) == {"value": 1}
+    await asyncio.gather(*response_cache._refreshing)
+    assert await cached_response("test", admin, CABINET_ID, params, compute) == {"value": 2}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_if_none_match_returns_304_until_data_changes(cache):
+    await cache.delete(response_cache.version_key(CABINET_ID))
+    admin = SimpleNamespace(role="admin", allowed_tags=None)
+    params = {"test": asyncio.get_running_loop().time()}
+    calls = []
+
+    async def compute(db):
+        calls.append(1)
+        return Payload(value=len(calls))
+
+    response = Response()
+    await cached_response("test", admin, CABINET_ID, params, compute, make_request(), response)
+    tag = response.headers["etag"]
+
+    not_modified = await cached_response("test", admin, CABINET_ID, params, compute, make_request(tag), Response())
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == tag
+    assert len(calls) == 1
+
+    await bump_data_version(CABINET_ID)
+    await cache.delete(cache_key("test", "all", {**params, "cabinet_id": CABINET_ID}))
+    response = Response()
+    assert await cached_response("test", admin, CABINET_ID, params, compute, make_request(tag), response) == {"value": 2}
+    assert response.headers["etag"] != tag
@@ -0,0 +1,92 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.services.data_sync import SalesAggregator
+from app.services.wb_schemas import Order, Sale
+
+NM_IDS = [1, 123_456_789, 9_999_999_999, 2 ** 40 + 1]
+# Переход через год и концы суток
+MOMENTS = [
+    datetime(2025, 12, 31, 0, 0, 0),
+    datetime(2025, 12, 31, 23, 59, 59),
+    datetime(2026, 1, 1, 0, 0, 0),
+    datetime(2026, 1, 1, 23, 59, 59, tzinfo=timezone.utc),
+    datetime(2026, 1, 2, 0, 30, tzinfo=timezone(timedelta(hours=3))),
+]
+
+
+def reference(orders, sales, date_from=None):
+    """Агрегация по строкам словарём, как до перехода на numpy"""
+    result = {}
+
+    def bucket(item):
+        key = (item.nm_id, item.date.date())
+        if date_from and key[1] < date_from:
+            return None
+        return result.setdefault(key, {"orders": 0, "buyouts": 0, "revenue": 0.0})
+
+    for order in orders:
+        if (totals := bucket(order)) is not None:
+            totals["orders"] += 1
+    for sale in sales:
+        if (totals := bucket(sale)) is not None and sale.sale_id and not sale.cancel_id:
+            totals["buyouts"] += 1
+            totals["revenue"] += sale.price_with_disc
+    return result
+
+
+def random_rows(seed: int):
+    rng = random.Random(seed)
+    orders = [
+        Order(date=rng.choice(MOMENTS), nm_id=rng.choice(NM_IDS), srid=str(i), price_with_disc=rng.uniform(1, 5000))
+        for i in range(300)
+    ]
+    sales = [
+        Sale(
+            date=rng.choice(MOMENTS),
+            nm_id=rng.choice(NM_IDS),
+            sale_id=rng.choice([f"S{i}", f"R{i}", None]),
+            cancel_id=rng.choice([None, None, f"C{i}"]),
+            price_with_disc=round(rng.uniform(-500, 5000), 2),
+        )
+        for i in range(300)
+    ]
+    # Повторы строк (WB отдаёт строку заново при каждом изменении)
+    return orders + orders[:50], sales + sales[:50]
+
+
+def aggregate(orders, sales, date_from=None, chunk=37):
+    aggregator = SalesAggregator(date_from)
+    for start in range(0, max(len(orders), len(sales)), chunk):
+        aggregator.add_orders(orders[start:start + chunk])
+        aggregator.add_sales(sales[start:start + chunk])
+    return aggregator.result()
+
+
+def assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, totals in expected.items():
+        assert actual[key]["orders"] == totals["orders"], key
+        assert actual[key]["buyouts"] == totals["buyouts"], key
+        assert actual[key]["revenue"] == pytest.approx(totals["revenue"]), key
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("date_from", [None, date(2026, 1, 1)])
+def test_aggregator_matches_row_by_row_aggregation(seed, date_from):
+    orders, sales = random_rows(seed)
+
+    assert_same(aggregate(orders, sales, date_from), reference(orders, sales, date_from))
+
+
+def test_cancelled_sales_keep_bucket_without_revenue():
+    day = datetime(2026, 1, 1, 12)
+    sales = [Sale(date=day, nm_id=7, sale_id="S1", cancel_id="C1", price_with_disc=100.0)]
+
+    assert aggregate([], sales) == {(7, date(2026, 1, 1)): {"orders": 0, "buyouts": 0, "revenue": 0.0}}
+
+
+def test_empty_input_gives_empty_result():
+    assert aggregate([], []) == {}
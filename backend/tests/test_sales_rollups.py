@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from app.services.sales_rollups import next_month_start, plan_period
+
+
+def covered_days(plan):
+    days = []
+    for month in plan.months:
+        days += [month + timedelta(days=i) for i in range((next_month_start(month) - month).days)]
+    for week in plan.weeks:
+        days += [week + timedelta(days=i) for i in range(7)]
+    for start, end in plan.days:
+        days += [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return days
+
+
+def test_plan_covers_window_exactly_once():
+    date_from, date_to = date(2026, 6, 13), date(2026, 10, 17)
+    days = covered_days(plan_period(date_from, date_to))
+
+    assert sorted(days) == [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+
+def test_plan_uses_whole_months_and_weeks():
+    plan = plan_period(date(2026, 8, 1), date(2026, 9, 13))
+
+    assert plan.months == [date(2026, 8, 1)]
+    assert plan.weeks == [date(2026, 9, 7)]
+    assert plan.days == [(date(2026, 9, 1), date(2026, 9, 6))]
@@ -0,0 +1,115 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.sync_history import SyncType
+from app.services.sync_lock import SyncLease
+from app.tasks import fleet
+
+
+@pytest.fixture
+def lease(redis):
+    prefix = f"test:lock:{uuid.uuid4().hex}"
+
+    def make(owner):
+        return SyncLease(redis, "sales", 1, owner=owner, ttl=5, prefix=prefix)
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_overlapping_run_is_coalesced_into_rerun(lease):
+    running, overlapping = lease("first"), lease("second")
+
+    assert await running.acquire({"mode": "incremental"}) == "acquired"
+    assert await overlapping.acquire({"mode": "incremental"}) == "coalesced"
+    assert await overlapping.acquire({"mode": "incremental"}) == "skipped"
+
+    # Владелец получает отложенный запрос и сохраняет блокировку
+    assert await running.release() == {"mode": "incremental"}
+    assert await overlapping.acquire({}) == "coalesced"
+    assert await running.release() == {}
+    assert await running.release() is None
+    assert await overlapping.acquire({}) == "acquired"
+
+
+@pytest.mark.asyncio
+async def test_override_replaces_pending_request(lease):
+    running, other = lease("first"), lease("second")
+
+    await running.acquire({})
+    await other.acquire({"mode": "incremental"})
+    assert await other.acquire({"mode": "reconcile"}, override=True) == "coalesced"
+    assert await running.release() == {"mode": "reconcile"}
+
+
+@pytest.mark.asyncio
+async def test_abandon_keeps_pending_for_next_owner(lease):
+    running, other = lease("first"), lease("second")
+
+    await running.acquire({})
+    await other.acquire({"mode": "reconcile"})
+    assert await running.release(abandon=True) is None
+    assert not await running.renew()
+    assert await other.acquire({"mode": "incremental"}) == "acquired"
+    assert await other.release() == {"mode": "reconcile"}
+
+
+@pytest.mark.asyncio
+async def test_owner_with_the_same_request_drops_pending(lease):
+    running, other = lease("first"), lease("second")
+
+    await running.acquire({})
+    await other.acquire({"mode": "incremental"})
+    await running.release(abandon=True)
+    assert await other.acquire({"mode": "incremental"}) == "acquired"
+    assert await other.release() is None
+
+
+class FakeTask:
+    def __init__(self):
+        self.request = SimpleNamespace(id=uuid.uuid4().hex)
+        self.sent = []
+
+    def apply_async(self, **options):
+        self.sent.append(options)
+
+    def retry(self, exc, countdown):
+        raise AssertionError("исходная задача не должна ретраиться")
+
+
+@pytest.mark.asyncio
+async def test_failed_rerun_is_requeued_with_pending_request(redis, monkeypatch):
+    monkeypatch.setattr(fleet, "get_redis", lambda: redis)
+    cabinet_id = uuid.uuid4().int % 1_000_000_000
+    task, calls = FakeTask(), []
+
+    async def run(task, cabinet_id, batch_id=None, mode="incremental"):
+        calls.append((batch_id, mode))
+        if len(calls) == 1:
+            # Сверка приходит во время первого прогона
+            other = fleet.SyncLease(redis, "sales", cabinet_id, owner="other", ttl=5)
+            assert await other.acquire({"mode": "reconcile"}) == "coalesced"
+        else:
+            raise RuntimeError("WB API недоступен")
+
+    await fleet.run_exclusive(task, SyncType.sales, cabinet_id, run, batch_id="batch", mode="incremental")
+
+    assert calls == [("batch", "incremental"), (None, "reconcile")]
+    assert [(s["args"], s["kwargs"]) for s in task.sent] == [((cabinet_id,), {"mode": "reconcile", "batch_id": None})]
+    await redis.delete(f"wb:sync:lock:sales:{cabinet_id}", f"wb:sync:lock:sales:{cabinet_id}:pending")
+
+
+@pytest.mark.asyncio
+async def test_lock_stats_are_grouped_by_sync_type(redis, monkeypatch):
+    monkeypatch.setattr(fleet, "get_redis", lambda: redis)
+    await redis.delete(fleet.LOCK_STATS_KEY)
+    await redis.hincrby(fleet.LOCK_STATS_KEY, "sales:coalesced", 2)
+    await redis.hincrby(fleet.LOCK_STATS_KEY, "sales:skipped", 1)
+    await redis.hincrby(fleet.LOCK_STATS_KEY, "stocks:coalesced", 1)
+
+    assert await fleet.lock_stats() == {
+        "sales": {"coalesced": 2, "skipped": 1},
+        "stocks": {"coalesced": 1, "skipped": 0},
+    }
@@ -0,0 +1,116 @@
+import os
+import uuid
+
+import httpx
+import pytest
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core import redis as app_redis
+from app.db.base import Base
+from app.db.session import async_session
+from app.models import Cabinet, Product, SyncHistory, User
+from app.models.sync_history import SyncType
+from app.models.user import UserRole
+from app.services.wb_api import WildberriesAPIClient
+from app.tasks import runtime, sync_tasks
+from app.tasks.celery_app import celery_app  # noqa: F401  shared_task привязываются к приложению с AsyncTask
+from app.tasks.fleet import BATCH_PREFIX, start_batch
+
+REDIS_URL = os.environ.get("TEST_REDIS_URL", "redis://127.0.0.1:6379/15")
+
+
+async def _create_schema(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@pytest.fixture
+def worker(database_url, monkeypatch):
+    """
+    Задачи выполняются через apply() так же, как в воркере: тела задач идут на
+    loop процесса. Движок без пула, потому что соединения asyncpg привязаны к loop.
+    """
+    redis = Redis.from_url(REDIS_URL)
+    try:
+        runtime.run(redis.ping())
+    except (RedisConnectionError, OSError):
+        runtime.run(redis.aclose())
+        pytest.skip(f"Redis is not available at {REDIS_URL}")
+
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    runtime.run(_create_schema(engine))
+    monkeypatch.setitem(async_session.kw, "bind", engine)
+    monkeypatch.setattr(app_redis, "_redis", redis)
+    yield redis
+    runtime.run(redis.aclose())
+    runtime.run(engine.dispose())
+
+
+@pytest.fixture
+def cabinet(worker):
+    base = 8_000_000_000 + uuid.uuid4().int % 1_000_000 * 10
+
+    async def create():
+        async with async_session() as session:
+            user = User(email=f"sync-{uuid.uuid4().hex}@example.com", password_hash="-", role=UserRole.admin, name="sync")
+            session.add(user)
+            await session.flush()
+            cabinet = Cabinet(user_id=user.id, name="sync", api_token="token")
+            session.add(cabinet)
+            await session.flush()
+            session.add_all([
+                Product(nm_id=base + 1, cabinet_id=cabinet.id, stock_wb=0),
+                Product(nm_id=base + 2, cabinet_id=cabinet.id, stock_wb=3),
+            ])
+            await session.commit()
+            return user.id, cabinet.id
+
+    async def drop(user_id, cabinet_id):
+        async with async_session() as session:
+            await session.execute(delete(SyncHistory).where(SyncHistory.cabinet_id == cabinet_id))
+            await session.execute(delete(Product).where(Product.cabinet_id == cabinet_id))
+            await session.execute(delete(Cabinet).where(Cabinet.id == cabinet_id))
+            await session.execute(delete(User).where(User.id == user_id))
+            await session.commit()
+
+    user_id, cabinet_id = runtime.run(create())
+    yield cabinet_id, base
+    runtime.run(drop(user_id, cabinet_id))
+
+
+def test_sync_stocks_runs_end_to_end(cabinet, monkeypatch):
+    cabinet_id, base = cabinet
+    stocks = [{"nmId": base + 1, "quantity": 5}, {"nmId": base + 1, "quantity": 2}]
+    client = WildberriesAPIClient(http_client=httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=stocks)),
+    ))
+    monkeypatch.setattr(sync_tasks, "get_wb_client", lambda: client)
+
+    result = sync_tasks.sync_stocks.apply(args=(cabinet_id,), task_id=uuid.uuid4().hex)
+    assert result.successful(), result.traceback
+
+    async def state():
+        async with async_session() as session:
+            products = await session.execute(select(Product.nm_id, Product.stock_wb).where(Product.cabinet_id == cabinet_id))
+            runs = await session.execute(select(SyncHistory.status).where(SyncHistory.cabinet_id == cabinet_id))
+            return dict(products.all()), runs.scalars().all()
+
+    stock_wb, runs = runtime.run(state())
+    # Отсутствующий в ответе WB товар обнуляется
+    assert stock_wb == {base + 1: 7, base + 2: 0}
+    assert runs == ["success"]
+
+
+def test_failed_cabinet_is_counted_after_last_retry(worker):
+    batch_id = runtime.run(start_batch(SyncType.stocks, [-1]))
+
+    result = sync_tasks.sync_stocks.apply(args=(-1,), kwargs={"batch_id": batch_id}, task_id=uuid.uuid4().hex)
+
+    assert result.failed()
+    batch = runtime.run(worker.hgetall(f"{BATCH_PREFIX}:{batch_id}"))
+    assert batch[b"failed"] == b"1" and batch[b"done"] == b"0"
+    assert b"finished_at" in batch
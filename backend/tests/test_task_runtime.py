@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+from celery import Celery
+
+from app.tasks import runtime
+
+
+def test_coroutines_share_one_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    assert runtime.run(current_loop()) is runtime.run(current_loop())
+
+
+def test_tasks_from_worker_threads_run_concurrently():
+    async def wait():
+        await asyncio.sleep(0.3)
+
+    threads = [threading.Thread(target=runtime.run, args=(wait(),)) for _ in range(5)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.perf_counter() - start < 1.0
+
+
+def test_shutdown_runs_cleanup_on_loop():
+    cleaned = []
+
+    async def cleanup():
+        cleaned.append(asyncio.get_running_loop())
+
+    loop = runtime.get_loop()
+    runtime.shutdown(cleanup)
+
+    assert cleaned == [loop]
+    assert loop.is_closed()
+
+
+def test_async_task_sees_request_and_retries():
+    app = Celery("runtime-test")
+    app.conf.task_always_eager = True
+    attempts = []
+
+    @app.task(bind=True, base=runtime.AsyncTask, max_retries=3)
+    async def flaky(self):
+        attempts.append((self.request.id, self.request.retries))
+        if self.request.retries < 2:
+            raise self.retry(exc=RuntimeError("WB unavailable"), countdown=0)
+        return "done"
+
+    assert flaky.apply(task_id="sync-1").get() == "done"
+    assert attempts == [("sync-1", 0), ("sync-1", 1), ("sync-1", 2)]
@@ -0,0 +1,38 @@
+import pytest
+
+from app.services import wb_api
+from app.services.exceptions import RateLimitError
+from app.services.wb_api import parse_rate_limit_headers, retry
+
+
+def test_parse_rate_limit_headers_prefers_wb_retry_header():
+    headers = {"X-Ratelimit-Retry": "7", "Retry-After": "30", "X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": "12"}
+    assert parse_rate_limit_headers(headers) == (7.0, 0, 12.0)
+
+
+def test_parse_rate_limit_headers_accepts_http_date():
+    retry_after, remaining, reset = parse_rate_limit_headers({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert retry_after == 0.0
+    assert remaining is None and reset is None
+
+
+@pytest.mark.asyncio
+async def test_retry_waits_for_retry_after(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(wb_api.asyncio, "sleep", fake_sleep)
+    calls = []
+
+    @retry(tries=3, delay=1, backoff=2)
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitError("Too Many Requests", status_code=429, retry_after=5)
+        return "ok"
+
+    assert await flaky() == "ok"
+    assert len(sleeps) == 2
+    assert all(5 <= s <= 5 + 5 * wb_api.RETRY_JITTER for s in sleeps)
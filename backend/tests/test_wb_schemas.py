@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import httpx
+import msgspec
+import pytest
+
+from app.services.wb_api import WildberriesAPIClient
+from app.services.wb_schemas import cards_page_decoder, orders_decoder, sales_decoder, stocks_decoder
+
+
+def client_returning(payload) -> WildberriesAPIClient:
+    return WildberriesAPIClient(http_client=httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=payload)),
+    ))
+
+
+def test_card_tolerates_missing_and_null_fields():
+    page = cards_page_decoder.decode(msgspec.json.encode({
+        "cards": [
+            {"nmID": 1, "vendorCode": None, "tags": [{"name": "Иванов", "color": "D1CFD7"}, {}, {"name": None}, "Петров"],
+             "sizes": [{"chrtID": 7, "skus": ["2000000000011"], "price": 100}], "unknown": {"nested": [1, 2]}},
+            {"nmID": 2},
+        ],
+    }))
+
+    first, second = page.cards
+    assert first.tag_names == ["Иванов", "Петров"]
+    assert first.barcode == "2000000000011" and first.vendor_code is None
+    assert (second.tag_names, second.barcode, second.photo) == ([], None, None)
+    assert page.cursor.updated_at is None
+
+
+def test_statistics_rows_decode_without_nm_id():
+    orders = orders_decoder.decode(msgspec.json.encode([
+        {"date": "2026-10-01T10:00:00", "nmId": 1, "srid": "s1", "isCancel": False},
+        {"date": "2026-10-01T11:00:00", "nmId": None, "gNumber": "g1"},
+        {"date": "2026-10-01T12:00:00"},
+    ]))
+    sales = sales_decoder.decode(msgspec.json.encode([{"date": "2026-10-01T10:00:00", "saleID": "S1", "cancelID": None}]))
+    stocks = stocks_decoder.decode(msgspec.json.encode([{"nmId": 1}, {"quantity": 3}]))
+
+    assert [order.nm_id for order in orders] == [1, None, None]
+    assert orders[0].date == datetime(2026, 10, 1, 10) and orders[0].price_with_disc == 0.0
+    assert sales[0].nm_id is None and sales[0].is_buyout
+    assert [(stock.nm_id, stock.quantity) for stock in stocks] == [(1, 0), (None, 3)]
+
+
+def test_order_items_sharing_g_number_get_distinct_ids():
+    orders = orders_decoder.decode(msgspec.json.encode([
+        {"date": "2026-10-01T10:00:00", "nmId": 1, "gNumber": "g1", "barcode": "b1"},
+        {"date": "2026-10-01T10:00:00", "nmId": 2, "gNumber": "g1", "barcode": "b2"},
+        {"date": "2026-10-01T10:00:00", "nmId": 2, "gNumber": "g1", "srid": "s3"},
+        {"date": "2026-10-01T10:00:00", "nmId": 3},
+    ]))
+
+    assert [order.external_id for order in orders] == ["g1:1:b1", "g1:2:b2", "s3", None]
+
+
+@pytest.mark.asyncio
+async def test_client_drops_rows_without_nm_id():
+    client = client_returning([
+        {"date": "2026-10-01T10:00:00", "nmId": 1, "saleID": "S1"},
+        {"date": "2026-10-01T10:00:00", "nmId": None, "saleID": "S2"},
+        {"date": "2026-10-01T10:00:00", "nmId": 2},
+    ])
+
+    sales = await client.get_sales("token", "2026-10-01")
+
+    assert [sale.sale_id for sale in sales] == ["S1"]
+    await client.close()
@@ -15,8 +15,10 @@ export const dashboardAPI = {
     cabinet_id?: number
     sort_by?: string
     order?: string
+    cursor?: string
     page?: number
     limit?: number
+    with_total?: boolean
   }): Promise<ProductListResponse> => {
     const response = await client.get<ProductListResponse>('/v1/dashboard/products', { params })
     return response.data
@@ -31,9 +31,10 @@ export interface ProductItem {
 
 export interface ProductListResponse {
   items: ProductItem[]
-  total: number
+  total: number | null
   page: number
   limit: number
+  next_cursor: string | null
 }
 
 export interface ChartDataResponse {